@@ -0,0 +1,108 @@
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from backend.config import (
+    API_MAX_CONCURRENT_QUERIES,
+    API_MAX_QUEUE,
+    API_QUEUE_TIMEOUT_SECONDS
+)
+
+
+class Overloaded(Exception):
+    """No se admite la consulta; status es el codigo HTTP sugerido (429 cola llena, 503 plazo vencido)."""
+
+    def __init__(self, message: str, status: int, retry_after: float):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Control de admision para el event loop de un worker.
+
+    Como mucho max_concurrent consultas llaman a OpenAI a la vez; las demas esperan en
+    una cola de max_queue lugares durante queue_timeout segundos. Con la cola llena se
+    rechaza enseguida (429) y si el plazo vence se responde 503: el cliente recibe un
+    error rapido en lugar de un timeout despues de esperar detras de todos los demas.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = API_MAX_CONCURRENT_QUERIES,
+        max_queue: int = API_MAX_QUEUE,
+        queue_timeout: float = API_QUEUE_TIMEOUT_SECONDS
+    ):
+        if max_concurrent <= 0 or max_queue < 0:
+            raise ValueError("max_concurrent debe ser mayor a 0 y max_queue no negativo")
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        #El semaforo se crea en el loop que lo usa (uvicorn crea el loop despues de importar)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.wait_seconds_total = 0.0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    @asynccontextmanager
+    async def admit(self):
+        semaphore = self._get_semaphore()
+        start = time.perf_counter()
+        if semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self.rejected_queue_full += 1
+                raise Overloaded("Demasiadas consultas en espera", 429, self.queue_timeout)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                raise Overloaded("Tiempo de espera agotado en la cola", 503, self.queue_timeout)
+            finally:
+                self.waiting -= 1
+        else:
+            await semaphore.acquire()
+        self.wait_seconds_total += time.perf_counter() - start
+        self.in_flight += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+
+    def get_stats(self) -> Dict:
+        return {
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'queue_timeout': self.queue_timeout,
+            'admitted': self.admitted,
+            'rejected_queue_full': self.rejected_queue_full,
+            'rejected_timeout': self.rejected_timeout,
+            'avg_wait_ms': (self.wait_seconds_total / self.admitted * 1000) if self.admitted else 0.0
+        }
+
+    def render_prometheus(self) -> str:
+        stats = self.get_stats()
+        lines = []
+        for name, kind, value in (
+            ('rag_api_in_flight', 'gauge', stats['in_flight']),
+            ('rag_api_waiting', 'gauge', stats['waiting']),
+            ('rag_api_admitted_total', 'counter', stats['admitted']),
+            ('rag_api_rejected_queue_full_total', 'counter', stats['rejected_queue_full']),
+            ('rag_api_rejected_timeout_total', 'counter', stats['rejected_timeout'])
+        ):
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,199 @@
+import time
+import asyncio
+import threading
+from urllib.parse import parse_qsl
+from contextlib import asynccontextmanager
+from typing import List, Dict, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from pydantic import BaseModel, Field
+
+from backend.rag_engine import RAGEngine
+from backend.admission import AdmissionController, Overloaded
+from backend.tracing import metrics
+from backend.config import API_MAX_QUESTION_CHARS, API_WARMUP_ON_STARTUP, WHATSAPP_ENABLED, WHATSAPP_WEBHOOK_URL
+
+
+class QueryRequest(BaseModel):
+    question: str = Field(min_length=1, max_length=API_MAX_QUESTION_CHARS)
+    #Numero de WhatsApp o id de sesion: activa la memoria de conversacion
+    user_id: Optional[str] = Field(default=None, max_length=100)
+    #PYME registrada en tenants.json; sin tenant se usa la coleccion por defecto
+    tenant_id: Optional[str] = Field(default=None, max_length=50)
+    n_results: Optional[int] = Field(default=None, ge=1, le=20)
+
+
+class SourceResponse(BaseModel):
+    source: str
+    chunk_index: int
+    similarity: Optional[float] = None
+
+
+class QueryResponse(BaseModel):
+    answer: str
+    sources: List[SourceResponse]
+    cache_hit: bool
+    fact_hit: bool = False
+    time_total: float
+    tokens_used: int
+    retrieval_query: Optional[str] = None
+    trace_id: Optional[str] = None
+
+
+class ServiceState:
+    """Engine compartido por todas las requests del worker y su estado de warmup."""
+
+    def __init__(self):
+        self.engine: Optional[RAGEngine] = None
+        self._engine_lock = threading.Lock()
+        self.admission = AdmissionController()
+        self.ready = False
+        self.warmup_error: Optional[str] = None
+        self.warmup_timings: Dict = {}
+        self.started_at = time.time()
+        #Pipeline de WhatsApp (integrations/), solo con WHATSAPP_ENABLED
+        self.whatsapp = None
+
+    def get_engine(self) -> RAGEngine:
+        #Lo usan el warmup y los workers de WhatsApp desde otros hilos
+        with self._engine_lock:
+            if self.engine is None:
+                self.engine = RAGEngine()
+            return self.engine
+
+    def warmup(self) -> None:
+        try:
+            self.warmup_timings = self.get_engine().warmup()
+            self.ready = True
+        except Exception as e:
+            self.warmup_error = str(e)
+            print(f"Error en warmup: {str(e)}")
+
+
+state = ServiceState()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    #El warmup corre en un hilo: /health responde mientras tanto y /ready queda en 503
+    warmup_task = None
+    if API_WARMUP_ON_STARTUP:
+        warmup_task = asyncio.create_task(asyncio.to_thread(state.warmup))
+    else:
+        state.ready = True
+    if WHATSAPP_ENABLED:
+        from integrations.whatsapp import WhatsAppPipeline
+        state.whatsapp = WhatsAppPipeline(engine_factory=state.get_engine)
+        state.whatsapp.start()
+    yield
+    if state.whatsapp is not None:
+        await asyncio.to_thread(state.whatsapp.stop)
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+
+
+app = FastAPI(title="Chatbot PYME RAG", lifespan=lifespan)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, error: Overloaded):
+    #Rechazo rapido con Retry-After para que el cliente (o Twilio) reintente mas tarde
+    return JSONResponse(
+        status_code=error.status,
+        content={'detail': str(error)},
+        headers={'Retry-After': str(max(1, int(error.retry_after)))}
+    )
+
+
+async def _engine_for(tenant_id: Optional[str]) -> RAGEngine:
+    if tenant_id is None:
+        return state.get_engine()
+    from backend.tenant_manager import get_tenant_manager
+    try:
+        #Abrir un tenant frio lee disco: se hace fuera del event loop
+        return await asyncio.to_thread(get_tenant_manager().get_engine, tenant_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Tenant no registrado: {tenant_id}")
+
+
+@app.post("/query", response_model=QueryResponse)
+async def query(request: QueryRequest) -> QueryResponse:
+    if not state.ready:
+        raise HTTPException(status_code=503, detail="El servicio se esta iniciando", headers={'Retry-After': "1"})
+    engine = await _engine_for(request.tenant_id)
+    #La admision se toma dentro del engine, solo si la pregunta no sale de la tabla de datos o la cache
+    result = await engine.aquery(
+        request.question,
+        n_results=request.n_results,
+        verbose=False,
+        user_id=request.user_id,
+        admission=state.admission
+    )
+    if 'error' in result:
+        raise HTTPException(status_code=502, detail="Error al generar la respuesta")
+    return QueryResponse(
+        answer=result['answer'],
+        sources=[
+            SourceResponse(source=doc['source'], chunk_index=doc['chunk_index'], similarity=doc.get('similarity'))
+            for doc in result.get('sources', [])
+        ],
+        cache_hit=result.get('cache_hit', False),
+        fact_hit=result.get('fact_hit', False),
+        time_total=result.get('time_total', 0.0),
+        tokens_used=result.get('tokens_used', 0),
+        retrieval_query=result.get('retrieval_query'),
+        trace_id=(result.get('trace') or {}).get('trace_id')
+    )
+
+
+@app.post("/whatsapp/webhook")
+async def whatsapp_webhook(request: Request) -> Response:
+    #Twilio espera respuesta rapida y reintenta si tarda: solo se encola, los workers responden despues
+    if state.whatsapp is None:
+        raise HTTPException(status_code=404, detail="WhatsApp no esta habilitado")
+    form = dict(parse_qsl((await request.body()).decode("utf-8")))
+    #Twilio firma la URL que tiene configurada; detras de un proxy hay que indicarla con WHATSAPP_WEBHOOK_URL
+    url = WHATSAPP_WEBHOOK_URL or str(request.url)
+    try:
+        await asyncio.to_thread(
+            state.whatsapp.handle_webhook, form, url, request.headers.get('X-Twilio-Signature')
+        )
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    #TwiML vacio: la respuesta se envia por la API REST cuando este lista
+    return Response(content="<Response></Response>", media_type="application/xml")
+
+
+@app.get("/health")
+async def health() -> Dict:
+    #Liveness: el proceso responde (no depende de Chroma ni de OpenAI)
+    return {'status': "ok", 'uptime_seconds': time.time() - state.started_at}
+
+
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    #Readiness: la coleccion e indices estan cargados. La saturacion no cuenta: la resuelven los 429/503
+    #de /query; sacar al worker del balanceador solo cargaria mas a los demas.
+    #Solo cubre el engine por defecto: los tenants se abren en su primera consulta (ver TenantManager)
+    body = {
+        'ready': state.ready,
+        'warmup_error': state.warmup_error,
+        'warmup_timings': state.warmup_timings,
+        'admission': state.admission.get_stats()
+    }
+    if state.whatsapp is not None:
+        body['whatsapp'] = state.whatsapp.get_stats()
+    return JSONResponse(status_code=200 if body['ready'] else 503, content=body)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> str:
+    return metrics.render_prometheus() + state.admission.render_prometheus()
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("backend.api:app", host="0.0.0.0", port=8000)
@@ -0,0 +1,191 @@
+import os
+import re
+import json
+import math
+import unicodedata
+from collections import Counter
+from typing import List, Dict, Optional, Callable, Sequence
+
+#Palabras vacias del español (sin tildes, igual que los tokens normalizados)
+SPANISH_STOPWORDS = {
+    'a', 'al', 'algo', 'algun', 'alguna', 'algunas', 'alguno', 'algunos', 'ante', 'antes',
+    'aqui', 'asi', 'aun', 'cada', 'como', 'con', 'cual', 'cuales', 'cuando', 'cuanto',
+    'cuanta', 'cuantos', 'cuantas', 'de', 'del', 'desde', 'donde', 'e', 'el', 'ella',
+    'ellas', 'ellos', 'en', 'entre', 'era', 'es', 'esa', 'esas', 'ese', 'eso', 'esos',
+    'esta', 'estan', 'estas', 'este', 'esto', 'estos', 'fue', 'ha', 'han', 'hay', 'la',
+    'las', 'le', 'les', 'lo', 'los', 'mas', 'me', 'mi', 'mis', 'mucho', 'muy', 'nos',
+    'o', 'para', 'pero', 'por', 'puedo', 'que', 'quien', 'se', 'sea', 'ser', 'si', 'sin',
+    'sobre', 'son', 'su', 'sus', 'tambien', 'te', 'tiene', 'tienen', 'tu', 'tus', 'un',
+    'una', 'unas', 'uno', 'unos', 'usted', 'ustedes', 'y', 'ya', 'yo', 'hola', 'gracias',
+    'favor', 'quiero', 'quisiera', 'saber'
+}
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_NUMBER_SEPARATOR = re.compile(r"(?<=\d)[.,](?=\d{3}\b)")
+
+
+def strip_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(c for c in decomposed if unicodedata.category(c) != "Mn")
+
+
+def stem(token: str) -> str:
+    #Stemming liviano: singulariza plurales regulares (domicilios -> domicilio)
+    if len(token) > 4 and token.endswith("es") and token[-3] in "lrndz":
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    text = strip_accents(text.lower())
+    #"$15.000" y "15000" deben ser el mismo token
+    text = _NUMBER_SEPARATOR.sub("", text)
+    return [
+        stem(token)
+        for token in _TOKEN_PATTERN.findall(text)
+        if token not in SPANISH_STOPWORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+
+class BM25Index:
+    """Indice invertido BM25 local, construido con los mismos chunks que Chroma."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents: List[Dict] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_lengths: List[int] = []
+        self.avg_doc_length = 0.0
+        self.idf: Dict[str, float] = {}
+
+    @classmethod
+    def from_chunks(
+        cls,
+        chunks: List[Dict],
+        id_function: Callable[[Dict], str]
+    ) -> "BM25Index":
+        index = cls()
+        documents = [
+            {
+                'id': id_function(chunk),
+                'content': chunk['content'],
+                'source': chunk['source'],
+                'chunk_index': chunk['chunk_index'],
+                'section': chunk.get('section', "")
+            }
+            for chunk in chunks
+        ]
+        index._build(documents)
+        return index
+
+    def _build(self, documents: List[Dict]) -> None:
+        self.documents = documents
+        self.postings = {}
+        self.doc_lengths = []
+        for doc_index, doc in enumerate(documents):
+            terms = Counter(tokenize(doc['content']))
+            self.doc_lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                self.postings.setdefault(term, {})[doc_index] = frequency
+        total = len(documents)
+        self.avg_doc_length = (sum(self.doc_lengths) / total) if total else 0.0
+        #IDF de BM25 con suavizado (+1) para que nunca sea negativo
+        self.idf = {
+            term: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def memory_bytes(self) -> int:
+        #Estimacion: texto de los chunks mas ~100 bytes por entrada de los postings (dicts de Python)
+        postings = sum(len(docs) for docs in self.postings.values())
+        return sum(len(doc['content']) for doc in self.documents) + postings * 100
+
+    def search(self, query: str, n_results: int = 3, sources: Optional[Sequence[str]] = None) -> List[Dict]:
+        if not self.documents:
+            return []
+        allowed = set(sources) if sources else None
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            for doc_index, frequency in postings.items():
+                if allowed is not None and self.documents[doc_index]['source'] not in allowed:
+                    continue
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_index] / (self.avg_doc_length or 1)
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * (
+                    frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+                )
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+        results = []
+        for doc_index, score in ranked:
+            result = dict(self.documents[doc_index])
+            result['bm25_score'] = score
+            result['distance'] = None
+            results.append(result)
+        return results
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        #Solo se guardan los documentos; los postings se reconstruyen al cargar (es rapido)
+        data = {'k1': self.k1, 'b': self.b, 'documents': self.documents}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        index = cls(k1=data.get('k1', 1.5), b=data.get('b', 0.75))
+        index._build(data['documents'])
+        return index
+
+
+def is_confident(
+    results: List[Dict],
+    min_score: float,
+    min_ratio: float
+) -> bool:
+    #Confianza alta: el mejor resultado tiene buen puntaje y supera claramente al segundo
+    if not results or results[0]['bm25_score'] < min_score:
+        return False
+    if len(results) == 1:
+        return True
+    second = results[1]['bm25_score']
+    return second <= 0 or results[0]['bm25_score'] / second >= min_ratio
+
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[Dict]],
+    n_results: int,
+    k: int = 60
+) -> List[Dict]:
+    #RRF: cada lista aporta 1/(k + posicion); no necesita que los puntajes sean comparables
+    fused: Dict[str, Dict] = {}
+    scores: Dict[str, float] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, 1):
+            doc_id = result['id']
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+            if doc_id not in fused:
+                fused[doc_id] = dict(result)
+            else:
+                #Conservar la distancia vectorial y el puntaje BM25 si vienen de listas distintas
+                for key, value in result.items():
+                    if fused[doc_id].get(key) is None and value is not None:
+                        fused[doc_id][key] = value
+    ranked = sorted(fused.values(), key=lambda doc: scores[doc['id']], reverse=True)[:n_results]
+    for doc in ranked:
+        doc['rrf_score'] = scores[doc['id']]
+    return ranked
@@ -0,0 +1,332 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Optional, Callable, Set, Tuple
+
+from backend.embeddings_manual import get_embeddings_batch
+from backend.token_counter import count_tokens
+from backend.config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_BATCH_MAX_TOKENS,
+    EMBEDDING_BATCH_MAX_ITEMS,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_TOKENS_PER_MINUTE,
+    EMBEDDING_REQUESTS_PER_MINUTE,
+    EMBEDDING_MAX_RETRIES,
+    EMBEDDING_CHECKPOINT_DIR
+)
+
+_retryable_errors: Optional[Tuple] = None
+
+def retryable_errors() -> Tuple:
+    #Errores transitorios: se reintentan con espera exponencial (openai se importa solo si hace falta)
+    global _retryable_errors
+    if _retryable_errors is None:
+        import openai
+        _retryable_errors = (
+            openai.RateLimitError,
+            openai.APITimeoutError,
+            openai.APIConnectionError,
+            openai.InternalServerError
+        )
+    return _retryable_errors
+
+
+class EmbeddingCountError(ValueError):
+    """La API retorno una cantidad de embeddings distinta a la de textos enviados."""
+
+
+_fatal_errors: Optional[Tuple] = None
+
+def fatal_errors() -> Tuple:
+    #Credenciales, permisos o modelo invalidos: fallarian igual en todos los lotes, se aborta el indexado
+    global _fatal_errors
+    if _fatal_errors is None:
+        import openai
+        _fatal_errors = (
+            openai.AuthenticationError,
+            openai.PermissionDeniedError,
+            openai.NotFoundError
+        )
+    return _fatal_errors
+
+def is_input_error(error: Exception) -> bool:
+    #Errores que puede causar un chunk puntual del lote (ej. excede el limite de tokens)
+    import openai
+    return isinstance(error, (openai.BadRequestError, EmbeddingCountError))
+
+
+
+class RateLimiter:
+    """Doble token bucket: tokens por minuto y requests por minuto."""
+
+    def __init__(self, tokens_per_minute: int, requests_per_minute: int):
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self._tokens = float(tokens_per_minute)
+        self._requests = float(requests_per_minute)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+
+    def acquire(self, tokens: int) -> float:
+        #Bloquea hasta que haya presupuesto; retorna el tiempo esperado
+        #Un lote mas grande que el limite por minuto se deja pasar cuando el bucket esta lleno
+        tokens = min(tokens, self.tokens_per_minute)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens and self._requests >= 1:
+                    self._tokens -= tokens
+                    self._requests -= 1
+                    return waited
+                missing_tokens = max(0.0, tokens - self._tokens)
+                missing_requests = max(0.0, 1 - self._requests)
+                wait = max(
+                    missing_tokens * 60 / self.tokens_per_minute,
+                    missing_requests * 60 / self.requests_per_minute
+                )
+            wait = max(wait, 0.01)
+            time.sleep(wait)
+            waited += wait
+
+
+class EmbeddingCheckpoint:
+    """Registro en disco (JSONL) de los chunks ya embebidos y guardados."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done: Set[str] = set()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        self.done.update(json.loads(line))
+                    except ValueError:
+                        #Una linea cortada por una interrupcion se ignora
+                        continue
+
+    @staticmethod
+    def key(doc_id: str, content: str) -> str:
+        #Se guarda tambien el hash del contenido: si el chunk cambio, no se da por hecho
+        content_hash = hashlib.sha256(f"{EMBEDDING_MODEL}\x00{content}".encode("utf-8")).hexdigest()[:16]
+        return f"{doc_id}:{content_hash}"
+
+    def is_done(self, doc_id: str, content: str) -> bool:
+        return self.key(doc_id, content) in self.done
+
+    def mark_done(self, keys: List[str]) -> None:
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(keys) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            self.done.update(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.done.clear()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def pack_batches(
+    documents: List[Dict],
+    max_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+    max_items: int = EMBEDDING_BATCH_MAX_ITEMS
+) -> List[List[Dict]]:
+    #Agrupa documentos en lotes sin pasar del limite de tokens ni de items por request
+    batches = []
+    current = []
+    current_tokens = 0
+    for doc in documents:
+        tokens = doc['_tokens']
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(doc)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+class BulkEmbeddingClient:
+    """Embebe muchos chunks respetando los limites de la API y reanudando si se interrumpe.
+
+    on_batch(documentos, embeddings) se llama por cada lote embebido (por ejemplo
+    para escribir en Chroma); solo cuando termina bien el lote queda en el checkpoint.
+    """
+
+    def __init__(
+        self,
+        max_tokens_per_batch: int = EMBEDDING_BATCH_MAX_TOKENS,
+        max_items_per_batch: int = EMBEDDING_BATCH_MAX_ITEMS,
+        max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+        tokens_per_minute: int = EMBEDDING_TOKENS_PER_MINUTE,
+        requests_per_minute: int = EMBEDDING_REQUESTS_PER_MINUTE,
+        max_retries: int = EMBEDDING_MAX_RETRIES,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        checkpoint_path: Optional[str] = None,
+        embed_function: Callable[[List[str]], List[List[float]]] = get_embeddings_batch
+    ):
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.max_items_per_batch = max_items_per_batch
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = RateLimiter(tokens_per_minute, requests_per_minute)
+        self.checkpoint = EmbeddingCheckpoint(checkpoint_path) if checkpoint_path else None
+        self.embed_function = embed_function
+        self._write_lock = threading.Lock()
+
+    @staticmethod
+    def checkpoint_path_for(collection_name: str) -> str:
+        return os.path.join(EMBEDDING_CHECKPOINT_DIR, f"{collection_name}.jsonl")
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        #Si la API indica cuanto esperar (Retry-After) se respeta
+        response = getattr(error, 'response', None)
+        if response is not None:
+            retry_after = response.headers.get('retry-after')
+            if retry_after:
+                try:
+                    return min(self.max_delay, float(retry_after))
+                except ValueError:
+                    pass
+        #Backoff exponencial con jitter completo para que los hilos no reintenten a la vez
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    def _embed_with_retry(self, texts: List[str], tokens: int) -> List[List[float]]:
+        attempt = 0
+        while True:
+            self.limiter.acquire(tokens)
+            try:
+                embeddings = self.embed_function(texts)
+                if len(embeddings) != len(texts):
+                    raise EmbeddingCountError(
+                        f"La API retorno {len(embeddings)} embeddings para {len(texts)} textos"
+                    )
+                return embeddings
+            except retryable_errors() as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt, e)
+                print(f"Error transitorio ({type(e).__name__}), reintento {attempt + 1}/{self.max_retries} en {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+
+    def _process_batch(self, batch: List[Dict], on_batch: Callable) -> Dict:
+        texts = [doc['content'] for doc in batch]
+        tokens = sum(doc['_tokens'] for doc in batch)
+        try:
+            embeddings = self._embed_with_retry(texts, tokens)
+        except fatal_errors():
+            raise
+        except retryable_errors() as e:
+            return {'succeeded': [], 'failed': [(doc, str(e)) for doc in batch]}
+        except Exception as e:
+            if not is_input_error(e):
+                return {'succeeded': [], 'failed': [(doc, str(e)) for doc in batch]}
+            #Request invalido (ej. un chunk demasiado largo): se divide el lote para aislar los chunks culpables
+            if len(batch) > 1:
+                middle = len(batch) // 2
+                left = self._process_batch(batch[:middle], on_batch)
+                right = self._process_batch(batch[middle:], on_batch)
+                return {
+                    'succeeded': left['succeeded'] + right['succeeded'],
+                    'failed': left['failed'] + right['failed']
+                }
+            return {'succeeded': [], 'failed': [(batch[0], str(e))]}
+
+        try:
+            with self._write_lock:
+                on_batch(batch, embeddings)
+        except Exception as e:
+            return {'succeeded': [], 'failed': [(doc, f"Error al guardar: {str(e)}") for doc in batch]}
+
+        if self.checkpoint is not None:
+            self.checkpoint.mark_done([self.checkpoint.key(doc['_id'], doc['content']) for doc in batch])
+        return {'succeeded': batch, 'failed': []}
+
+    def embed_documents(
+        self,
+        documents: List[Dict],
+        on_batch: Callable[[List[Dict], List[List[float]]], None],
+        id_function: Callable[[Dict], str]
+    ) -> Dict:
+        start_time = time.time()
+        pending = []
+        skipped = 0
+        for doc in documents:
+            doc_id = id_function(doc)
+            if self.checkpoint is not None and self.checkpoint.is_done(doc_id, doc['content']):
+                skipped += 1
+                continue
+            pending.append(dict(doc, _id=doc_id, _tokens=count_tokens(doc['content'], EMBEDDING_MODEL)))
+
+        if skipped:
+            print(f"Reanudando: {skipped} chunks ya estaban indexados segun el checkpoint")
+
+        batches = pack_batches(pending, self.max_tokens_per_batch, self.max_items_per_batch)
+        print(f"{len(pending)} chunks en {len(batches)} lotes (max {self.max_tokens_per_batch:,} tokens, {self.max_concurrency} en paralelo)")
+
+        succeeded = []
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embed") as executor:
+            futures = [executor.submit(self._process_batch, batch, on_batch) for batch in batches]
+            for number, future in enumerate(as_completed(futures), 1):
+                try:
+                    outcome = future.result()
+                except fatal_errors() as e:
+                    #Los lotes que no empezaron no se envian; los completados quedan en el checkpoint
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    print(f"Indexado abortado ({type(e).__name__}): {str(e)}")
+                    raise
+                succeeded.extend(outcome['succeeded'])
+                failed.extend(outcome['failed'])
+                print(f" Lotes completados {number}/{len(batches)}")
+
+        #Si todo quedo indexado el checkpoint ya no hace falta
+        if self.checkpoint is not None and not failed:
+            self.checkpoint.clear()
+
+        report = {
+            'total': len(documents),
+            'succeeded': len(succeeded),
+            'succeeded_ids': [doc['_id'] for doc in succeeded],
+            'skipped': skipped,
+            'failed': [
+                {'id': doc['_id'], 'source': doc.get('source'), 'error': error}
+                for doc, error in failed
+            ],
+            'batches': len(batches),
+            'time': time.time() - start_time
+        }
+        if report['failed']:
+            print(f"\nChunks que no se pudieron indexar: {len(report['failed'])}")
+            for item in report['failed']:
+                print(f"   - {item['id']}: {item['error']}")
+        return report
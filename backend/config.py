@@ -5,11 +5,15 @@ load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-if not OPENAI_API_KEY:
-    raise ValueError(
-        "ERROR: OPENAI_API_KEY no encontrada."
-        "Verifica que existe en tu archivo .env"
-    )
+def require_api_key() -> str:
+    #Se valida al crear el cliente de OpenAI, no al importar: las herramientas sin red arrancan sin la key
+    api_key = OPENAI_API_KEY or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError(
+            "ERROR: OPENAI_API_KEY no encontrada. "
+            "Verifica que existe en tu archivo .env"
+        )
+    return api_key
 
 CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
 EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL","text-embedding-3-small" )
@@ -18,11 +22,160 @@ MAX_TOKENS = int(os.getenv("OPENAI_MAX_TOKENS", "500"))
 
 CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
 CHROMA_COLLECTION_NAME = os.getenv("CHROMA_COLLECTION_NAME", "restaurante_knowledge")
+#Manifest con los hashes de archivos y chunks indexados (reindexado incremental)
+INDEX_MANIFEST_PATH = os.getenv(
+    "INDEX_MANIFEST_PATH",
+    os.path.join(CHROMA_PERSIST_DIRECTORY, "index_manifest.json")
+)
 
 KNOWLEDGE_BASE_PATH = "./knowledge_base"
+#Versiones de la base de conocimiento: archivos y chunks por hash, embeddings guardados una vez por chunk
+KB_VERSIONS_PATH = os.getenv("KB_VERSIONS_PATH", "./knowledge_base_versions")
+#Colecciones de versiones que se conservan en Chroma para volver atras sin reconstruir
+KB_VERSIONS_KEEP_COLLECTIONS = int(os.getenv("KB_VERSIONS_KEEP_COLLECTIONS", "3"))
 
 TOP_K_RESULTS = 3
 
+#Motor de busqueda: "chroma" (HNSW persistente), "numpy" (busqueda exacta en memoria)
+#o "snapshot" (matriz cuantizada mapeada en memoria, compartida entre workers)
+VECTOR_SEARCH_BACKEND = os.getenv("VECTOR_SEARCH_BACKEND", "chroma")
+#Perfiles del indice HNSW de Chroma: M y construction_ef se fijan al crear la coleccion
+#(cambiarlos requiere scripts/rebuild_index.py); search_ef controla cuantos candidatos revisa cada busqueda
+INDEX_PROFILES = {
+    'low-latency': {'space': "cosine", 'M': 8, 'construction_ef': 64, 'search_ef': 16},
+    'balanced': {'space': "cosine", 'M': 16, 'construction_ef': 128, 'search_ef': 64},
+    'high-recall': {'space': "cosine", 'M': 32, 'construction_ef': 256, 'search_ef': 256}
+}
+INDEX_PROFILE = os.getenv("INDEX_PROFILE", "balanced")
+EMBEDDING_SNAPSHOT_PATH = os.getenv(
+    "EMBEDDING_SNAPSHOT_PATH",
+    os.path.join(CHROMA_PERSIST_DIRECTORY, "snapshot")
+)
+#float16 (mitad de memoria, sin perdida practica) o int8 (un cuarto, pequena perdida de recall)
+EMBEDDING_SNAPSHOT_DTYPE = os.getenv("EMBEDDING_SNAPSHOT_DTYPE", "float16")
+#Filas que se convierten a float32 por paso de la busqueda (memoria temporal = bloque x dim x 4 bytes)
+SNAPSHOT_BLOCK_SIZE = int(os.getenv("SNAPSHOT_BLOCK_SIZE", "1024"))
+#Recuperacion: "vector" (solo embeddings) o "hybrid" (BM25 local + embeddings con RRF)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+BM25_INDEX_PATH = os.getenv(
+    "BM25_INDEX_PATH",
+    os.path.join(CHROMA_PERSIST_DIRECTORY, "bm25_index.json")
+)
+#Candidatos por cada lista antes de fusionar
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "10"))
+#Atajo lexico: si BM25 tiene un ganador claro no se calcula el embedding de la pregunta
+BM25_FAST_PATH_ENABLED = os.getenv("BM25_FAST_PATH_ENABLED", "true").lower() == "true"
+BM25_FAST_PATH_MIN_SCORE = float(os.getenv("BM25_FAST_PATH_MIN_SCORE", "4.0"))
+BM25_FAST_PATH_MIN_RATIO = float(os.getenv("BM25_FAST_PATH_MIN_RATIO", "2.0"))
+#Tabla de precios, categorias y horarios (menu.txt, horarios.txt): responde sin recuperacion ni LLM
+FACT_INDEX_ENABLED = os.getenv("FACT_INDEX_ENABLED", "true").lower() == "true"
+#Zona horaria del negocio: define que dia es "hoy" aunque el servidor corra en UTC
+BUSINESS_TIMEZONE = os.getenv("BUSINESS_TIMEZONE", "America/Bogota")
+#Ruteo de preguntas: se busca solo en las fuentes (menu, horarios...) que correspondan
+QUERY_ROUTING_ENABLED = os.getenv("QUERY_ROUTING_ENABLED", "true").lower() == "true"
+#"keywords" (terminos de cada fuente, antes del embedding) o "centroid" (embedding promedio por fuente)
+QUERY_ROUTING_METHOD = os.getenv("QUERY_ROUTING_METHOD", "keywords")
+#Por debajo de esta confianza se busca en toda la coleccion
+QUERY_ROUTING_MIN_CONFIDENCE = float(os.getenv("QUERY_ROUTING_MIN_CONFIDENCE", "0.6"))
+#Fuentes con puntaje >= ratio x el de la mejor tambien se incluyen
+QUERY_ROUTING_SOURCE_RATIO = float(os.getenv("QUERY_ROUTING_SOURCE_RATIO", "0.5"))
+#Hilos para las consultas a Chroma desde el API async (Chroma no tiene cliente async local)
+CHROMA_EXECUTOR_WORKERS = int(os.getenv("CHROMA_EXECUTOR_WORKERS", "8"))
+
+#Cache persistente de embeddings (evita llamadas repetidas a la API)
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./cache/embeddings.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+
+#Indexado masivo: lotes por tokens, concurrencia y limites de la cuenta de OpenAI
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "20000"))
+EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", "2048"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", "1000000"))
+EMBEDDING_REQUESTS_PER_MINUTE = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "3000"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+EMBEDDING_CHECKPOINT_DIR = os.getenv("EMBEDDING_CHECKPOINT_DIR", "./cache/checkpoints")
+
+#Agrupacion de embeddings de preguntas concurrentes en un solo request
+QUERY_EMBEDDING_COALESCING = os.getenv("QUERY_EMBEDDING_COALESCING", "true").lower() == "true"
+COALESCE_MAX_BATCH_SIZE = int(os.getenv("COALESCE_MAX_BATCH_SIZE", "64"))
+COALESCE_MAX_WAIT_MS = float(os.getenv("COALESCE_MAX_WAIT_MS", "5"))
+COALESCE_MAX_IN_FLIGHT = int(os.getenv("COALESCE_MAX_IN_FLIGHT", "4"))
+
+#RAGEngine.query_batch (trabajos offline): respuestas generadas en paralelo
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+#Cache semantico de respuestas (preguntas parecidas reutilizan la respuesta)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))
+
+#Memoria de conversacion por usuario (ej. numero de WhatsApp) para preguntas de seguimiento
+CONVERSATION_MEMORY_ENABLED = os.getenv("CONVERSATION_MEMORY_ENABLED", "true").lower() == "true"
+#Tokens maximos del historial que se agrega al prompt (resumen + turnos recientes)
+CONVERSATION_MAX_TOKENS = int(os.getenv("CONVERSATION_MAX_TOKENS", "600"))
+#Parte del presupuesto para el resumen de los turnos viejos
+CONVERSATION_SUMMARY_MAX_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_MAX_TOKENS", "150"))
+CONVERSATION_IDLE_SECONDS = float(os.getenv("CONVERSATION_IDLE_SECONDS", "1800"))
+CONVERSATION_MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", "10000"))
+
+#API HTTP (backend/api.py): consultas en paralelo por worker, cola de espera y plazo maximo en la cola
+API_MAX_CONCURRENT_QUERIES = int(os.getenv("API_MAX_CONCURRENT_QUERIES", "16"))
+API_MAX_QUEUE = int(os.getenv("API_MAX_QUEUE", "64"))
+API_QUEUE_TIMEOUT_SECONDS = float(os.getenv("API_QUEUE_TIMEOUT_SECONDS", "5"))
+API_MAX_QUESTION_CHARS = int(os.getenv("API_MAX_QUESTION_CHARS", "1000"))
+#Calentar Chroma, indices y clientes al arrancar el worker (readiness queda en 503 mientras tanto)
+API_WARMUP_ON_STARTUP = os.getenv("API_WARMUP_ON_STARTUP", "true").lower() == "true"
+
+#WhatsApp (integrations/): el webhook encola y responde enseguida, los workers generan y envian
+WHATSAPP_ENABLED = os.getenv("WHATSAPP_ENABLED", "false").lower() == "true"
+WHATSAPP_QUEUE_BACKEND = os.getenv("WHATSAPP_QUEUE_BACKEND", "sqlite") #sqlite, memory
+WHATSAPP_QUEUE_PATH = os.getenv("WHATSAPP_QUEUE_PATH", "./cache/whatsapp_queue.sqlite3")
+WHATSAPP_WORKERS = int(os.getenv("WHATSAPP_WORKERS", "4"))
+WHATSAPP_MAX_ATTEMPTS = int(os.getenv("WHATSAPP_MAX_ATTEMPTS", "3"))
+WHATSAPP_RETRY_DELAY_SECONDS = float(os.getenv("WHATSAPP_RETRY_DELAY_SECONDS", "5"))
+#Un mensaje en processing por mas tiempo se da por abandonado (worker o proceso caido) y vuelve a la cola
+WHATSAPP_VISIBILITY_TIMEOUT_SECONDS = float(os.getenv("WHATSAPP_VISIBILITY_TIMEOUT_SECONDS", "300"))
+#Con varios procesos, los mensajes de un numero van al proceso que tiene su memoria de conversacion
+WHATSAPP_SESSION_AFFINITY_SECONDS = float(os.getenv("WHATSAPP_SESSION_AFFINITY_SECONDS", str(CONVERSATION_IDLE_SECONDS)))
+#Twilio reintenta durante minutos; un dia de margen para reconocer reintentos tardios
+WHATSAPP_DEDUPE_TTL_SECONDS = float(os.getenv("WHATSAPP_DEDUPE_TTL_SECONDS", "86400"))
+WHATSAPP_SENDER = os.getenv("WHATSAPP_SENDER", "twilio") #twilio, fake
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+TWILIO_WHATSAPP_NUMBER = os.getenv("TWILIO_WHATSAPP_NUMBER")
+#El webhook solo acepta requests firmados por Twilio (X-Twilio-Signature con TWILIO_AUTH_TOKEN)
+WHATSAPP_VALIDATE_SIGNATURE = os.getenv("WHATSAPP_VALIDATE_SIGNATURE", "true").lower() == "true"
+#URL publica configurada en Twilio; detras de un proxy difiere de la que ve uvicorn y la firma no coincidiria
+WHATSAPP_WEBHOOK_URL = os.getenv("WHATSAPP_WEBHOOK_URL")
+
+#Multi-tenant: una coleccion por PYME; solo los tenants con trafico quedan abiertos en memoria
+TENANTS_CONFIG_PATH = os.getenv("TENANTS_CONFIG_PATH", "./tenants.json")
+TENANT_POOL_MAX_TENANTS = int(os.getenv("TENANT_POOL_MAX_TENANTS", "50"))
+TENANT_POOL_MAX_MEMORY_MB = float(os.getenv("TENANT_POOL_MAX_MEMORY_MB", "512"))
+#Parte de TENANT_POOL_MAX_MEMORY_MB para el cache de segmentos (HNSW) de Chroma; el resto es para numpy, snapshot y BM25
+TENANT_POOL_CHROMA_MEMORY_SHARE = float(os.getenv("TENANT_POOL_CHROMA_MEMORY_SHARE", "0.5"))
+TENANT_IDLE_SECONDS = float(os.getenv("TENANT_IDLE_SECONDS", "1800"))
+
+#Chunking: "structured" respeta secciones, parrafos y pares pregunta/respuesta; "chars" usa ventanas de caracteres
+CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "structured")
+
+#Contexto para el LLM: presupuesto de tokens y umbral para descartar chunks casi repetidos
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.85"))
+
+#Trazas por etapa del pipeline (JSONL en logs/) y ventana para percentiles de latencia
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "./logs/rag_traces.jsonl")
+#El archivo rota al llegar a TRACE_LOG_MAX_MB y se conservan TRACE_LOG_BACKUPS archivos anteriores
+TRACE_LOG_MAX_MB = float(os.getenv("TRACE_LOG_MAX_MB", "50"))
+TRACE_LOG_BACKUPS = int(os.getenv("TRACE_LOG_BACKUPS", "5"))
+#Texto de la pregunta en el log: "hash" (por defecto, permite agrupar sin guardarla), "truncate", "full" o "none"
+TRACE_QUERY_TEXT = os.getenv("TRACE_QUERY_TEXT", "hash")
+TRACE_QUERY_MAX_CHARS = int(os.getenv("TRACE_QUERY_MAX_CHARS", "40"))
+LATENCY_WINDOW_SIZE = int(os.getenv("LATENCY_WINDOW_SIZE", "2048"))
+
 COST_PER_1K_TOKENS_CHAT = 0.00015 
 COST_PER_1K_TOKENS_EMBEDDING = 0.00002
 
@@ -46,9 +199,16 @@ SYSTEM_PROMPT = """Eres un asistente virtual del Restaurante "El Buen Sabor" en
     
     Mantén un tono amigable y cercano, como un mesero experimentado."""
     
-print("Configuración cargada:")
-print(f"   - Chat Model: {CHAT_MODEL}")
-print(f"   - Embedding Model: {EMBEDDING_MODEL}")
-print(f"   - ChromaDB Path: {CHROMA_PERSIST_DIRECTORY}")
-print(f"   - Collection: {CHROMA_COLLECTION_NAME}")
-print(f"   - Top K Results: {TOP_K_RESULTS}")
\ No newline at end of file
+def print_config() -> None:
+    print("Configuración cargada:")
+    print(f"   - Chat Model: {CHAT_MODEL}")
+    print(f"   - Embedding Model: {EMBEDDING_MODEL}")
+    print(f"   - ChromaDB Path: {CHROMA_PERSIST_DIRECTORY}")
+    print(f"   - Collection: {CHROMA_COLLECTION_NAME}")
+    print(f"   - Top K Results: {TOP_K_RESULTS}")
+    print(f"   - Index Profile: {INDEX_PROFILE}")
+    print(f"   - Query Routing: {QUERY_ROUTING_METHOD if QUERY_ROUTING_ENABLED else 'off'}")
+    print(f"   - Fact Index: {'on' if FACT_INDEX_ENABLED else 'off'}")
+
+if __name__ == "__main__":
+    print_config()
@@ -0,0 +1,149 @@
+import re
+from typing import List, Dict, Set, Tuple
+
+from backend.token_counter import count_tokens, truncate_to_tokens
+from backend.config import (
+    CHAT_MODEL,
+    CONTEXT_MAX_TOKENS,
+    CONTEXT_DEDUP_THRESHOLD
+)
+
+#Solape minimo (en caracteres) para unir dos chunks consecutivos sin repetir texto
+MIN_OVERLAP_CHARS = 10
+#Si sobra menos que esto del presupuesto, no vale la pena recortar un bloque para meterlo
+MIN_TRUNCATED_TOKENS = 50
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def format_document(position: int, source: str, content: str) -> str:
+    return f"Documento {position} ({source}):\n{content}"
+
+
+def _merge_overlapping(first: str, second: str) -> str:
+    #Busca el sufijo mas largo de first que es prefijo de second (el overlap del chunking)
+    max_overlap = min(len(first), len(second))
+    for size in range(max_overlap, MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    #Chunks estructurados de la misma seccion: no repetir el encabezado
+    header, _, rest = second.partition("\n")
+    if header.startswith("===") and first.startswith(header + "\n"):
+        return f"{first}\n\n{rest}"
+    return f"{first}\n{second}"
+
+
+def _shingles(text: str, size: int = 3) -> Set[Tuple[str, ...]]:
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _merge_adjacent(documents: List[Dict]) -> List[Dict]:
+    #Agrupa los chunks consecutivos (chunk_index seguidos) de una misma fuente en un solo bloque
+    by_source: Dict[str, List[Tuple[int, Dict]]] = {}
+    for rank, doc in enumerate(documents):
+        by_source.setdefault(doc['source'], []).append((rank, doc))
+
+    blocks = []
+    for source, ranked_docs in by_source.items():
+        ranked_docs.sort(key=lambda item: item[1]['chunk_index'])
+        current = None
+        for rank, doc in ranked_docs:
+            if current is not None and doc['chunk_index'] == current['last_index']:
+                #El mismo chunk dos veces (ej. repetido en la fusion de resultados)
+                current['rank'] = min(current['rank'], rank)
+                continue
+            if current is not None and doc['chunk_index'] == current['last_index'] + 1:
+                current['content'] = _merge_overlapping(current['content'], doc['content'])
+                current['last_index'] = doc['chunk_index']
+                current['documents'].append(doc)
+                current['rank'] = min(current['rank'], rank)
+                continue
+            current = {
+                'source': source,
+                'content': doc['content'],
+                'last_index': doc['chunk_index'],
+                'documents': [doc],
+                'rank': rank
+            }
+            blocks.append(current)
+    #Los bloques conservan el orden de relevancia de su mejor chunk
+    blocks.sort(key=lambda block: block['rank'])
+    return blocks
+
+
+def build_context(
+    documents: List[Dict],
+    max_tokens: int = CONTEXT_MAX_TOKENS,
+    dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD,
+    model: str = CHAT_MODEL
+) -> Dict:
+    """Arma el contexto del prompt: une chunks solapados, quita casi-duplicados y respeta max_tokens.
+
+    Retorna el contexto y cuantos tokens se ahorraron frente a pegar los chunks tal cual.
+    """
+    if not documents:
+        return {
+            'context': "",
+            'tokens': 0,
+            'tokens_saved': 0,
+            'documents_used': [],
+            'merged': 0,
+            'dropped_duplicates': 0,
+            'dropped_budget': 0
+        }
+
+    naive_context = "\n\n".join(
+        format_document(i, doc['source'], doc['content'])
+        for i, doc in enumerate(documents, 1)
+    )
+    naive_tokens = count_tokens(naive_context, model)
+
+    blocks = _merge_adjacent(documents)
+    #Chunks que quedaron dentro del bloque de otro (consecutivos o repetidos)
+    merged = len(documents) - len(blocks)
+
+    parts = []
+    documents_used = []
+    seen_shingles: Set[Tuple[str, ...]] = set()
+    used_tokens = 0
+    dropped_duplicates = 0
+    dropped_budget = 0
+    separator_tokens = count_tokens("\n\n", model)
+
+    for block in blocks:
+        shingles = _shingles(block['content'])
+        #Casi-duplicado: la mayor parte de sus frases ya esta en el contexto
+        if shingles and len(shingles & seen_shingles) / len(shingles) >= dedup_threshold:
+            dropped_duplicates += len(block['documents'])
+            continue
+
+        text = format_document(len(parts) + 1, block['source'], block['content'])
+        tokens = count_tokens(text, model) + (separator_tokens if parts else 0)
+        if max_tokens and used_tokens + tokens > max_tokens:
+            remaining = max_tokens - used_tokens - (separator_tokens if parts else 0)
+            #Solo se recorta el bloque mas relevante; los demas se omiten si no caben
+            if parts or remaining < MIN_TRUNCATED_TOKENS:
+                dropped_budget += len(block['documents'])
+                continue
+            text = truncate_to_tokens(text, remaining, model)
+            tokens = count_tokens(text, model)
+
+        parts.append(text)
+        documents_used.extend(block['documents'])
+        seen_shingles |= shingles
+        used_tokens += tokens
+
+    context = "\n\n".join(parts)
+    context_tokens = count_tokens(context, model)
+    return {
+        'context': context,
+        'tokens': context_tokens,
+        'tokens_saved': max(0, naive_tokens - context_tokens),
+        'documents_used': documents_used,
+        'merged': merged,
+        'dropped_duplicates': dropped_duplicates,
+        'dropped_budget': dropped_budget
+    }
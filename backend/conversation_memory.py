@@ -0,0 +1,180 @@
+import re
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import List, Dict, Optional
+
+from backend.bm25_index import strip_accents, tokenize
+from backend.token_counter import count_tokens, truncate_to_tokens
+from backend.config import (
+    CONVERSATION_MAX_TOKENS,
+    CONVERSATION_SUMMARY_MAX_TOKENS,
+    CONVERSATION_IDLE_SECONDS,
+    CONVERSATION_MAX_SESSIONS
+)
+
+_WORD_PATTERN = re.compile(r"\w+")
+#Palabras que indican que la pregunta sigue a la anterior ("¿y...?", "¿eso incluye...?")
+FOLLOW_UP_STARTS = {'y', 'e', 'tambien', 'entonces', 'pero', 'ademas'}
+REFERENCE_WORDS = {'eso', 'esa', 'ese', 'esos', 'esas', 'ello', 'mismo', 'misma', 'alli', 'ahi', 'alla'}
+#Lo que se pregunta (precio, horario...) sin decir sobre que
+INTENT_WORDS = {
+    'cuanto', 'cuanta', 'cuantos', 'cuantas', 'cuesta', 'cuestan', 'precio', 'precios', 'valor',
+    'vale', 'valen', 'costo', 'hora', 'horas', 'horario', 'horarios', 'abren', 'cierran',
+    'incluye', 'incluyen', 'trae', 'traen', 'ingredientes', 'porcion', 'porciones', 'tamano',
+    'disponible', 'tienen', 'hay'
+}
+
+
+def _words(text: str) -> List[str]:
+    #Se conservan las tildes para la consulta; las comparaciones se hacen sin ellas
+    return _WORD_PATTERN.findall(text.lower())
+
+
+def _topic_words(text: str) -> List[str]:
+    #Palabras con contenido (menu, plato, servicio...) que no son intencion ni referencia
+    return [
+        word for word in _words(text)
+        if strip_accents(word) not in INTENT_WORDS | REFERENCE_WORDS | FOLLOW_UP_STARTS and tokenize(word)
+    ]
+
+
+def _intent_words(text: str) -> List[str]:
+    return [word for word in _words(text) if strip_accents(word) in INTENT_WORDS]
+
+
+def is_follow_up(query: str) -> bool:
+    words = [strip_accents(word) for word in _words(query)]
+    if not words:
+        return False
+    if words[0] in FOLLOW_UP_STARTS or REFERENCE_WORDS.intersection(words):
+        return True
+    #"¿cuanto cuesta?" sin decir que: depende de la pregunta anterior
+    return bool(_intent_words(query)) and not _topic_words(query)
+
+
+class ConversationMemory:
+    """Historial compacto por usuario (ej. numero de WhatsApp) con presupuesto de tokens.
+
+    Se guardan los turnos recientes completos; cuando superan max_tokens los mas viejos
+    pasan a un resumen de una linea por pregunta, acotado a summary_max_tokens, asi el
+    prompt no crece con la conversacion. Las sesiones inactivas se liberan por
+    idle_seconds y, si hay demasiadas, por LRU.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = CONVERSATION_MAX_TOKENS,
+        summary_max_tokens: int = CONVERSATION_SUMMARY_MAX_TOKENS,
+        idle_seconds: float = CONVERSATION_IDLE_SECONDS,
+        max_sessions: int = CONVERSATION_MAX_SESSIONS
+    ):
+        if max_tokens <= 0 or max_sessions <= 0:
+            raise ValueError("max_tokens y max_sessions deben ser mayores a 0")
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = min(summary_max_tokens, max_tokens)
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.rewrites = 0
+        self.evictions = 0
+
+    def _session(self, user_id: str) -> Optional[Dict]:
+        #Llamar con self._lock tomado
+        session = self._sessions.get(user_id)
+        if session is None:
+            return None
+        if time.monotonic() - session['last_used'] > self.idle_seconds:
+            self._sessions.pop(user_id)
+            self.evictions += 1
+            return None
+        return session
+
+    def _evict(self) -> None:
+        #Las sesiones estan ordenadas por ultimo uso: basta revisar el principio
+        now = time.monotonic()
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if now - session['last_used'] <= self.idle_seconds and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.pop(user_id)
+            self.evictions += 1
+
+    def rewrite_query(self, user_id: str, query: str) -> str:
+        """Convierte una pregunta de seguimiento en una consulta completa para la busqueda.
+
+        "¿y cuanto cuesta?" despues de "¿tienen bandeja paisa?" -> "¿y cuanto cuesta? bandeja paisa".
+        Si la pregunta ya trae su tema se le agrega lo que se preguntaba antes
+        ("¿y la punta de anca?" despues de "¿cuanto cuesta la bandeja?").
+        """
+        with self._lock:
+            session = self._session(user_id)
+            if session is None or not session['turns'] or not is_follow_up(query):
+                return query
+            previous = session['turns'][-1]['query']
+        own_topic = _topic_words(query)
+        if own_topic:
+            missing = [word for word in _intent_words(previous) if word not in _intent_words(query)]
+        else:
+            missing = [word for word in _topic_words(previous) if word not in own_topic]
+        if not missing:
+            return query
+        self.rewrites += 1
+        return f"{query.strip()} {' '.join(dict.fromkeys(missing))}"
+
+    def get_history(self, user_id: str) -> Optional[Dict]:
+        with self._lock:
+            session = self._session(user_id)
+            if session is None or (not session['turns'] and not session['summary']):
+                return None
+            return {
+                'summary': "; ".join(session['summary']),
+                'turns': [(turn['question'], turn['answer']) for turn in session['turns']],
+                'tokens': session['tokens'] + session['summary_tokens']
+            }
+
+    def add_turn(self, user_id: str, question: str, answer: str, retrieval_query: Optional[str] = None) -> None:
+        #Una respuesta larga no puede ocupar todo el presupuesto
+        answer = truncate_to_tokens(answer or "", self.max_tokens // 3)
+        turn = {
+            'question': question,
+            'answer': answer,
+            'query': retrieval_query or question,
+            'tokens': count_tokens(question) + count_tokens(answer)
+        }
+        with self._lock:
+            session = self._session(user_id)
+            if session is None:
+                session = {'turns': deque(), 'summary': [], 'tokens': 0, 'summary_tokens': 0}
+                self._sessions[user_id] = session
+            session['turns'].append(turn)
+            session['tokens'] += turn['tokens']
+            session['last_used'] = time.monotonic()
+            self._sessions.move_to_end(user_id)
+            self._compact(session)
+            self._evict()
+
+    def _compact(self, session: Dict) -> None:
+        #Los turnos viejos pasan al resumen (solo la pregunta) hasta entrar en el presupuesto
+        while len(session['turns']) > 1 and session['tokens'] + session['summary_tokens'] > self.max_tokens:
+            old = session['turns'].popleft()
+            session['tokens'] -= old['tokens']
+            session['summary'].append(old['query'])
+            session['summary_tokens'] = count_tokens("; ".join(session['summary']))
+            while session['summary'] and session['summary_tokens'] > self.summary_max_tokens:
+                session['summary'].pop(0)
+                session['summary_tokens'] = count_tokens("; ".join(session['summary']))
+
+    def clear(self, user_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(user_id, None) is not None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'rewrites': self.rewrites,
+                'evictions': self.evictions
+            }
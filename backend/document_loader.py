@@ -1,6 +1,17 @@
 import os
-from typing import List, Dict
-from backend.config import KNOWLEDGE_BASE_PATH
+import re
+import hashlib
+import unicodedata
+from typing import List, Dict, Iterator, Optional, Tuple
+from backend.config import KNOWLEDGE_BASE_PATH, CHUNKING_STRATEGY
+
+#Encabezados de seccion de la base de conocimiento: "=== MENÚ Y ALIMENTOS ==="
+SECTION_PATTERN = re.compile(r"^===\s*(.+?)\s*===\s*$")
+#Linea de plato con precio: "Bandeja Paisa - $15.000"
+PRICE_LINE_PATTERN = re.compile(r"^([^\-\s$][^$]{0,60}?)\s+-\s+\$\s?(\d{1,3}(?:[.,]\d{3})+|\d+)\s*$")
+#Linea de horario: "Lunes a Viernes: 8:00 AM - 8:00 PM" o "Domingos: CERRADO"
+HOURS_LINE_PATTERN = re.compile(r"^([^\-:][^:]{2,40}):\s*(.+?)\s*$")
+DAY_NAMES = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']
 
 def load_single_document(file_path: str) -> str:
     #Los archivos normalmente vienen en binario en el txt, este metodo es para convertirlos a texto normal y guardarlos localmente en variables de python
@@ -75,29 +86,233 @@ def split_text_into_chunks(
         start += chunk_size - chunk_overlap
     return chunks
 
-def load_and_split_documents(
-    directory_path: str = KNOWLEDGE_BASE_PATH,
+def iter_paragraphs(text: str) -> Iterator[Tuple[Optional[str], str]]:
+    #Genera (seccion, parrafo); los parrafos se separan por lineas en blanco
+    section = None
+    lines = []
+    for line in text.splitlines():
+        header = SECTION_PATTERN.match(line.strip())
+        if header or not line.strip():
+            if lines:
+                yield section, "\n".join(lines)
+                lines = []
+            if header:
+                section = header.group(1)
+            continue
+        lines.append(line.rstrip())
+    if lines:
+        yield section, "\n".join(lines)
+
+def _is_question(paragraph: str) -> bool:
+    return paragraph.startswith("¿") and paragraph.endswith("?") and "\n" not in paragraph
+
+def iter_blocks(text: str) -> Iterator[Tuple[Optional[str], str]]:
+    #Unidades que no se deben partir: un parrafo, o una pregunta junto a su respuesta
+    pending_question = None
+    for section, paragraph in iter_paragraphs(text):
+        if pending_question is not None:
+            question_section, question = pending_question
+            pending_question = None
+            if question_section == section:
+                yield section, f"{question}\n{paragraph}"
+                continue
+            yield question_section, question
+        if _is_question(paragraph):
+            pending_question = (section, paragraph)
+            continue
+        yield section, paragraph
+    if pending_question is not None:
+        yield pending_question
+
+def _split_long_block(block: str, chunk_size: int, chunk_overlap: int) -> Iterator[str]:
+    #Un bloque mas largo que chunk_size se parte por lineas y, si aun no alcanza, por caracteres
+    current = ""
+    for line in block.split("\n"):
+        if len(line) > chunk_size:
+            if current:
+                yield current
+                current = ""
+            yield from split_text_into_chunks(line, chunk_size, chunk_overlap)
+            continue
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > chunk_size and current:
+            yield current
+            candidate = line
+        current = candidate
+    if current:
+        yield current
+
+def iter_structured_chunks(
+    text: str,
     chunk_size: int = 500,
     chunk_overlap: int = 50
-) -> List[Dict[str,str]]:
-    documents = load_all_documents(directory_path)
-    all_chunks = []
-    
-    for doc in documents:
-        content = doc['content']
-        source = doc['source']
-        chunks = split_text_into_chunks(content, chunk_size, chunk_overlap)
-        
-        for index, chunk in enumerate(chunks):
-            chunk_with_metadata = {
+) -> Iterator[Tuple[Optional[str], str]]:
+    """Genera (seccion, chunk) sin cortar platos, respuestas ni encabezados.
+
+    Junta bloques de la misma seccion hasta chunk_size caracteres; cada chunk
+    lleva el encabezado de su seccion para que el contexto no se pierda.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size debe ser mayor a 0")
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap debe ser menor que chunk_size")
+
+    current_section = None
+    current = []
+    current_length = 0
+    title = None
+    produced = False
+    for section, block in iter_blocks(text):
+        #El titulo del archivo (una linea antes de la primera seccion) no aporta como chunk aislado
+        if not produced and not current and section is None and title is None and "\n" not in block:
+            title = block
+            continue
+        produced = True
+        if current and (section != current_section or current_length + len(block) + 2 > chunk_size):
+            yield current_section, "\n\n".join(current)
+            current = []
+            current_length = 0
+        current_section = section
+        if len(block) > chunk_size:
+            yield from ((section, part) for part in _split_long_block(block, chunk_size, chunk_overlap))
+            continue
+        current.append(block)
+        current_length += len(block) + 2
+    if current:
+        yield current_section, "\n\n".join(current)
+    elif not produced and title is not None:
+        yield None, title
+
+def _strip_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(c for c in decomposed if unicodedata.category(c) != "Mn")
+
+def parse_days(text: str) -> List[str]:
+    #"Lunes a Viernes" -> lunes..viernes, "Sábados" -> sabado; [] si no es una expresion de dias
+    words = re.findall(r"[a-z]+", _strip_accents(text.lower()))
+    days = [word.rstrip("s") if word.rstrip("s") in DAY_NAMES else word for word in words]
+    if not days or any(day not in DAY_NAMES + ['a', 'y'] for day in days):
+        return []
+    result = []
+    i = 0
+    while i < len(days):
+        if days[i] in ('a', 'y'):
+            i += 1
+            continue
+        if i + 2 < len(days) and days[i + 1] == 'a' and days[i + 2] in DAY_NAMES:
+            start, end = DAY_NAMES.index(days[i]), DAY_NAMES.index(days[i + 2])
+            result.extend(DAY_NAMES[start:end + 1])
+            i += 3
+            continue
+        result.append(days[i])
+        i += 1
+    return result
+
+def extract_facts(chunks: List[Dict]) -> Dict[str, List[Dict]]:
+    """Datos puntuales de los chunks: platos con precio y categoria, y horarios por dia.
+
+    Solo se toman lineas con formato regular ("Plato - $15.000", "Sábados: 9:00 AM - 9:00 PM"
+    dentro de una seccion de horarios); el resto de la base se sigue respondiendo con el LLM.
+    """
+    items: Dict[str, Dict] = {}
+    hours: Dict[str, Dict] = {}
+    for chunk in chunks:
+        section = chunk.get('section') or None
+        for paragraph_section, paragraph in iter_paragraphs(chunk['content']):
+            section = paragraph_section or section
+            for line in paragraph.splitlines():
+                line = line.strip()
+                price = PRICE_LINE_PATTERN.match(line)
+                if price:
+                    name = price.group(1).strip()
+                    items.setdefault(name.lower(), []).append({
+                        'name': name,
+                        'price': int(re.sub(r"[.,]", "", price.group(2))),
+                        'category': section or "",
+                        'source': chunk['source'],
+                        'chunk_index': chunk['chunk_index']
+                    })
+                    continue
+                schedule = HOURS_LINE_PATTERN.match(line)
+                if schedule and section and "HORARIO" in _strip_accents(section.upper()):
+                    for day in parse_days(schedule.group(1)):
+                        hours.setdefault(day, []).append({
+                            'day': day,
+                            'label': schedule.group(1).strip(),
+                            'hours': schedule.group(2),
+                            'closed': "cerrado" in schedule.group(2).lower(),
+                            'source': chunk['source'],
+                            'chunk_index': chunk['chunk_index']
+                        })
+    #Con chunks solapados un mismo dato puede aparecer varias veces; si no coincide (chunk cortado) se descarta
+    return {
+        'items': [found[0] for found in items.values() if len({entry['price'] for entry in found}) == 1],
+        'hours': [found[0] for found in hours.values() if len({entry['hours'] for entry in found}) == 1]
+    }
+
+def make_chunk_id(source: str, content: str) -> str:
+    #El id depende del contenido: insertar un parrafo no cambia los ids de los demas chunks
+    content_hash = hashlib.sha256(f"{source}\x00{content}".encode("utf-8")).hexdigest()[:16]
+    return f"{source}_{content_hash}"
+
+def iter_document_chunks(
+    document: Dict[str, str],
+    chunk_size: int = 500,
+    chunk_overlap: int = 50,
+    strategy: str = CHUNKING_STRATEGY
+) -> Iterator[Dict]:
+    source = document['source']
+    if strategy == "chars":
+        #Estrategia original: ventanas de caracteres con ids por posicion
+        for index, chunk in enumerate(split_text_into_chunks(document['content'], chunk_size, chunk_overlap)):
+            yield {
                 'content': chunk,
                 'source': source,
                 'chunk_index': index
             }
-            all_chunks.append(chunk_with_metadata)
+        return
+    if strategy != "structured":
+        raise ValueError(f"Estrategia de chunking desconocida: {strategy}")
+
+    seen_ids = {}
+    for index, (section, chunk) in enumerate(iter_structured_chunks(document['content'], chunk_size, chunk_overlap)):
+        content = f"=== {section} ===\n{chunk}" if section else chunk
+        chunk_id = make_chunk_id(source, content)
+        #Texto repetido dentro del mismo archivo: se numera la repeticion
+        occurrence = seen_ids.get(chunk_id, 0)
+        seen_ids[chunk_id] = occurrence + 1
+        if occurrence:
+            chunk_id = f"{chunk_id}_{occurrence + 1}"
+        yield {
+            'content': content,
+            'source': source,
+            'chunk_index': index,
+            'section': section or "",
+            'chunk_id': chunk_id
+        }
+
+def iter_chunks(
+    documents: List[Dict[str, str]],
+    chunk_size: int = 500,
+    chunk_overlap: int = 50,
+    strategy: str = CHUNKING_STRATEGY
+) -> Iterator[Dict]:
+    for doc in documents:
+        yield from iter_document_chunks(doc, chunk_size, chunk_overlap, strategy)
+
+def load_and_split_documents(
+    directory_path: str = KNOWLEDGE_BASE_PATH,
+    chunk_size: int = 500,
+    chunk_overlap: int = 50,
+    strategy: str = CHUNKING_STRATEGY
+) -> List[Dict[str,str]]:
+    documents = load_all_documents(directory_path)
+    all_chunks = list(iter_chunks(documents, chunk_size, chunk_overlap, strategy))
     print(f"\n Total de chunks generados: {len(all_chunks)}")   
+    print(f" Estrategia: {strategy}")
     print(f" Tamaño chunk: {chunk_size} caracteres")
-    print(f" Overlap: {chunk_overlap} caracteres")
+    if strategy == "chars":
+        print(f" Overlap: {chunk_overlap} caracteres")
     
     return all_chunks     
     
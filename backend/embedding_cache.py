@@ -0,0 +1,180 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from backend.config import (
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_ENTRIES
+)
+
+
+def normalize_text(text: str) -> str:
+    #Colapsa saltos de linea y espacios repetidos para que textos equivalentes compartan clave
+    return " ".join(text.split())
+
+
+def make_cache_key(model: str, text: str) -> str:
+    #La clave depende del modelo: el mismo texto con otro modelo produce otro vector
+    digest = hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+    return digest
+
+
+class EmbeddingCache:
+    """Cache en disco (SQLite) de embeddings con expulsion LRU."""
+
+    def __init__(
+        self,
+        path: str = EMBEDDING_CACHE_PATH,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES
+    ):
+        if max_entries <= 0:
+            raise ValueError("max_entries debe ser mayor a 0")
+
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+
+        #check_same_thread=False porque el cache se comparte entre hilos; el lock serializa el acceso
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                dtype TEXT NOT NULL DEFAULT 'float32'
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)"
+        )
+        #Caches creados antes guardaban float64: esas filas se siguen leyendo con su tipo
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        if 'dtype' not in columns:
+            try:
+                self._conn.execute("ALTER TABLE embeddings ADD COLUMN dtype TEXT NOT NULL DEFAULT 'float64'")
+            except sqlite3.OperationalError:
+                #Otro proceso agrego la columna al mismo tiempo
+                pass
+        self._conn.commit()
+
+    @staticmethod
+    def _encode(embedding: List[float]) -> bytes:
+        #float32 como kb_versions y Chroma: la mitad de espacio que float64 sin perder precision util
+        return np.asarray(embedding, dtype=np.float32).tobytes()
+
+    @staticmethod
+    def _decode(blob: bytes, dtype: str = "float32") -> List[float]:
+        return np.frombuffer(blob, dtype=dtype).tolist()
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, List[float]]:
+        #Retorna {texto: embedding} solo para los textos encontrados
+        if not texts:
+            return {}
+
+        keys = {make_cache_key(model, text): text for text in texts}
+        found = {}
+        now = time.time()
+
+        with self._lock:
+            key_list = list(keys.keys())
+            #SQLite limita la cantidad de parametros por consulta
+            for i in range(0, len(key_list), 500):
+                part = key_list[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, embedding, dtype FROM embeddings WHERE key IN ({placeholders})",
+                    part
+                ).fetchall()
+                for key, blob, dtype in rows:
+                    found[keys[key]] = self._decode(blob, dtype)
+
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                        [(now, key) for key, _, _ in rows]
+                    )
+            self._conn.commit()
+
+            unique_texts = set(texts)
+            self.hits += len(found)
+            self.misses += len(unique_texts) - len(found)
+
+        return found
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        return self.get_many(model, [text]).get(text)
+
+    def put_many(self, model: str, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+
+        now = time.time()
+        rows = [
+            (make_cache_key(model, text), model, self._encode(embedding), "float32", now)
+            for text, embedding in items.items()
+        ]
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, embedding, dtype, last_access) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def put(self, model: str, text: str, embedding: List[float]) -> None:
+        self.put_many(model, {text: embedding})
+
+    def _evict(self) -> None:
+        #Elimina las entradas menos usadas recientemente cuando se supera el limite
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                """DELETE FROM embeddings WHERE key IN (
+                    SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?
+                )""",
+                (overflow,)
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def get_stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total) if total else 0.0,
+            'entries': len(self),
+            'max_entries': self.max_entries,
+            'path': self.path
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
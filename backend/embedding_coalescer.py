@@ -0,0 +1,160 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Optional, Callable
+
+from backend.embeddings_manual import (
+    get_embedding,
+    aget_embedding,
+    get_embeddings_batch,
+    get_embedding_cache
+)
+from backend.embedding_cache import normalize_text
+from backend.token_counter import count_tokens
+from backend.tracing import span
+from backend.config import (
+    EMBEDDING_MODEL,
+    QUERY_EMBEDDING_COALESCING,
+    COALESCE_MAX_BATCH_SIZE,
+    COALESCE_MAX_WAIT_MS,
+    COALESCE_MAX_IN_FLIGHT
+)
+
+
+class EmbeddingCoalescer:
+    """Agrupa las preguntas que llegan casi al mismo tiempo en un solo request de embeddings.
+
+    Un hilo despachador espera la primera pregunta, junta las que lleguen dentro de
+    max_wait_ms (hasta max_batch_size) y envia el lote; cada llamador recibe su vector.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = COALESCE_MAX_BATCH_SIZE,
+        max_wait_ms: float = COALESCE_MAX_WAIT_MS,
+        max_in_flight: int = COALESCE_MAX_IN_FLIGHT,
+        embed_function: Callable[[List[str]], List[List[float]]] = get_embeddings_batch
+    ):
+        if max_batch_size <= 0:
+            raise ValueError("max_batch_size debe ser mayor a 0")
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.embed_function = embed_function
+        self._queue: "queue.Queue" = queue.Queue()
+        #Varios lotes pueden estar en vuelo mientras se arma el siguiente
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="coalesce")
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.upstream_texts = 0
+        self._dispatcher = threading.Thread(target=self._run, name="embedding-coalescer", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, text: str) -> Future:
+        text = normalize_text(text)
+        if not text:
+            raise ValueError("El texto no puede estar vacio")
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        return self.submit(text).result(timeout=timeout)
+
+    async def aembed(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _collect(self) -> List:
+        first = self._queue.get()
+        pending = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(pending) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return pending
+
+    def _run(self) -> None:
+        while True:
+            pending = self._collect()
+            self._executor.submit(self._dispatch, pending)
+
+    def _dispatch(self, pending: List) -> None:
+        #Preguntas repetidas dentro del lote se envian una sola vez
+        unique_texts = list(dict.fromkeys(text for text, _ in pending))
+        try:
+            embeddings = self.embed_function(unique_texts)
+            by_text = dict(zip(unique_texts, embeddings))
+            for text, future in pending:
+                future.set_result(by_text[text])
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+        with self._stats_lock:
+            self.requests += len(pending)
+            self.batches += 1
+            self.upstream_texts += len(unique_texts)
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                'requests': self.requests,
+                'batches': self.batches,
+                'upstream_texts': self.upstream_texts,
+                'avg_batch_size': (self.requests / self.batches) if self.batches else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000
+            }
+
+
+_coalescer: Optional[EmbeddingCoalescer] = None
+_coalescer_lock = threading.Lock()
+
+def get_coalescer() -> EmbeddingCoalescer:
+    global _coalescer
+    if _coalescer is None:
+        with _coalescer_lock:
+            if _coalescer is None:
+                _coalescer = EmbeddingCoalescer()
+    return _coalescer
+
+def _cached_query_embedding(text: str) -> Optional[List[float]]:
+    #Las preguntas ya vistas no esperan la ventana de agrupacion
+    cache = get_embedding_cache()
+    if cache is None:
+        return None
+    return cache.get(EMBEDDING_MODEL, normalize_text(text))
+
+def _embedding_span_attributes(text: str) -> Dict:
+    return {'tokens': count_tokens(text, EMBEDDING_MODEL), 'coalesced': QUERY_EMBEDDING_COALESCING}
+
+def get_query_embedding(text: str) -> List[float]:
+    if not text or text.strip() == "":
+        raise ValueError("El texto no puede estar vacio")
+    with span('query_embedding', **_embedding_span_attributes(text)) as data:
+        if not QUERY_EMBEDDING_COALESCING:
+            return get_embedding(text)
+        cached = _cached_query_embedding(text)
+        data['cached'] = cached is not None
+        if cached is not None:
+            return cached
+        return get_coalescer().embed(text)
+
+async def aget_query_embedding(text: str) -> List[float]:
+    if not text or text.strip() == "":
+        raise ValueError("El texto no puede estar vacio")
+    with span('query_embedding', **_embedding_span_attributes(text)) as data:
+        if not QUERY_EMBEDDING_COALESCING:
+            return await aget_embedding(text)
+        cached = _cached_query_embedding(text)
+        data['cached'] = cached is not None
+        if cached is not None:
+            return cached
+        return await get_coalescer().aembed(text)
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import glob
+from typing import List, Dict, Optional, Sequence
+
+import numpy as np
+
+from backend.numpy_vector_index import NumpyVectorIndex
+from backend.config import SNAPSHOT_BLOCK_SIZE
+
+SNAPSHOT_DTYPES = ("float16", "int8")
+SIDECAR_NAME = "snapshot.json"
+
+
+def quantize(matrix: np.ndarray, dtype: str):
+    #Retorna (matriz cuantizada, escala por fila o None). Las filas ya vienen normalizadas
+    if dtype == "float16":
+        return matrix.astype(np.float16), None
+    if dtype == "int8":
+        #Cuantizacion simetrica por fila: cada vector usa todo el rango [-127, 127]
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(matrix / scales[:, np.newaxis]), -127, 127).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    raise ValueError(f"Tipo de snapshot no soportado: {dtype}")
+
+
+def _save_npy(path: str, array: np.ndarray) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as file:
+        np.save(file, array)
+    os.replace(tmp_path, path)
+
+
+def export_snapshot(
+    index: NumpyVectorIndex,
+    directory: str,
+    dtype: str = "float16",
+    index_version: Optional[str] = None
+) -> Dict:
+    """Escribe los embeddings del indice como matriz .npy cuantizada mas un sidecar JSON.
+
+    Los archivos de la matriz llevan un sufijo por exportacion y el sidecar se reemplaza al
+    final: los workers que tienen mapeado el snapshot anterior siguen funcionando.
+    """
+    if dtype not in SNAPSHOT_DTYPES:
+        raise ValueError(f"Tipo de snapshot no soportado: {dtype}")
+    os.makedirs(directory, exist_ok=True)
+    start_time = time.time()
+    quantized, scales = quantize(index.matrix, dtype)
+    stamp = time.strftime("%Y%m%d%H%M%S") + f"_{os.getpid()}"
+    matrix_file = f"embeddings_{stamp}.{dtype}.npy"
+    _save_npy(os.path.join(directory, matrix_file), quantized)
+    scales_file = None
+    if scales is not None:
+        scales_file = f"scales_{stamp}.npy"
+        _save_npy(os.path.join(directory, scales_file), scales)
+
+    sidecar = {
+        'dtype': dtype,
+        'space': index.space,
+        'count': len(index),
+        'dim': int(index.matrix.shape[1]) if len(index) else 0,
+        'matrix_file': matrix_file,
+        'scales_file': scales_file,
+        'index_version': index_version,
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'ids': index.ids,
+        'documents': index.documents,
+        'metadatas': index.metadatas
+    }
+    sidecar_path = os.path.join(directory, SIDECAR_NAME)
+    with open(f"{sidecar_path}.tmp", 'w', encoding='utf-8') as file:
+        json.dump(sidecar, file, ensure_ascii=False)
+    os.replace(f"{sidecar_path}.tmp", sidecar_path)
+    _remove_old_files(directory, keep={matrix_file, scales_file})
+
+    size = quantized.nbytes + (scales.nbytes if scales is not None else 0)
+    print(f"Snapshot {dtype} exportado: {len(index)} vectores, {size / 1e6:.1f} MB en {time.time() - start_time:.2f}s")
+    return {
+        'directory': directory,
+        'dtype': dtype,
+        'count': len(index),
+        'matrix_bytes': size,
+        'float32_bytes': index.matrix.nbytes
+    }
+
+
+def _remove_old_files(directory: str, keep: set) -> None:
+    #Se conserva la exportacion anterior para los workers que todavia la tengan abierta
+    files = sorted(
+        glob.glob(os.path.join(directory, "embeddings_*.npy")) + glob.glob(os.path.join(directory, "scales_*.npy")),
+        key=os.path.getmtime
+    )
+    old = [path for path in files if os.path.basename(path) not in keep]
+    previous = old[-2:]
+    for path in old:
+        if path not in previous:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class SnapshotVectorIndex(NumpyVectorIndex):
+    """Indice de solo lectura sobre un snapshot mapeado en memoria (np.load con mmap_mode='r').
+
+    Todos los workers que abren el mismo archivo comparten sus paginas a traves del page
+    cache del sistema operativo. La busqueda recorre la matriz por bloques: solo un bloque
+    se convierte a float32 a la vez.
+    """
+
+    def __init__(self, space: str = "cosine", block_size: int = SNAPSHOT_BLOCK_SIZE):
+        super().__init__(space=space)
+        self.block_size = block_size
+        self.dtype = "float32"
+        self.scales: Optional[np.ndarray] = None
+        self.index_version: Optional[str] = None
+
+    @classmethod
+    def load(cls, directory: str, block_size: int = SNAPSHOT_BLOCK_SIZE) -> "SnapshotVectorIndex":
+        with open(os.path.join(directory, SIDECAR_NAME), 'r', encoding='utf-8') as file:
+            sidecar = json.load(file)
+        index = cls(space=sidecar['space'], block_size=block_size)
+        index.dtype = sidecar['dtype']
+        index.index_version = sidecar.get('index_version')
+        index.ids = sidecar['ids']
+        index.documents = sidecar['documents']
+        index.metadatas = sidecar['metadatas']
+        index.matrix = np.load(os.path.join(directory, sidecar['matrix_file']), mmap_mode='r')
+        if sidecar.get('scales_file'):
+            index.scales = np.load(os.path.join(directory, sidecar['scales_file']), mmap_mode='r')
+        if len(index.matrix) != len(index.ids):
+            raise ValueError(f"Snapshot inconsistente: {len(index.matrix)} vectores y {len(index.ids)} ids")
+        return index
+
+    def memory_bytes(self) -> int:
+        #La matriz mapeada vive en el page cache compartido; aqui solo cuenta lo privado del worker
+        return sum(len(document) for document in self.documents)
+
+    def mapped_bytes(self) -> int:
+        return self.matrix.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def _block_similarities(self, queries: np.ndarray, start: int, end: int, mask: Optional[np.ndarray]) -> np.ndarray:
+        block = np.asarray(self.matrix[start:end], dtype=np.float32)
+        similarities = queries @ block.T
+        if self.scales is not None:
+            similarities *= np.asarray(self.scales[start:end])[np.newaxis, :]
+        if mask is not None:
+            similarities[:, ~mask[start:end]] = -np.inf
+        return similarities
+
+    def search(
+        self,
+        query_embeddings,
+        n_results: int = 3,
+        sources: Optional[Sequence[str]] = None
+    ) -> List[List[Dict]]:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[np.newaxis, :]
+        if len(self.ids) == 0 or n_results <= 0:
+            return [[] for _ in range(len(queries))]
+        if queries.shape[1] != self.matrix.shape[1]:
+            raise ValueError(
+                f"Dimension de la consulta distinta al indice: "
+                f"{queries.shape[1]} vs {self.matrix.shape[1]}"
+            )
+        queries = self._normalize(queries)
+        mask = self.source_mask(sources)
+
+        best = None
+        best_scores = None
+        for start in range(0, len(self.ids), self.block_size):
+            end = min(start + self.block_size, len(self.ids))
+            if mask is not None and not mask[start:end].any():
+                continue
+            top, top_scores = self._top_k(self._block_similarities(queries, start, end, mask), n_results)
+            top = top + start
+            if best is None:
+                best, best_scores = top, top_scores
+                continue
+            #Se combinan los k mejores acumulados con los k mejores del bloque
+            merged, merged_scores = np.hstack([best, top]), np.hstack([best_scores, top_scores])
+            order, best_scores = self._top_k(merged_scores, n_results)
+            best = np.take_along_axis(merged, order, axis=1)
+        if best is None:
+            return [[] for _ in range(len(queries))]
+        return self._format_results(best, best_scores)
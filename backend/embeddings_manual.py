@@ -1,64 +1,162 @@
-from openai import OpenAI
-from typing import List
+import numpy as np
+from typing import List, Dict, Optional
 import time
+import threading
 
 from backend.config import (
-    OPENAI_API_KEY,
     EMBEDDING_MODEL,
-    COST_PER_1K_TOKENS_CHAT
+    COST_PER_1K_TOKENS_CHAT,
+    EMBEDDING_CACHE_ENABLED
 )
+from backend.embedding_cache import EmbeddingCache, normalize_text
+from backend.openai_clients import get_client, get_async_client
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    #El cache se abre la primera vez que se necesita; el lock evita que dos hilos abran cada uno el suyo
+    global _embedding_cache
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache()
+    return _embedding_cache
+
+def get_cache_stats() -> Dict:
+    cache = get_embedding_cache()
+    if cache is None:
+        return {'enabled': False, 'hits': 0, 'misses': 0}
+    stats = cache.get_stats()
+    stats['enabled'] = True
+    return stats
  
-def get_embedding(text: str) -> List[float]:
+def _prepare_text(text: str) -> str:
     if not text or text.strip() == "":
         raise ValueError ("El texto no puede estar vacio")
-    
     #Limpiar el texto antes de enviar a OpenAI
-    text = text.replace('\n', ' ').strip()
+    return normalize_text(text)
+
+def _prepare_batch(texts: List[str]):
+    #Retorna (textos limpios, embeddings en cache, textos a pedir a la API)
+    if not texts or len(texts) == 0:
+        raise ValueError("La lista de texto no puede estar vacia")
+    
+    #Limpiar textos antes de enviar
+    cleaned_texts = [normalize_text(text) for text in texts]
+    #Filtrar textos vacios despues de limpiar
+    cleaned_texts = [t for t in cleaned_texts if t]
+    if len(cleaned_texts) == 0:
+        raise ValueError("Todos los textos estan vacios despues de limpiar")
+    
+    cache = get_embedding_cache()
+    found = cache.get_many(EMBEDDING_MODEL, cleaned_texts) if cache is not None else {}
+    #Solo los textos que no estan en cache van a la API, sin repetidos y en un solo lote
+    missing = list(dict.fromkeys(t for t in cleaned_texts if t not in found))
+    return cleaned_texts, found, missing
+
+def _finish_batch(cleaned_texts, found, missing, response, start_time) -> List[List[float]]:
+    new_embeddings = {
+        text: item.embedding for text, item in zip(missing, response.data)
+    }
+    cache = get_embedding_cache()
+    if cache is not None:
+        cache.put_many(EMBEDDING_MODEL, new_embeddings)
+    found.update(new_embeddings)
+    embeddings = [found[t] for t in cleaned_texts]
+    
+    #Calcular tiempo transcurrido
+    elapse_time = time.time() - start_time
+    total_tokens = response.usage.total_tokens
+    estimated_cost = (total_tokens / 1000) * COST_PER_1K_TOKENS_CHAT
+    
+    print(f"Embeddings generados en {elapse_time:.2f}s")
+    print(f"Tokens usados: {total_tokens:,}")
+    print(f"Costo estimado: ${estimated_cost:.6f} USD")
+    
+    return embeddings
+ 
+def get_embedding(text: str) -> List[float]:
+    text = _prepare_text(text)
+    
+    cache = get_embedding_cache()
+    if cache is not None:
+        cached = cache.get(EMBEDDING_MODEL, text)
+        if cached is not None:
+            return cached
     
     try:
-        response = client.embeddings.create(
+        response = get_client().embeddings.create(
             #Texto a convertir
             input=text,
             model=EMBEDDING_MODEL
         )
         embedding = response.data[0].embedding
+        if cache is not None:
+            cache.put(EMBEDDING_MODEL, text, embedding)
         return embedding
     except Exception as e:
         print(f"Error al generar embedding: {str(e)}")
         raise
     
 def get_embeddings_batch(texts: List[str]) -> List[List[float]]:
-    if not texts or len(texts) == 0:
-        raise ValueError("La lista de texto no puede estar vacia")
+    cleaned_texts, found, missing = _prepare_batch(texts)
+    if not missing:
+        print(f"Embeddings obtenidos del cache: {len(cleaned_texts)} textos")
+        return [found[t] for t in cleaned_texts]
     
-    #Limpiar textos antes de enviar
-    cleaned_texts = [text.replace('\n', ' ').strip() for text in texts]
-    #Filtrar textos vacios despues de limpiar
-    cleaned_texts = [t for t in cleaned_texts if t]
-    if len(cleaned_texts) == 0:
-        raise ValueError("Todos los textos estan vacios despues de limpiar")
-    print(f"Generando embeddings para {len(cleaned_texts)} textos...")
+    print(f"Generando embeddings para {len(missing)} textos ({len(found)} en cache)...")
     start_time = time.time()
     
     try:
-        response = client.embeddings.create(
-            input=cleaned_texts,
+        response = get_client().embeddings.create(
+            input=missing,
             model=EMBEDDING_MODEL
         )
-        embeddings = [item.embedding for item in response.data]
-        
-        #Calcular tiempo transcurrido
-        elapse_time = time.time() - start_time
-        total_tokens = response.usage.total_tokens
-        estimated_cost = (total_tokens / 1000) * COST_PER_1K_TOKENS_CHAT
-        
-        print(f"Embeddings generados en {elapse_time:.2f}s")
-        print(f"Tokens usados: {total_tokens:,}")
-        print(f"Costo estimado: ${estimated_cost:.6f} USD")
-        
-        return embeddings
+        return _finish_batch(cleaned_texts, found, missing, response, start_time)
+    except Exception as e:
+        print(f"Error al generar embeddings batch: {str(e)}")
+        raise
+
+async def aget_embedding(text: str) -> List[float]:
+    #Version async de get_embedding: no bloquea el event loop mientras espera a OpenAI
+    text = _prepare_text(text)
+    
+    cache = get_embedding_cache()
+    if cache is not None:
+        cached = cache.get(EMBEDDING_MODEL, text)
+        if cached is not None:
+            return cached
+    
+    try:
+        response = await get_async_client().embeddings.create(
+            input=text,
+            model=EMBEDDING_MODEL
+        )
+        embedding = response.data[0].embedding
+        if cache is not None:
+            cache.put(EMBEDDING_MODEL, text, embedding)
+        return embedding
+    except Exception as e:
+        print(f"Error al generar embedding: {str(e)}")
+        raise
+
+async def aget_embeddings_batch(texts: List[str]) -> List[List[float]]:
+    cleaned_texts, found, missing = _prepare_batch(texts)
+    if not missing:
+        return [found[t] for t in cleaned_texts]
+    
+    print(f"Generando embeddings para {len(missing)} textos ({len(found)} en cache)...")
+    start_time = time.time()
+    
+    try:
+        response = await get_async_client().embeddings.create(
+            input=missing,
+            model=EMBEDDING_MODEL
+        )
+        return _finish_batch(cleaned_texts, found, missing, response, start_time)
     except Exception as e:
         print(f"Error al generar embeddings batch: {str(e)}")
         raise
@@ -69,17 +167,17 @@ def cosine_similarity(embedding1: List[float], embedding2: List[float]) -> float
             f"Embedding no tienen la misma dimension: "
             f"{len(embedding1)} vs {len(embedding2)}"
         )
-        
-    #Calcular producto punto, el zip empareja elementos
-    dot_product = sum(a * b for a, b  in zip(embedding1,embedding2))
+    
+    vector1 = np.asarray(embedding1, dtype=np.float64)
+    vector2 = np.asarray(embedding2, dtype=np.float64)
     
     #Calcular la magnitude
-    magnitude1 = sum(a * a for a in embedding1) ** 0.5
-    magnitude2 = sum(b * b for b in embedding2) ** 0.5
+    magnitude1 = np.linalg.norm(vector1)
+    magnitude2 = np.linalg.norm(vector2)
     
     if magnitude1 == 0 or magnitude2 == 0:
         return 0.0
-    similitary = dot_product / (magnitude1 * magnitude2)
+    similitary = float(np.dot(vector1, vector2) / (magnitude1 * magnitude2))
     
     return similitary
 
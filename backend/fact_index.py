@@ -0,0 +1,160 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from difflib import get_close_matches
+from typing import List, Dict, Optional
+
+from backend.bm25_index import tokenize, stem
+from backend.document_loader import extract_facts, DAY_NAMES
+from backend.config import BUSINESS_TIMEZONE
+
+#Terminos ya normalizados con tokenize() (sin tildes, singular)
+PRICE_WORDS = {'cuesta', 'cuestan', 'precio', 'valor', 'vale', 'valen', 'costo', 'cobran', 'sale', 'salen'}
+HOURS_WORDS = {'hora', 'horario', 'abren', 'abre', 'cierran', 'cierra', 'abierto', 'atienden', 'atencion', 'hasta'}
+#Palabras que no cambian la pregunta ("¿me puedes decir...?")
+FILLER_WORDS = {'hoy', 'menu', 'carta', 'ustede', 'puede', 'pueden', 'decir', 'dime', 'informacion', 'restaurante'}
+DAY_TERMS = {stem(day): day for day in DAY_NAMES}
+DAY_LABELS = {'miercoles': "miércoles", 'sabado': "sábado"}
+#Parecido minimo entre una palabra de la pregunta y una del nombre (errores de tipeo)
+FUZZY_MIN_RATIO = 0.8
+
+
+def format_price(price: int) -> str:
+    return "$" + f"{price:,}".replace(",", ".")
+
+
+class FactIndex:
+    """Tabla en memoria de precios, categorias y horarios para responder sin el LLM.
+
+    answer() solo responde si la pregunta es de precio u horario, todas sus palabras
+    corresponden a la tabla (plato, categoria, dia) y hay un unico plato o categoria que
+    las contiene; ante cualquier duda retorna None y la pregunta sigue el flujo normal de
+    recuperacion y generacion. "Hoy" se resuelve en la zona horaria del negocio.
+    """
+
+    def __init__(self, items: List[Dict], hours: List[Dict], timezone: str = BUSINESS_TIMEZONE):
+        self.items = items
+        self.timezone = ZoneInfo(timezone)
+        self.hours = {entry['day']: entry for entry in hours}
+        self.item_terms = [set(tokenize(item['name'])) for item in items]
+        self.categories: Dict[str, List[int]] = {}
+        for i, item in enumerate(items):
+            if item['category']:
+                self.categories.setdefault(item['category'], []).append(i)
+        self.category_terms = {category: set(tokenize(category)) for category in self.categories}
+        self.vocabulary = set().union(*self.item_terms, *self.category_terms.values()) if items else set()
+        self._vocabulary_list = sorted(self.vocabulary)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_chunks(cls, chunks: List[Dict], timezone: str = BUSINESS_TIMEZONE) -> "FactIndex":
+        facts = extract_facts(chunks)
+        return cls(facts['items'], facts['hours'], timezone)
+
+    def __len__(self) -> int:
+        return len(self.items) + len(self.hours)
+
+    def _match_term(self, term: str) -> Optional[str]:
+        #Termino del indice igual o casi igual (tipeo) al de la pregunta
+        if term in self.vocabulary:
+            return term
+        if len(term) < 4:
+            return None
+        #get_close_matches descarta rapido los candidatos lejanos antes de calcular el parecido exacto
+        matches = get_close_matches(term, self._vocabulary_list, n=1, cutoff=FUZZY_MIN_RATIO)
+        return matches[0] if matches else None
+
+    def answer(self, query: str) -> Optional[Dict]:
+        terms = tokenize(query)
+        if not terms or len(self) == 0:
+            return None
+        price_intent = any(term in PRICE_WORDS for term in terms)
+        hours_intent = any(term in HOURS_WORDS for term in terms)
+        days = [DAY_TERMS[term] for term in terms if term in DAY_TERMS]
+        if 'hoy' in terms:
+            days.append(DAY_NAMES[datetime.now(self.timezone).weekday()])
+        matched = set()
+        for term in terms:
+            if term in PRICE_WORDS or term in HOURS_WORDS or term in DAY_TERMS or term in FILLER_WORDS:
+                continue
+            match = self._match_term(term)
+            if match is None:
+                #Algo que la tabla no sabe responder (domicilio, ingredientes...): va al LLM
+                self.misses += 1
+                return None
+            matched.add(match)
+        result = None
+        if hours_intent and not price_intent and not matched:
+            result = self._hours_answer(days)
+        elif not hours_intent and not days and matched:
+            result = self._menu_answer(matched, price_intent)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def _menu_answer(self, matched: set, price_intent: bool) -> Optional[Dict]:
+        #Platos cuyo nombre contiene todo lo preguntado ("cafe con leche" no es Cafe Colombiano ni Tres Leches)
+        candidates = sorted(
+            (
+                (len(matched) / len(item_terms), i) for i, item_terms in enumerate(self.item_terms)
+                if item_terms and matched <= item_terms and len(matched) / len(item_terms) >= 0.5
+            ),
+            reverse=True
+        )
+        if candidates:
+            #Con dos platos igual de parecidos no hay a cual referirse
+            if not price_intent or (len(candidates) > 1 and candidates[0][0] == candidates[1][0]):
+                return None
+            item = self.items[candidates[0][1]]
+            return self._result(f"{item['name']} cuesta {format_price(item['price'])}.", 'price', [item])
+        #"¿Que postres tienen?" / "¿cuanto cuestan las bebidas?": la categoria completa con precios
+        categories = [
+            category for category, category_terms in self.category_terms.items()
+            if category_terms and category_terms & matched
+        ]
+        if len(categories) != 1 or not matched <= self.category_terms[categories[0]]:
+            return None
+        category = categories[0]
+        entries = [self.items[i] for i in self.categories[category]]
+        lines = "\n".join(f"- {item['name']}: {format_price(item['price'])}" for item in entries)
+        return self._result(f"{category.capitalize()}:\n{lines}", 'category', entries)
+
+    def _hours_answer(self, days: List[str]) -> Optional[Dict]:
+        if not self.hours:
+            return None
+        if len(days) == 1:
+            entry = self.hours.get(days[0])
+            if entry is None:
+                return None
+            day = DAY_LABELS.get(days[0], days[0])
+            if entry['closed']:
+                text = f"El {day} estamos cerrados."
+            else:
+                text = f"El {day} atendemos de {entry['hours'].replace(' - ', ' a ')}."
+            return self._result(text, 'hours', [entry])
+        if days:
+            return None
+        #Horario completo, una linea por grupo de dias tal como esta en la base
+        entries = list({entry['label']: entry for entry in self.hours.values()}.values())
+        lines = "\n".join(f"- {entry['label']}: {entry['hours']}" for entry in entries)
+        return self._result(f"Horario de atención:\n{lines}", 'hours', entries)
+
+    @staticmethod
+    def _result(text: str, fact_type: str, facts: List[Dict]) -> Dict:
+        sources = []
+        for fact in facts:
+            source = {'source': fact['source'], 'chunk_index': fact['chunk_index']}
+            if source not in sources:
+                sources.append(source)
+        return {'answer': text, 'fact_type': fact_type, 'sources': sources}
+
+    def get_stats(self) -> Dict:
+        return {
+            'items': len(self.items),
+            'categories': len(self.categories),
+            'days': len(self.hours),
+            'hits': self.hits,
+            'misses': self.misses
+        }
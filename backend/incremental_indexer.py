@@ -0,0 +1,216 @@
+import os
+import json
+import hashlib
+import time
+from typing import List, Dict, Optional
+
+from backend.config import (
+    INDEX_MANIFEST_PATH,
+    EMBEDDING_MODEL,
+    CHUNKING_STRATEGY
+)
+from backend.document_loader import iter_document_chunks
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_manifest(manifest_path: str = INDEX_MANIFEST_PATH) -> Dict:
+    if not os.path.exists(manifest_path):
+        return {'files': {}}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+        manifest.setdefault('files', {})
+        return manifest
+    except (OSError, ValueError) as e:
+        #Un manifest corrupto equivale a no tener manifest: se reindexa todo
+        print(f"Advertencia: manifest invalido ({str(e)}), se reconstruira")
+        return {'files': {}}
+
+
+def save_manifest(manifest: Dict, manifest_path: str = INDEX_MANIFEST_PATH) -> None:
+    directory = os.path.dirname(manifest_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    #Escribir en un archivo temporal y reemplazar para que el cambio sea atomico
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+_version_cache = {}
+
+def get_index_version(manifest_path: str = INDEX_MANIFEST_PATH) -> Optional[str]:
+    #Se relee el manifest solo si cambio en disco, asi consultar la version es casi gratis
+    try:
+        mtime = os.stat(manifest_path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _version_cache.get(manifest_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    version = load_manifest(manifest_path).get('version')
+    _version_cache[manifest_path] = (mtime, version)
+    return version
+
+
+def compute_index_version(files: Dict) -> str:
+    #Huella de todo el contenido indexado; cambia si cambia cualquier chunk
+    parts = []
+    for source in sorted(files):
+        for chunk_id, chunk_hash in sorted(files[source]['chunks'].items()):
+            parts.append(f"{chunk_id}:{chunk_hash}")
+    return hash_text("\n".join(parts))[:16]
+
+
+def build_manifest(
+    documents: List[Dict[str, str]],
+    chunks: List[Dict],
+    vector_store,
+    chunk_size: int,
+    chunk_overlap: int,
+    strategy: str = CHUNKING_STRATEGY
+) -> Dict:
+    files = {}
+    for doc in documents:
+        files[doc['source']] = {'hash': hash_text(doc['content']), 'chunks': {}}
+    for chunk in chunks:
+        entry = files.setdefault(chunk['source'], {'hash': None, 'chunks': {}})
+        entry['chunks'][vector_store.get_document_id(chunk)] = hash_text(chunk['content'])
+    return {
+        'version': compute_index_version(files),
+        'embedding_model': EMBEDDING_MODEL,
+        'chunk_size': chunk_size,
+        'chunk_overlap': chunk_overlap,
+        'chunk_strategy': strategy,
+        'updated_at': time.time(),
+        'files': files
+    }
+
+
+def incremental_index(
+    documents: List[Dict[str, str]],
+    vector_store,
+    chunk_size: int = 500,
+    chunk_overlap: int = 50,
+    manifest_path: str = INDEX_MANIFEST_PATH,
+    strategy: str = CHUNKING_STRATEGY
+) -> Dict:
+    """Sincroniza la coleccion con los documentos sin borrarla.
+
+    Solo se re-embeben los chunks nuevos o modificados (upsert) y se eliminan
+    los ids que ya no existen. La coleccion sigue disponible para consultas
+    durante todo el proceso. Con chunking estructurado los ids salen del
+    contenido, asi que editar un parrafo solo toca los chunks que cambiaron.
+    """
+    start_time = time.time()
+    old_manifest = load_manifest(manifest_path)
+    old_files = old_manifest.get('files', {})
+
+    #Si cambia el modelo o los parametros de chunking, los hashes previos no sirven
+    same_settings = (
+        old_manifest.get('embedding_model') == EMBEDDING_MODEL
+        and old_manifest.get('chunk_size') == chunk_size
+        and old_manifest.get('chunk_overlap') == chunk_overlap
+        and old_manifest.get('chunk_strategy', 'chars') == strategy
+    )
+    if not same_settings and old_files:
+        print("Configuracion de indexado distinta al manifest: se revisaran todos los chunks")
+
+    new_files = {}
+    all_chunks = {}
+    for doc in documents:
+        source = doc['source']
+        entry = {'hash': hash_text(doc['content']), 'chunks': {}}
+        for chunk in iter_document_chunks(doc, chunk_size, chunk_overlap, strategy):
+            chunk_id = vector_store.get_document_id(chunk)
+            entry['chunks'][chunk_id] = hash_text(chunk['content'])
+            all_chunks[chunk_id] = chunk
+        new_files[source] = entry
+
+    old_hashes = {}
+    if same_settings:
+        for entry in old_files.values():
+            old_hashes.update(entry['chunks'])
+
+    #Tambien se reescriben los chunks que el manifest da por indexados pero no estan en la coleccion (ej. tras un reset)
+    existing_ids = set(vector_store.get_existing_ids(list(all_chunks.keys())))
+    to_upsert = [
+        chunk
+        for chunk_id, chunk in all_chunks.items()
+        if old_hashes.get(chunk_id) != new_files[chunk['source']]['chunks'][chunk_id]
+        or chunk_id not in existing_ids
+    ]
+
+    old_ids = {
+        chunk_id
+        for entry in old_files.values()
+        for chunk_id in entry['chunks']
+    }
+    stale_ids = sorted(old_ids - set(all_chunks.keys()))
+
+    written_ids = set(vector_store.upsert_documents(to_upsert)) if to_upsert else set()
+    deleted = vector_store.delete_documents(stale_ids)
+
+    #Con ids por contenido, insertar un parrafo corre la posicion de los chunks siguientes sin cambiar su id
+    old_positions = {}
+    for entry in old_files.values():
+        for position, chunk_id in enumerate(entry['chunks']):
+            old_positions[chunk_id] = position
+    upserted_ids = {vector_store.get_document_id(chunk) for chunk in to_upsert}
+    moved = [
+        chunk
+        for chunk_id, chunk in all_chunks.items()
+        if chunk_id not in upserted_ids and old_positions.get(chunk_id, chunk['chunk_index']) != chunk['chunk_index']
+    ]
+    moved_count = vector_store.update_metadata(moved)
+
+    #Los chunks que fallaron no se registran, asi el siguiente indexado los reintenta
+    failed_ids = []
+    for chunk in to_upsert:
+        chunk_id = vector_store.get_document_id(chunk)
+        if chunk_id not in written_ids:
+            failed_ids.append(chunk_id)
+            entry = new_files[chunk['source']]
+            entry['chunks'].pop(chunk_id, None)
+            entry['hash'] = None
+
+    #El indice lexico se reconstruye completo: es local y toma milisegundos
+    vector_store.rebuild_lexical_index(list(all_chunks.values()))
+
+    changed_sources = {chunk['source'] for chunk in to_upsert}
+    unchanged_files = sum(1 for source in new_files if source not in changed_sources)
+
+    manifest = {
+        'version': compute_index_version(new_files),
+        'embedding_model': EMBEDDING_MODEL,
+        'chunk_size': chunk_size,
+        'chunk_overlap': chunk_overlap,
+        'chunk_strategy': strategy,
+        'updated_at': time.time(),
+        'files': new_files
+    }
+    save_manifest(manifest, manifest_path)
+
+    summary = {
+        'files_total': len(documents),
+        'files_unchanged': unchanged_files,
+        'chunks_upserted': len(written_ids),
+        'chunks_failed': failed_ids,
+        'chunks_deleted': deleted,
+        'chunks_moved': moved_count,
+        'version': manifest['version'],
+        'time': time.time() - start_time
+    }
+    print(f"\nIndexado incremental completado en {summary['time']:.2f}s")
+    print(f"   Archivos sin cambios: {unchanged_files}/{len(documents)}")
+    print(f"   Chunks actualizados: {len(written_ids)}")
+    print(f"   Chunks eliminados: {deleted}")
+    if moved_count:
+        print(f"   Chunks reubicados (solo metadata): {moved_count}")
+    if failed_ids:
+        print(f"   Chunks con error: {len(failed_ids)}")
+    return summary
@@ -0,0 +1,321 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from backend.document_loader import load_all_documents, iter_document_chunks
+from backend.incremental_indexer import hash_text
+from backend.bulk_embedding_client import BulkEmbeddingClient
+from backend.bm25_index import BM25Index
+from backend.config import (
+    KB_VERSIONS_PATH,
+    KB_VERSIONS_KEEP_COLLECTIONS,
+    KNOWLEDGE_BASE_PATH,
+    EMBEDDING_MODEL,
+    CHUNKING_STRATEGY
+)
+
+
+class KnowledgeBaseVersionStore:
+    """Versiones inmutables de knowledge_base/ direccionadas por contenido.
+
+    documents/ guarda cada archivo una sola vez por hash y metadata/ un JSON por version
+    con sus chunks. El texto y el embedding de cada chunk se guardan una vez por hash en
+    SQLite y se comparten entre versiones: una version nueva solo embebe los chunks que
+    ninguna version anterior tenia, y activar o volver a una version no llama a la API.
+    """
+
+    def __init__(self, root: str = KB_VERSIONS_PATH, model: str = EMBEDDING_MODEL):
+        self.root = root
+        self.model = model
+        self.documents_dir = os.path.join(root, "documents")
+        self.metadata_dir = os.path.join(root, "metadata")
+        os.makedirs(self.documents_dir, exist_ok=True)
+        os.makedirs(self.metadata_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, "chunks.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS chunks (hash TEXT PRIMARY KEY, content TEXT NOT NULL)")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                PRIMARY KEY (hash, model)
+            )"""
+        )
+        self._conn.commit()
+
+    def _put_document(self, content: str) -> str:
+        digest = hash_text(content)
+        path = os.path.join(self.documents_dir, f"{digest}.txt")
+        if not os.path.exists(path):
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as file:
+                file.write(content)
+            os.replace(f"{path}.tmp", path)
+        return digest
+
+    def read_document(self, digest: str) -> str:
+        with open(os.path.join(self.documents_dir, f"{digest}.txt"), 'r', encoding='utf-8') as file:
+            return file.read()
+
+    def _put_chunks(self, chunks: Dict[str, str]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunks (hash, content) VALUES (?, ?)",
+                list(chunks.items())
+            )
+            self._conn.commit()
+
+    def _put_embeddings(self, embeddings: Dict[str, List[float]]) -> None:
+        rows = [
+            (digest, self.model, np.asarray(embedding, dtype=np.float32).tobytes())
+            for digest, embedding in embeddings.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (hash, model, embedding) VALUES (?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def _select(self, query: str, hashes: List[str], *params) -> List[tuple]:
+        rows = []
+        with self._lock:
+            #SQLite limita la cantidad de parametros por consulta
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows.extend(self._conn.execute(query.format(placeholders=placeholders), [*params, *part]).fetchall())
+        return rows
+
+    def get_chunk_texts(self, hashes: List[str]) -> Dict[str, str]:
+        return dict(self._select("SELECT hash, content FROM chunks WHERE hash IN ({placeholders})", hashes))
+
+    def get_embeddings(self, hashes: List[str]) -> Dict[str, List[float]]:
+        rows = self._select(
+            "SELECT hash, embedding FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+            hashes,
+            self.model
+        )
+        return {digest: np.frombuffer(blob, dtype=np.float32).tolist() for digest, blob in rows}
+
+    def create_version(
+        self,
+        knowledge_base_path: str = KNOWLEDGE_BASE_PATH,
+        chunk_size: int = 500,
+        chunk_overlap: int = 50,
+        strategy: str = CHUNKING_STRATEGY,
+        label: Optional[str] = None
+    ) -> Dict:
+        """Guarda el estado actual de la base de conocimiento y embebe solo los chunks nuevos."""
+        start_time = time.time()
+        documents = load_all_documents(knowledge_base_path)
+        if not documents:
+            raise ValueError(f"No hay documentos en {knowledge_base_path}")
+        files = {}
+        chunks = []
+        texts = {}
+        for doc in documents:
+            files[doc['source']] = self._put_document(doc['content'])
+            for chunk in iter_document_chunks(doc, chunk_size, chunk_overlap, strategy):
+                digest = hash_text(chunk['content'])
+                texts[digest] = chunk['content']
+                chunks.append({
+                    'id': chunk.get('chunk_id') or f"{chunk['source']}_chunk{chunk['chunk_index']}",
+                    'hash': digest,
+                    'source': chunk['source'],
+                    'chunk_index': chunk['chunk_index'],
+                    'section': chunk.get('section', "")
+                })
+
+        #El id depende del contenido y de como se corto: la misma base produce la misma version
+        fingerprint = "\n".join(
+            [f"{self.model}|{strategy}|{chunk_size}|{chunk_overlap}"]
+            + [f"{chunk['id']}:{chunk['hash']}:{chunk['section']}" for chunk in chunks]
+        )
+        version_id = hash_text(fingerprint)[:12]
+        existing = self.load_version(version_id)
+        if existing is not None:
+            print(f"La base de conocimiento no cambio: version {version_id}")
+            return existing
+
+        self._put_chunks(texts)
+        stored = self.get_embeddings(list(texts))
+        missing = [{'content': texts[digest], 'hash': digest} for digest in texts if digest not in stored]
+        if missing:
+            print(f"Embebiendo {len(missing)} chunks nuevos ({len(stored)} reutilizados)")
+            report = BulkEmbeddingClient().embed_documents(
+                missing,
+                lambda batch, embeddings: self._put_embeddings(
+                    {doc['hash']: embedding for doc, embedding in zip(batch, embeddings)}
+                ),
+                lambda doc: doc['hash']
+            )
+            if report['failed']:
+                raise RuntimeError(f"No se pudieron embeber {len(report['failed'])} chunks; la version no se guardo")
+
+        version = {
+            'version': version_id,
+            'label': label,
+            'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'embedding_model': self.model,
+            'chunk_size': chunk_size,
+            'chunk_overlap': chunk_overlap,
+            'chunk_strategy': strategy,
+            'files': files,
+            'new_chunks': len(missing),
+            'chunks': chunks
+        }
+        path = os.path.join(self.metadata_dir, f"{version_id}.json")
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as file:
+            json.dump(version, file, ensure_ascii=False, indent=2)
+        os.replace(f"{path}.tmp", path)
+        print(
+            f"Version {version_id} guardada: {len(files)} archivos, {len(chunks)} chunks "
+            f"({len(missing)} embebidos) en {time.time() - start_time:.2f}s"
+        )
+        return version
+
+    def load_version(self, version_id: str) -> Optional[Dict]:
+        path = os.path.join(self.metadata_dir, f"{version_id}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def list_versions(self) -> List[Dict]:
+        versions = []
+        for name in os.listdir(self.metadata_dir):
+            if name.endswith(".json"):
+                version = self.load_version(name[:-len(".json")])
+                version.pop('chunks', None)
+                versions.append(version)
+        return sorted(versions, key=lambda version: version['created_at'])
+
+    def restore_documents(self, version_id: str, directory: str) -> List[str]:
+        #Reescribe los archivos de una version (ej. para volver a editar el menu de ayer)
+        version = self.load_version(version_id)
+        if version is None:
+            raise KeyError(f"Version no encontrada: {version_id}")
+        os.makedirs(directory, exist_ok=True)
+        for source, digest in version['files'].items():
+            with open(os.path.join(directory, source), 'w', encoding='utf-8') as file:
+                file.write(self.read_document(digest))
+        return sorted(version['files'])
+
+    def activate(self, version_id: str, vector_store, batch_size: int = 5000) -> Dict:
+        """Publica una version: arma (o reutiliza) su coleccion y cambia el alias de forma atomica.
+
+        Las consultas en curso terminan sobre la coleccion anterior, que se conserva para
+        poder volver atras al instante.
+        """
+        from backend.vector_store_manager import profile_metadata
+
+        version = self.load_version(version_id)
+        if version is None:
+            raise KeyError(f"Version no encontrada: {version_id}")
+        if version['embedding_model'] != self.model:
+            raise ValueError(
+                f"La version {version_id} se embebio con {version['embedding_model']}; crea una nueva con {self.model}"
+            )
+        start_time = time.time()
+        chunks = version['chunks']
+        collection_name = f"{vector_store.collection_name}__v{version_id}"
+        client = vector_store.client
+        try:
+            collection = client.get_collection(name=collection_name)
+            built = collection.count() == len(chunks)
+        except Exception:
+            built = False
+        hashes = sorted({chunk['hash'] for chunk in chunks})
+        texts = self.get_chunk_texts(hashes)
+        if not built:
+            embeddings = self.get_embeddings(hashes)
+            missing = [digest for digest in hashes if digest not in embeddings or digest not in texts]
+            if missing:
+                raise RuntimeError(f"Faltan {len(missing)} embeddings de la version {version_id}")
+            try:
+                client.delete_collection(name=collection_name)
+            except Exception:
+                pass
+            collection = client.create_collection(
+                name=collection_name,
+                metadata=profile_metadata(vector_store.index_profile)
+            )
+            batch_size = min(batch_size, client.get_max_batch_size())
+            for offset in range(0, len(chunks), batch_size):
+                batch = chunks[offset:offset + batch_size]
+                collection.add(
+                    ids=[chunk['id'] for chunk in batch],
+                    embeddings=[embeddings[chunk['hash']] for chunk in batch],
+                    documents=[texts[chunk['hash']] for chunk in batch],
+                    metadatas=[
+                        {'source': chunk['source'], 'chunk_index': chunk['chunk_index'], 'section': chunk['section']}
+                        for chunk in batch
+                    ]
+                )
+            if collection.count() != len(chunks):
+                raise RuntimeError(f"La coleccion de la version {version_id} quedo incompleta")
+
+        #El indice BM25 de cada version vive junto al alias y se cambia con el
+        bm25_path = os.path.join(vector_store.versions_directory, version_id, "bm25_index.json")
+        if not os.path.exists(bm25_path):
+            BM25Index.from_chunks(
+                [dict(chunk, content=texts[chunk['hash']], chunk_id=chunk['id']) for chunk in chunks],
+                vector_store.get_document_id
+            ).save(bm25_path)
+
+        current = vector_store.get_alias() or {}
+        #previous permite volver atras con rollback(); reactivar la misma version no lo pisa
+        previous = current.get('version') if current.get('version') != version_id else current.get('previous')
+        #Una copia de perfil (rebuild_index.py) que deja de estar activa se borra con drop_retired_collections
+        retired = list(current.get('retired', []))
+        if current.get('collection') and vector_store.is_profile_copy(current['collection']):
+            retired.append({'collection': current['collection'], 'retired_at': time.time()})
+        vector_store.set_alias({
+            'version': version_id,
+            'collection': collection_name,
+            'bm25_path': bm25_path,
+            'index_version': f"kb-{version_id}",
+            'previous': previous,
+            'retired': retired,
+            'activated_at': time.strftime("%Y-%m-%dT%H:%M:%S")
+        })
+        self._prune_collections(vector_store, keep={version_id, previous})
+        elapsed = time.time() - start_time
+        print(f"Version {version_id} activa en {collection_name} ({'reutilizada' if built else 'construida'} en {elapsed:.2f}s)")
+        return {'version': version_id, 'collection': collection_name, 'chunks': len(chunks), 'reused': built, 'seconds': elapsed}
+
+    def rollback(self, vector_store) -> Dict:
+        alias = vector_store.get_alias()
+        if not alias or not alias.get('previous'):
+            raise ValueError("No hay una version anterior a la cual volver")
+        return self.activate(alias['previous'], vector_store)
+
+    def _prune_collections(self, vector_store, keep: set) -> None:
+        #Se conservan las KB_VERSIONS_KEEP_COLLECTIONS colecciones de versiones mas recientes
+        prefix = f"{vector_store.collection_name}__v"
+        names = []
+        for collection in vector_store.client.list_collections():
+            name = getattr(collection, 'name', collection)
+            if name.startswith(prefix):
+                version = self.load_version(name[len(prefix):])
+                names.append(((version or {}).get('created_at', ""), name))
+        names.sort(reverse=True)
+        for _, name in names[KB_VERSIONS_KEEP_COLLECTIONS:]:
+            if name[len(prefix):] in keep:
+                continue
+            try:
+                vector_store.client.delete_collection(name=name)
+                print(f"Coleccion {name} eliminada (version antigua)")
+            except Exception as e:
+                print(f"Error al eliminar {name}: {str(e)}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,151 @@
+import numpy as np
+from typing import List, Dict, Sequence, Optional
+
+
+class NumpyVectorIndex:
+    """Busqueda exacta en memoria sobre una matriz float32 pre-normalizada.
+
+    Todas las consultas de un lote se resuelven con un solo producto de
+    matrices y el top-k se obtiene con argpartition, sin recorrer el indice
+    completo para ordenarlo.
+    """
+
+    def __init__(self, space: str = "cosine"):
+        if space not in ("cosine", "l2", "ip"):
+            raise ValueError(f"Espacio de distancia no soportado: {space}")
+        self.space = space
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self._sources: Optional[np.ndarray] = None
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def build(
+        self,
+        ids: Sequence[str],
+        embeddings,
+        documents: Sequence[str],
+        metadatas: Sequence[Dict]
+    ) -> "NumpyVectorIndex":
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2 and len(ids) > 0:
+            raise ValueError("Los embeddings deben ser una matriz 2D")
+        if len(ids) != len(matrix):
+            raise ValueError(
+                f"Cantidad de ids y embeddings distinta: {len(ids)} vs {len(matrix)}"
+            )
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = [dict(m or {}) for m in metadatas]
+        self._sources = None
+        #Matriz contigua y normalizada una sola vez: cada busqueda es solo un producto punto
+        self.matrix = np.ascontiguousarray(self._normalize(matrix)) if len(ids) else np.zeros((0, 0), dtype=np.float32)
+        return self
+
+    @classmethod
+    def from_collection(
+        cls,
+        collection,
+        space: str = "cosine",
+        batch_size: int = 5000
+    ) -> "NumpyVectorIndex":
+        #Copia los embeddings de una coleccion de Chroma a memoria, por lotes
+        ids, embeddings, documents, metadatas = [], [], [], []
+        total = collection.count()
+        for offset in range(0, total, batch_size):
+            results = collection.get(
+                include=['embeddings', 'documents', 'metadatas'],
+                limit=batch_size,
+                offset=offset
+            )
+            ids.extend(results['ids'])
+            embeddings.extend(results['embeddings'])
+            documents.extend(results['documents'])
+            metadatas.extend(results['metadatas'])
+        return cls(space=space).build(ids, embeddings, documents, metadatas)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def memory_bytes(self) -> int:
+        return self.matrix.nbytes + sum(len(document) for document in self.documents)
+
+    def _to_distances(self, similarities: np.ndarray) -> np.ndarray:
+        #Las distancias se expresan igual que en Chroma para el mismo espacio
+        if self.space == "l2":
+            #Distancia L2 al cuadrado entre vectores unitarios
+            return np.maximum(2.0 - 2.0 * similarities, 0.0)
+        return 1.0 - similarities
+
+    def source_mask(self, sources: Optional[Sequence[str]]) -> Optional[np.ndarray]:
+        #Filas cuyo 'source' esta en sources (equivalente al where de Chroma); None = sin filtro
+        if not sources:
+            return None
+        if self._sources is None:
+            self._sources = np.array([metadata.get('source') for metadata in self.metadatas], dtype=object)
+        return np.isin(self._sources, list(sources))
+
+    def search(
+        self,
+        query_embeddings,
+        n_results: int = 3,
+        sources: Optional[Sequence[str]] = None
+    ) -> List[List[Dict]]:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[np.newaxis, :]
+        if len(self.ids) == 0 or n_results <= 0:
+            return [[] for _ in range(len(queries))]
+        if queries.shape[1] != self.matrix.shape[1]:
+            raise ValueError(
+                f"Dimension de la consulta distinta al indice: "
+                f"{queries.shape[1]} vs {self.matrix.shape[1]}"
+            )
+
+        queries = self._normalize(queries)
+        #(n_consultas x dim) @ (dim x n_docs): un solo matmul para todo el lote
+        similarities = queries @ self.matrix.T
+        mask = self.source_mask(sources)
+        if mask is not None:
+            similarities[:, ~mask] = -np.inf
+        top, top_scores = self._top_k(similarities, n_results)
+        return self._format_results(top, top_scores)
+
+    @staticmethod
+    def _top_k(similarities: np.ndarray, n_results: int):
+        #Indices y similitudes de los k mejores por fila, ordenados de mayor a menor
+        k = min(n_results, similarities.shape[1])
+        if k < similarities.shape[1]:
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(similarities.shape[1]), (len(similarities), 1))
+        top_scores = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def _format_results(self, top: np.ndarray, top_scores: np.ndarray) -> List[List[Dict]]:
+        distances = self._to_distances(top_scores)
+        all_results = []
+        for row_indices, row_distances in zip(top, distances):
+            row = []
+            for index, distance in zip(row_indices, row_distances):
+                #Filas descartadas por el filtro de fuentes
+                if not np.isfinite(distance):
+                    continue
+                metadata = self.metadatas[index]
+                row.append({
+                    'id': self.ids[index],
+                    'content': self.documents[index],
+                    'source': metadata.get('source'),
+                    'chunk_index': metadata.get('chunk_index'),
+                    'section': metadata.get('section', ""),
+                    'distance': float(distance)
+                })
+            all_results.append(row)
+        return all_results
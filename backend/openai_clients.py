@@ -0,0 +1,45 @@
+import threading
+
+from backend.config import require_api_key
+
+#Los clientes (y el SDK de openai) se crean al primer uso: importar el backend no toca la red
+_client = None
+_async_client = None
+_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(api_key=require_api_key())
+    return _client
+
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                from openai import AsyncOpenAI
+                _async_client = AsyncOpenAI(api_key=require_api_key())
+    return _async_client
+
+
+def set_clients(client=None, async_client=None) -> None:
+    #Reemplaza los clientes (ej. un cliente falso en benchmarks); None deja el actual
+    global _client, _async_client
+    with _lock:
+        if client is not None:
+            _client = client
+        if async_client is not None:
+            _async_client = async_client
+
+
+def reset_clients() -> None:
+    global _client, _async_client
+    with _lock:
+        _client = None
+        _async_client = None
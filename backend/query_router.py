@@ -0,0 +1,121 @@
+import math
+from collections import Counter
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from backend.bm25_index import BM25Index, tokenize
+
+
+class QueryRouter:
+    """Clasificador local que decide en que fuentes (menu, horarios, ...) buscar una pregunta.
+
+    Se arma con los chunks ya indexados, sin llamadas a la API: por palabras clave (cuanto
+    se concentra cada termino en una fuente) o por centroides (promedio de los embeddings
+    de cada fuente). route() retorna None cuando la confianza es baja y hay que buscar en
+    toda la coleccion.
+    """
+
+    def __init__(self, method: str = "keywords", min_confidence: float = 0.6, source_ratio: float = 0.5):
+        if method not in ("keywords", "centroid"):
+            raise ValueError(f"Metodo de ruteo no soportado: {method}")
+        self.method = method
+        self.min_confidence = min_confidence
+        self.source_ratio = source_ratio
+        self.sources: List[str] = []
+        #keywords: termino -> (peso, distribucion por fuente)
+        self.term_weights: Dict[str, tuple] = {}
+        #centroid: una fila normalizada por fuente
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+
+    @classmethod
+    def from_bm25(cls, index: BM25Index, **options) -> "QueryRouter":
+        router = cls(method="keywords", **options)
+        counts: Dict[str, Counter] = {}
+        totals: Counter = Counter()
+        for term, postings in index.postings.items():
+            for doc_index, frequency in postings.items():
+                source = index.documents[doc_index]['source']
+                counts.setdefault(term, Counter())[source] += frequency
+                totals[source] += frequency
+        router.sources = sorted(totals)
+        if len(router.sources) < 2:
+            return router
+        max_entropy = math.log(len(router.sources))
+        for term, by_source in counts.items():
+            #Frecuencia relativa a lo largo de cada fuente: una fuente grande no acapara todos los terminos
+            relative = {source: count / totals[source] for source, count in by_source.items()}
+            norm = sum(relative.values())
+            distribution = {source: value / norm for source, value in relative.items()}
+            entropy = -sum(p * math.log(p) for p in distribution.values() if p > 0)
+            #Peso 1 si el termino aparece en una sola fuente, 0 si esta repartido en todas por igual
+            weight = 1.0 - entropy / max_entropy
+            if weight > 0:
+                router.term_weights[term] = (weight, distribution)
+        return router
+
+    @classmethod
+    def from_embeddings(
+        cls,
+        matrix: np.ndarray,
+        metadatas: List[Dict],
+        scales: Optional[np.ndarray] = None,
+        **options
+    ) -> "QueryRouter":
+        #scales: escala por fila de un snapshot int8; sin ella los centroides se calcularian en la escala cuantizada
+        router = cls(method="centroid", **options)
+        sources = np.array([metadata.get('source') for metadata in metadatas], dtype=object)
+        router.sources = sorted(set(sources))
+        if len(router.sources) < 2:
+            return router
+        rows = []
+        for source in router.sources:
+            rows_mask = sources == source
+            vectors = np.asarray(matrix[rows_mask], dtype=np.float32)
+            if scales is not None:
+                vectors = vectors * np.asarray(scales[rows_mask], dtype=np.float32)[:, np.newaxis]
+            centroid = vectors.mean(axis=0)
+            rows.append(centroid / (np.linalg.norm(centroid) or 1.0))
+        router.centroids = np.vstack(rows)
+        return router
+
+    def scores(self, query: str, query_embedding: Optional[List[float]] = None) -> Dict[str, float]:
+        #Puntaje por fuente normalizado a 1; vacio si no hay con que decidir
+        if len(self.sources) < 2:
+            return {}
+        if self.method == "centroid":
+            if query_embedding is None:
+                return {}
+            vector = np.asarray(query_embedding, dtype=np.float32)
+            similarities = self.centroids @ (vector / (np.linalg.norm(vector) or 1.0))
+            #Los centroides quedan muy cerca entre si: se separan con un softmax de temperatura baja
+            weights = np.exp((similarities - similarities.max()) / 0.02)
+            return dict(zip(self.sources, (weights / weights.sum()).tolist()))
+        totals: Counter = Counter()
+        for term in set(tokenize(query)):
+            if term not in self.term_weights:
+                continue
+            weight, distribution = self.term_weights[term]
+            for source, probability in distribution.items():
+                totals[source] += weight * probability
+        norm = sum(totals.values())
+        if norm == 0:
+            return {}
+        return {source: score / norm for source, score in totals.items()}
+
+    def route(self, query: str, query_embedding: Optional[List[float]] = None) -> Optional[Dict]:
+        scores = self.scores(query, query_embedding)
+        if not scores:
+            return None
+        top = max(scores.values())
+        #Tambien entran las fuentes con puntaje cercano al mejor (ej. menu y faqs)
+        sources = sorted(
+            (source for source, score in scores.items() if score >= top * self.source_ratio),
+            key=lambda source: scores[source],
+            reverse=True
+        )
+        #Confianza = parte del puntaje que cubren las fuentes elegidas
+        confidence = sum(scores[source] for source in sources)
+        if confidence < self.min_confidence or len(sources) == len(self.sources):
+            return None
+        return {'sources': sources, 'confidence': confidence}
@@ -1,44 +1,125 @@
-from openai import OpenAI
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, AsyncIterator, Tuple
 import time
+import asyncio
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
 from backend.vector_store_manager import VectorStoreManager
+from backend.semantic_cache import SemanticAnswerCache
+from backend.conversation_memory import ConversationMemory
+from backend.embedding_coalescer import get_query_embedding, aget_query_embedding, get_coalescer
+from backend.embeddings_manual import get_embeddings_batch
+from backend.embedding_cache import normalize_text
+from backend.token_counter import count_tokens, get_encoding
+from backend.context_builder import build_context
+from backend.openai_clients import get_client, get_async_client
+from backend.tracing import Trace, span, use_trace, current_trace, record_span, metrics
 from backend.config import (
-    OPENAI_API_KEY,
     CHAT_MODEL,
+    EMBEDDING_MODEL,
     TEMPETURE,
     MAX_TOKENS,
     TOP_K_RESULTS,
     SYSTEM_PROMPT,
-    COST_PER_1K_TOKENS_CHAT
+    COST_PER_1K_TOKENS_CHAT,
+    ANSWER_CACHE_ENABLED,
+    QUERY_EMBEDDING_COALESCING,
+    EMBEDDING_BATCH_MAX_ITEMS,
+    BATCH_MAX_CONCURRENCY,
+    CONVERSATION_MEMORY_ENABLED,
+    FACT_INDEX_ENABLED
 )
 
-client = OpenAI(api_key=OPENAI_API_KEY)
-
 class RAGEngine:
-    def __init__(self):
-        self.vector_store = VectorStoreManager()
+    def __init__(
+        self,
+        use_answer_cache: bool = ANSWER_CACHE_ENABLED,
+        vector_store: Optional[VectorStoreManager] = None,
+        system_prompt: str = SYSTEM_PROMPT,
+        top_k: int = TOP_K_RESULTS,
+        use_memory: bool = CONVERSATION_MEMORY_ENABLED,
+        use_facts: bool = FACT_INDEX_ENABLED
+    ):
+        self.vector_store = vector_store or VectorStoreManager()
+        #Cada PYME puede tener su propio prompt y cantidad de chunks (ver tenant_manager)
+        self.system_prompt = system_prompt
+        self.top_k = top_k
+        self.answer_cache = SemanticAnswerCache() if use_answer_cache else None
+        #Historial por usuario; solo se usa cuando la consulta trae user_id
+        self.memory = ConversationMemory() if use_memory else None
+        #Precios y horarios se responden desde una tabla, sin recuperacion ni LLM
+        self.use_facts = use_facts
         print(f" RAGEngine inicializado")
     
+    def warmup(self, prime_connections: bool = True) -> Dict:
+        """Deja todo listo antes de la primera consulta (ej. al arrancar un worker).
+
+        Abre Chroma y los indices locales, carga los tokenizers, crea los clientes de
+        OpenAI y, si prime_connections, abre la conexion HTTP con una llamada sin costo.
+        """
+        start_time = time.perf_counter()
+        timings = self.vector_store.warmup()
+        
+        step_start = time.perf_counter()
+        get_encoding(CHAT_MODEL)
+        get_encoding(EMBEDDING_MODEL)
+        timings['tokenizer'] = time.perf_counter() - step_start
+        
+        if self.use_facts:
+            step_start = time.perf_counter()
+            self.vector_store.get_fact_index()
+            timings['facts'] = time.perf_counter() - step_start
+        
+        step_start = time.perf_counter()
+        client = get_client()
+        get_async_client()
+        if QUERY_EMBEDDING_COALESCING:
+            get_coalescer()
+        timings['clients'] = time.perf_counter() - step_start
+        
+        if prime_connections:
+            step_start = time.perf_counter()
+            try:
+                #Consultar el modelo no consume tokens y deja la conexion TLS abierta en el pool
+                client.models.retrieve(CHAT_MODEL)
+            except Exception as e:
+                print(f"Advertencia: no se pudo preparar la conexion con OpenAI ({str(e)})")
+            timings['connection'] = time.perf_counter() - step_start
+        
+        timings['total'] = time.perf_counter() - start_time
+        print(f" Warmup completado en {timings['total']:.3f}s")
+        return timings
+    
     def retrieve(
         self,
         query,
-        n_results: int = TOP_K_RESULTS
+        n_results: Optional[int] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict]:
-        results = self.vector_store.search_similar(query, n_results=n_results)
+        n_results = n_results or self.top_k
+        results = self.vector_store.search_similar(
+            query,
+            n_results=n_results,
+            query_embedding=query_embedding
+        )
         return results
     
     def _build_context(self, documents: List[Dict]) -> str:
-        if not documents or len(documents) == 0:
-            return ""
-        
-        context_parts = []
-        for i, doc in enumerate(documents,1):
-            doc_text = f"Documento {i} ({doc['source']}):\n{doc['content']}"
-            context_parts.append(doc_text)
-        context = "\n\n".join(context_parts)
-        return context
+        return self._assemble_context(documents)['context']
+    
+    def _assemble_context(self, documents: List[Dict]) -> Dict:
+        #Une chunks solapados, descarta casi-duplicados y respeta CONTEXT_MAX_TOKENS
+        with span('context_build', documents=len(documents or [])) as data:
+            context_info = build_context(documents or [])
+            data['tokens'] = context_info['tokens']
+            data['tokens_saved'] = context_info['tokens_saved']
+        return context_info
     
-    def _build_prompt(self, query: str, context: str) -> List[Dict[str, str]]:
+    def _build_prompt(
+        self,
+        query: str,
+        context: str,
+        history: Optional[Dict] = None
+    ) -> List[Dict[str, str]]:
         if context:
             user_content = f"""Usa la siguiente información para responder la pregunta del usuario.
 
@@ -65,69 +146,350 @@ WhatsApp: 300-123-4567"""
         messages = [
             {
                 'role': 'system',
-                'content': SYSTEM_PROMPT
-            },
-            {
-                'role': 'user',
-                'content': user_content
+                'content': self.system_prompt
             }
         ]
+        #Historial ya acotado por ConversationMemory: resumen de lo viejo y turnos recientes
+        if history:
+            if history['summary']:
+                messages.append({
+                    'role': 'system',
+                    'content': f"Antes en esta conversación el usuario preguntó: {history['summary']}"
+                })
+            for question, answer in history['turns']:
+                messages.append({'role': 'user', 'content': question})
+                messages.append({'role': 'assistant', 'content': answer})
+        messages.append({
+            'role': 'user',
+            'content': user_content
+        })
+        return messages
+    
+    def _prompt_messages(
+        self,
+        query: str,
+        context: str,
+        history: Optional[Dict] = None
+    ) -> List[Dict[str, str]]:
+        with span('prompt_build') as data:
+            messages = self._build_prompt(query, context, history)
+            data['tokens'] = sum(count_tokens(m['content'], CHAT_MODEL) for m in messages)
         return messages
     
+    @staticmethod
+    def _usage_span_fields(usage) -> Dict:
+        if usage is None:
+            return {}
+        return {'prompt_tokens': usage.prompt_tokens, 'completion_tokens': usage.completion_tokens}
+    
+    @staticmethod
+    def _usage_fields(usage) -> Dict:
+        if usage is None:
+            return {'usage': None, 'tokens_used': 0, 'cost': 0.0}
+        total_tokens = usage.total_tokens
+        return {
+            'usage': {
+                'prompt_tokens': usage.prompt_tokens,
+                'completion_tokens': usage.completion_tokens,
+                'total_tokens': total_tokens
+            },
+            'tokens_used': total_tokens,
+            'cost': (total_tokens / 1000) * COST_PER_1K_TOKENS_CHAT
+        }
+    
+    def _generation_result(self, response, start_time: float) -> Dict:
+        answer = response.choices[0].message.content
+        elapsed_time = time.time() - start_time
+        
+        result = {
+            'answer': answer,
+            'model': CHAT_MODEL,
+            'time': elapsed_time
+        }
+        result.update(self._usage_fields(getattr(response, 'usage', None)))
+        
+        return result
+    
+    def _generation_error(self, error: Exception, start_time: float) -> Dict:
+        return {
+            'answer': 'Lo siento, hubo un error al procesar tu pregunta. Por favor intenta de nuevo',
+            'tokens_used': 0,
+            'cost': 0.0,
+            'model':CHAT_MODEL,
+            'time': time.time() - start_time,
+            'error': str(error)
+        }
+    
     def generate(
         self,
         query: str,
-        context: str
+        context: str,
+        history: Optional[Dict] = None
     ) -> Dict:
         print(f'\n Generando respuesta con {CHAT_MODEL}')
         start_time = time.time()
         
         try:
-            messages = self._build_prompt(query, context)
-            response = client.chat.completions.create(
-                model=CHAT_MODEL,
-                messages=messages,
-                temperature=TEMPETURE,
-                max_tokens=MAX_TOKENS
-            )
-            answer = response.choices[0].message.content
-            elapsed_time = time.time() - start_time
-            
-            result = {
-                'answer': answer,
-                'model': CHAT_MODEL,
-                'time': elapsed_time
-            }
-            
-            return result
+            messages = self._prompt_messages(query, context, history)
+            with span('llm_call', model=CHAT_MODEL) as data:
+                response = get_client().chat.completions.create(
+                    model=CHAT_MODEL,
+                    messages=messages,
+                    temperature=TEMPETURE,
+                    max_tokens=MAX_TOKENS
+                )
+                data.update(self._usage_span_fields(getattr(response, 'usage', None)))
+            return self._generation_result(response, start_time)
         except Exception as e:
-            return {
-                'answer': 'Lo siento, hubo un error al procesar tu pregunta. Por favor intenta de nuevo',
-                'tokens_used': 0,
-                'cost': 0.0,
-                'model':CHAT_MODEL,
-                'time': time.time() - start_time,
-                'error': str(e)
-            }
+            return self._generation_error(e, start_time)
     
-    def query(
+    def _stream_request(self, query: str, context: str, history: Optional[Dict] = None) -> Dict:
+        return {
+            'model': CHAT_MODEL,
+            'messages': self._prompt_messages(query, context, history),
+            'temperature': TEMPETURE,
+            'max_tokens': MAX_TOKENS,
+            'stream': True,
+            #El ultimo fragmento del stream trae el uso de tokens
+            'stream_options': {'include_usage': True}
+        }
+    
+    def _stream_final_event(
         self,
-        query: str,
-        n_results: int = TOP_K_RESULTS,
-        verbose: bool = True
+        parts: List[str],
+        usage,
+        start_time: float,
+        first_token_time: Optional[float]
     ) -> Dict:
+        event = {
+            'type': 'final',
+            'answer': "".join(parts),
+            'model': CHAT_MODEL,
+            'time': time.time() - start_time,
+            #Latencia percibida: cuanto tarda el cliente en ver el primer texto
+            'time_to_first_token': (first_token_time - start_time) if first_token_time else None,
+            'first_token_at': first_token_time
+        }
+        event.update(self._usage_fields(usage))
+        return event
+    
+    def _record_stream_span(
+        self,
+        trace: Optional[Trace],
+        llm_start: float,
+        usage,
+        start_time: float,
+        first_token_time: Optional[float],
+        error: bool = False
+    ) -> None:
+        #El stream hace yield, asi que el span del LLM se registra a mano al terminar
+        attributes = {'model': CHAT_MODEL, 'stream': True}
+        attributes.update(self._usage_span_fields(usage))
+        if first_token_time:
+            attributes['time_to_first_token_ms'] = round((first_token_time - start_time) * 1000, 3)
+        if error:
+            attributes['error'] = True
+        record_span('llm_call', time.perf_counter() - llm_start, trace, **attributes)
+    
+    def generate_stream(
+        self,
+        query: str,
+        context: str,
+        trace: Optional[Trace] = None,
+        history: Optional[Dict] = None
+    ) -> Iterator[Dict]:
+        #Genera eventos {'type': 'delta', 'content': ...} y un evento final con uso y tiempos
+        print(f'\n Generando respuesta (stream) con {CHAT_MODEL}')
+        start_time = time.time()
+        first_token_time = None
+        parts = []
+        usage = None
+        trace = trace or current_trace()
+        llm_start = time.perf_counter()
+        
+        try:
+            with use_trace(trace):
+                request = self._stream_request(query, context, history)
+            llm_start = time.perf_counter()
+            stream = get_client().chat.completions.create(**request)
+            for chunk in stream:
+                if getattr(chunk, 'usage', None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first_token_time is None:
+                        first_token_time = time.time()
+                    parts.append(delta)
+                    yield {'type': 'delta', 'content': delta}
+            self._record_stream_span(trace, llm_start, usage, start_time, first_token_time)
+            yield self._stream_final_event(parts, usage, start_time, first_token_time)
+        except Exception as e:
+            self._record_stream_span(trace, llm_start, usage, start_time, first_token_time, error=True)
+            error_event = self._generation_error(e, start_time)
+            error_event['type'] = 'final'
+            error_event['time_to_first_token'] = None
+            yield error_event
+    
+    async def agenerate_stream(
+        self,
+        query: str,
+        context: str,
+        trace: Optional[Trace] = None,
+        history: Optional[Dict] = None
+    ) -> AsyncIterator[Dict]:
+        print(f'\n Generando respuesta (stream) con {CHAT_MODEL}')
+        start_time = time.time()
+        first_token_time = None
+        parts = []
+        usage = None
+        trace = trace or current_trace()
+        llm_start = time.perf_counter()
+        
+        try:
+            with use_trace(trace):
+                request = self._stream_request(query, context, history)
+            llm_start = time.perf_counter()
+            stream = await get_async_client().chat.completions.create(**request)
+            async for chunk in stream:
+                if getattr(chunk, 'usage', None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first_token_time is None:
+                        first_token_time = time.time()
+                    parts.append(delta)
+                    yield {'type': 'delta', 'content': delta}
+            self._record_stream_span(trace, llm_start, usage, start_time, first_token_time)
+            yield self._stream_final_event(parts, usage, start_time, first_token_time)
+        except Exception as e:
+            self._record_stream_span(trace, llm_start, usage, start_time, first_token_time, error=True)
+            error_event = self._generation_error(e, start_time)
+            error_event['type'] = 'final'
+            error_event['time_to_first_token'] = None
+            yield error_event
+    
+    def _cached_answer(
+        self,
+        query: str,
+        cached,
+        start_time_total: float,
+        verbose: bool
+    ) -> Optional[Dict]:
+        if cached is None:
+            return None
+        cached_result, similarity = cached
+        cached_result.update({
+            'query': query,
+            'cached_query': cached_result.get('query'),
+            'cache_hit': True,
+            'cache_similarity': similarity,
+            'time_total': time.time() - start_time_total
+        })
         if verbose:
-            print("\n" + "=" *60)
-            print(f"RAG Query: '{query}'")
-            print("=" * 60)
-        start_time_total = time.time()
-        start_time_retrieval = time.time()
-        documents = self.retrieve(query, n_results=n_results)
-        start_time_retrieval = time.time() - start_time_retrieval
+            print(f" Respuesta desde cache (similitud {similarity:.3f})")
+        return cached_result
+    
+    def _fact_answer(self, query: str, start_time_total: float, verbose: bool) -> Optional[Dict]:
+        try:
+            with span('fact_lookup') as data:
+                fact_index = self.vector_store.get_fact_index()
+                fact = fact_index.answer(query) if fact_index is not None else None
+                data['hit'] = fact is not None
+        except Exception as e:
+            print(f"Error en tabla de datos: {str(e)}")
+            return None
+        if fact is None:
+            return None
         if verbose:
-            print(f" Encontrados : {len(documents)} documentos")
-        context = self._build_context(documents)
-        generation_result = self.generate(query, context)
+            print(f" Respuesta desde la tabla de datos ({fact['fact_type']})")
+        return {
+            'query': query,
+            'answer': fact['answer'],
+            'sources': [dict(source, distance=None, similarity=None) for source in fact['sources']],
+            'model': 'fact_index',
+            'tokens_used': 0,
+            'cost': 0.0,
+            'time_total': time.time() - start_time_total,
+            'cache_hit': False,
+            'fact_hit': True,
+            'fact_type': fact['fact_type']
+        }
+    
+    def _prepare_query(
+        self,
+        query: str,
+        n_results: int,
+        start_time_total: float,
+        verbose: bool,
+        use_cache: bool = True
+    ) -> Dict:
+        #Pasos previos al embedding: tabla de datos, cache por texto exacto y atajo lexico (BM25)
+        state = {
+            'cached_result': None,
+            'documents': None,
+            'query_embedding': None,
+            'index_version': None,
+            'use_cache': use_cache and self.answer_cache is not None
+        }
+        if self.use_facts:
+            state['cached_result'] = self._fact_answer(query, start_time_total, verbose)
+            if state['cached_result'] is not None:
+                return state
+        if state['use_cache']:
+            try:
+                state['index_version'] = self.vector_store.get_index_version()
+                with span('answer_cache_lookup', kind='exact') as data:
+                    cached = self.answer_cache.lookup_exact(query, state['index_version'], n_results)
+                    data['hit'] = cached is not None
+                state['cached_result'] = self._cached_answer(query, cached, start_time_total, verbose)
+            except Exception as e:
+                print(f"Error en cache de respuestas: {str(e)}")
+            if state['cached_result'] is not None:
+                return state
+        #Si BM25 es concluyente no hace falta el embedding de la pregunta
+        state['documents'] = self.vector_store.lexical_fast_path(query, n_results=n_results)
+        return state
+    
+    def _needs_embedding(self, state: Dict) -> bool:
+        return (
+            state['cached_result'] is None
+            and state['documents'] is None
+            and state['use_cache']
+        )
+    
+    def _apply_query_embedding(
+        self,
+        state: Dict,
+        query: str,
+        query_embedding: Optional[List[float]],
+        n_results: int,
+        start_time_total: float,
+        verbose: bool
+    ) -> None:
+        #Cache semantico: preguntas casi iguales reutilizan la respuesta mientras el indice no cambie
+        state['query_embedding'] = query_embedding
+        if query_embedding is None:
+            return
+        try:
+            with span('answer_cache_lookup', kind='semantic') as data:
+                cached = self.answer_cache.lookup(query_embedding, state['index_version'], n_results)
+                data['hit'] = cached is not None
+            state['cached_result'] = self._cached_answer(query, cached, start_time_total, verbose)
+        except Exception as e:
+            print(f"Error en cache de respuestas: {str(e)}")
+    
+    def _build_result(
+        self,
+        query: str,
+        documents: List[Dict],
+        generation_result: Dict,
+        start_time_total: float,
+        context_info: Optional[Dict] = None
+    ) -> Dict:
         time_total = time.time() - start_time_total
         result = {
             'query': query,
@@ -136,12 +498,431 @@ WhatsApp: 300-123-4567"""
                 {
                     'source': doc['source'],
                     'chunk_index': doc['chunk_index'],
-                    'distance': doc['distance']
-                    
+                    'distance': doc['distance'],
+                    'similarity': self.vector_store.distance_to_similarity(doc['distance'])
                 }
                 for doc in documents
             ],
             'model': generation_result['model'],
-            'time_total': time_total
+            'tokens_used': generation_result.get('tokens_used', 0),
+            'cost': generation_result.get('cost', 0.0),
+            'time_total': time_total,
+            'cache_hit': False
         }
+        for key in ('usage', 'time_to_first_token'):
+            if key in generation_result:
+                result[key] = generation_result[key]
+        if context_info is not None:
+            result['context_tokens'] = context_info['tokens']
+            result['context_tokens_saved'] = context_info['tokens_saved']
+        if 'error' in generation_result:
+            result['error'] = generation_result['error']
         return result
+    
+    def _store_answer(self, result: Dict, state: Dict, n_results: int) -> None:
+        if 'error' in result or not state['use_cache']:
+            return
+        self.answer_cache.store(state['query_embedding'], result, state['index_version'], n_results)
+    
+    def _print_header(self, query: str) -> None:
+        print("\n" + "=" *60)
+        print(f"RAG Query: '{query}'")
+        print("=" * 60)
+    
+    def _finish_trace(self, trace: Trace, result: Dict) -> Dict:
+        #La traza se agrega despues de guardar en cache: cada respuesta trae la suya
+        trace.attributes['cache_hit'] = result.get('cache_hit', False)
+        result['trace'] = trace.finish()
+        return result
+    
+    def _conversation(self, query: str, user_id: Optional[str]) -> Tuple[str, Optional[Dict]]:
+        #Pregunta para la busqueda (completada con la anterior si es de seguimiento) e historial del usuario
+        if user_id is None or self.memory is None:
+            return query, None
+        with span('conversation_memory') as data:
+            retrieval_query = self.memory.rewrite_query(user_id, query)
+            history = self.memory.get_history(user_id)
+            data['rewritten'] = retrieval_query != query
+            data['history_tokens'] = history['tokens'] if history else 0
+        return retrieval_query, history
+    
+    def _remember(self, user_id: Optional[str], query: str, retrieval_query: str, result: Dict) -> Dict:
+        if retrieval_query != query:
+            result['query'] = query
+            result['retrieval_query'] = retrieval_query
+        if user_id is not None and self.memory is not None and 'error' not in result:
+            self.memory.add_turn(user_id, query, result['answer'], retrieval_query)
+        return result
+    
+    def query(
+        self,
+        query: str,
+        n_results: Optional[int] = None,
+        verbose: bool = True,
+        user_id: Optional[str] = None
+    ) -> Dict:
+        #user_id (ej. el numero de WhatsApp) activa la memoria de conversacion
+        n_results = n_results or self.top_k
+        trace = Trace('rag_query', query=query, n_results=n_results)
+        with use_trace(trace):
+            retrieval_query, history = self._conversation(query, user_id)
+            result = self._query(retrieval_query, n_results, verbose, history, question=query)
+        self._remember(user_id, query, retrieval_query, result)
+        return self._finish_trace(trace, result)
+    
+    def _query(
+        self,
+        query: str,
+        n_results: int,
+        verbose: bool,
+        history: Optional[Dict] = None,
+        question: Optional[str] = None
+    ) -> Dict:
+        #query es la pregunta para la busqueda; question, la del usuario tal como la escribio
+        if verbose:
+            self._print_header(query)
+        start_time_total = time.time()
+        
+        #Una respuesta que depende del historial no se comparte con otros usuarios en la cache
+        state = self._prepare_query(query, n_results, start_time_total, verbose, use_cache=not history)
+        if self._needs_embedding(state):
+            try:
+                query_embedding = get_query_embedding(query)
+            except Exception as e:
+                print(f"Error al calcular embedding: {str(e)}")
+                query_embedding = None
+            self._apply_query_embedding(state, query, query_embedding, n_results, start_time_total, verbose)
+        cached_result = state['cached_result']
+        query_embedding = state['query_embedding']
+        if cached_result is not None:
+            return cached_result
+        
+        documents = state['documents']
+        if documents is None:
+            documents = self.retrieve(query, n_results=n_results, query_embedding=query_embedding)
+        if verbose:
+            print(f" Encontrados : {len(documents)} documentos")
+        context_info = self._assemble_context(documents)
+        generation_result = self.generate(question or query, context_info['context'], history)
+        result = self._build_result(query, documents, generation_result, start_time_total, context_info)
+        self._store_answer(result, state, n_results)
+        return result
+    
+    def query_batch(
+        self,
+        queries: List[str],
+        n_results: Optional[int] = None,
+        max_concurrency: int = BATCH_MAX_CONCURRENCY
+    ) -> Iterator[Dict]:
+        """Responde muchas preguntas (trabajos offline) y entrega los resultados en orden.
+
+        Los embeddings de todas las preguntas salen de un solo request (o uno cada
+        EMBEDDING_BATCH_MAX_ITEMS), la busqueda es una consulta al backend con todos los
+        vectores y las respuestas se generan en paralelo con hasta max_concurrency
+        llamadas al LLM. Las preguntas repetidas se generan una vez.
+        """
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency debe ser mayor a 0")
+        n_results = n_results or self.top_k
+        start_time_total = time.time()
+        batch_trace = Trace('rag_batch', n_queries=len(queries), n_results=n_results)
+        traces = [
+            Trace('rag_query', query=query, n_results=n_results, batch_id=batch_trace.trace_id)
+            for query in queries
+        ]
+        #Indice de la primera aparicion de cada pregunta (normalizada)
+        first_index: Dict[str, int] = {}
+        unique = [first_index.setdefault(normalize_text(query), i) == i for i, query in enumerate(queries)]
+        states: Dict[int, Dict] = {}
+        for i, query in enumerate(queries):
+            if unique[i]:
+                with use_trace(traces[i]):
+                    states[i] = self._prepare_query(query, n_results, start_time_total, verbose=False)
+        pending = [i for i, state in states.items() if state['cached_result'] is None and state['documents'] is None]
+        
+        with use_trace(batch_trace):
+            embeddings = self._batch_embeddings([queries[i] for i in pending])
+        for i, embedding in zip(pending, embeddings):
+            if self.answer_cache is not None:
+                with use_trace(traces[i]):
+                    self._apply_query_embedding(states[i], queries[i], embedding, n_results, start_time_total, False)
+            else:
+                states[i]['query_embedding'] = embedding
+        #Sin embedding (fallo la API) cada pregunta se busca sola al generar
+        to_search = [i for i in pending if states[i]['cached_result'] is None and states[i]['query_embedding'] is not None]
+        with use_trace(batch_trace):
+            found = self.vector_store.search_similar_batch(
+                [queries[i] for i in to_search],
+                [states[i]['query_embedding'] for i in to_search],
+                n_results=n_results
+            )
+        for i, documents in zip(to_search, found):
+            states[i]['documents'] = documents
+        batch_trace.finish()
+        
+        def answer(i: int) -> Dict:
+            state = states[i]
+            with use_trace(traces[i]):
+                if state['cached_result'] is not None:
+                    result = state['cached_result']
+                else:
+                    documents = state['documents']
+                    if documents is None:
+                        documents = self.retrieve(queries[i], n_results=n_results)
+                    context_info = self._assemble_context(documents)
+                    generation_result = self.generate(queries[i], context_info['context'])
+                    result = self._build_result(queries[i], documents, generation_result, start_time_total, context_info)
+                    self._store_answer(result, state, n_results)
+            return self._finish_trace(traces[i], result)
+        
+        executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="batch")
+        try:
+            futures = {i: executor.submit(answer, i) for i in states}
+            for i, query in enumerate(queries):
+                result = futures[first_index[normalize_text(query)]].result()
+                if not unique[i]:
+                    #Copia para la pregunta repetida, con su propia traza
+                    traces[i].attributes['duplicate'] = True
+                    result = dict(result, query=query, trace=traces[i].finish())
+                yield result
+        finally:
+            #Si quien consume deja de iterar no se generan las respuestas que faltan
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _batch_embeddings(self, queries: List[str]) -> List[Optional[List[float]]]:
+        embeddings: List[Optional[List[float]]] = []
+        for start in range(0, len(queries), EMBEDDING_BATCH_MAX_ITEMS):
+            batch = queries[start:start + EMBEDDING_BATCH_MAX_ITEMS]
+            try:
+                with span('query_embedding', n_queries=len(batch)):
+                    embeddings.extend(get_embeddings_batch(batch))
+            except Exception as e:
+                print(f"Error al calcular embeddings del lote: {str(e)}")
+                embeddings.extend([None] * len(batch))
+        return embeddings
+    
+    async def aretrieve(
+        self,
+        query,
+        n_results: Optional[int] = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict]:
+        n_results = n_results or self.top_k
+        results = await self.vector_store.asearch_similar(
+            query,
+            n_results=n_results,
+            query_embedding=query_embedding
+        )
+        return results
+    
+    async def agenerate(
+        self,
+        query: str,
+        context: str,
+        history: Optional[Dict] = None
+    ) -> Dict:
+        print(f'\n Generando respuesta con {CHAT_MODEL}')
+        start_time = time.time()
+        
+        try:
+            messages = self._prompt_messages(query, context, history)
+            with span('llm_call', model=CHAT_MODEL) as data:
+                response = await get_async_client().chat.completions.create(
+                    model=CHAT_MODEL,
+                    messages=messages,
+                    temperature=TEMPETURE,
+                    max_tokens=MAX_TOKENS
+                )
+                data.update(self._usage_span_fields(getattr(response, 'usage', None)))
+            return self._generation_result(response, start_time)
+        except Exception as e:
+            return self._generation_error(e, start_time)
+    
+    async def aquery(
+        self,
+        query: str,
+        n_results: Optional[int] = None,
+        verbose: bool = True,
+        user_id: Optional[str] = None,
+        admission=None
+    ) -> Dict:
+        #Mismo flujo que query(), pero sin bloquear el event loop (FastAPI/uvicorn).
+        #admission (AdmissionController) se toma solo si hay que llamar a OpenAI: tabla de datos y cache no ocupan lugar
+        n_results = n_results or self.top_k
+        trace = Trace('rag_query', query=query, n_results=n_results)
+        with use_trace(trace):
+            retrieval_query, history = self._conversation(query, user_id)
+            result = await self._aquery(retrieval_query, n_results, verbose, history, question=query, admission=admission)
+        self._remember(user_id, query, retrieval_query, result)
+        return self._finish_trace(trace, result)
+    
+    async def _aquery(
+        self,
+        query: str,
+        n_results: int,
+        verbose: bool,
+        history: Optional[Dict] = None,
+        question: Optional[str] = None,
+        admission=None
+    ) -> Dict:
+        #query es la pregunta para la busqueda; question, la del usuario tal como la escribio
+        if verbose:
+            self._print_header(query)
+        start_time_total = time.time()
+        
+        #Una respuesta que depende del historial no se comparte con otros usuarios en la cache
+        #Tabla de datos, cache, BM25 y la apertura perezosa de Chroma bloquean: fuera del event loop
+        state = await asyncio.to_thread(
+            self._prepare_query, query, n_results, start_time_total, verbose, use_cache=not history
+        )
+        if state['cached_result'] is not None:
+            return state['cached_result']
+        
+        async with (admission.admit() if admission is not None else contextlib.nullcontext()):
+            if self._needs_embedding(state):
+                try:
+                    query_embedding = await aget_query_embedding(query)
+                except Exception as e:
+                    print(f"Error al calcular embedding: {str(e)}")
+                    query_embedding = None
+                self._apply_query_embedding(state, query, query_embedding, n_results, start_time_total, verbose)
+            cached_result = state['cached_result']
+            query_embedding = state['query_embedding']
+            if cached_result is not None:
+                return cached_result
+            
+            documents = state['documents']
+            if documents is None:
+                documents = await self.aretrieve(query, n_results=n_results, query_embedding=query_embedding)
+            if verbose:
+                print(f" Encontrados : {len(documents)} documentos")
+            context_info = self._assemble_context(documents)
+            generation_result = await self.agenerate(question or query, context_info['context'], history)
+        result = self._build_result(query, documents, generation_result, start_time_total, context_info)
+        self._store_answer(result, state, n_results)
+        return result
+    
+    def _cached_stream_events(self, cached_result: Dict) -> List[Dict]:
+        #Una respuesta en cache se entrega como un solo fragmento
+        final_event = dict(cached_result)
+        final_event['type'] = 'final'
+        final_event['time_to_first_token'] = cached_result['time_total']
+        return [{'type': 'delta', 'content': cached_result['answer']}, final_event]
+    
+    def _stream_result_event(
+        self,
+        query: str,
+        documents: List[Dict],
+        generation_event: Dict,
+        start_time_total: float,
+        context_info: Optional[Dict] = None
+    ) -> Dict:
+        result = self._build_result(query, documents, generation_event, start_time_total, context_info)
+        result['type'] = 'final'
+        #En la consulta completa el tiempo al primer token incluye la recuperacion
+        first_token_at = generation_event.get('first_token_at')
+        result['time_to_first_token'] = (first_token_at - start_time_total) if first_token_at else None
+        result['generation_time_to_first_token'] = generation_event.get('time_to_first_token')
+        if result['time_to_first_token'] is not None:
+            metrics.observe('time_to_first_token', result['time_to_first_token'])
+        return result
+    
+    def query_stream(
+        self,
+        query: str,
+        n_results: Optional[int] = None,
+        verbose: bool = True,
+        user_id: Optional[str] = None
+    ) -> Iterator[Dict]:
+        #Igual que query(), pero la respuesta llega por fragmentos; el evento final trae fuentes, tokens y tiempos
+        n_results = n_results or self.top_k
+        if verbose:
+            self._print_header(query)
+        start_time_total = time.time()
+        #Un generador no puede dejar la traza activa entre yields: se activa solo en los tramos sin yield
+        trace = Trace('rag_query', query=query, n_results=n_results, stream=True)
+        user_query = query
+        
+        with use_trace(trace):
+            query, history = self._conversation(user_query, user_id)
+            state = self._prepare_query(query, n_results, start_time_total, verbose, use_cache=not history)
+            if self._needs_embedding(state):
+                try:
+                    query_embedding = get_query_embedding(query)
+                except Exception as e:
+                    print(f"Error al calcular embedding: {str(e)}")
+                    query_embedding = None
+                self._apply_query_embedding(state, query, query_embedding, n_results, start_time_total, verbose)
+        cached_result = state['cached_result']
+        query_embedding = state['query_embedding']
+        if cached_result is not None:
+            events = self._cached_stream_events(cached_result)
+            self._remember(user_id, user_query, query, events[-1])
+            self._finish_trace(trace, events[-1])
+            yield from events
+            return
+        
+        with use_trace(trace):
+            documents = state['documents']
+            if documents is None:
+                documents = self.retrieve(query, n_results=n_results, query_embedding=query_embedding)
+            context_info = self._assemble_context(documents)
+        for event in self.generate_stream(user_query, context_info['context'], trace=trace, history=history):
+            if event['type'] != 'final':
+                yield event
+                continue
+            result = self._stream_result_event(query, documents, event, start_time_total, context_info)
+            self._store_answer({k: v for k, v in result.items() if k != 'type'}, state, n_results)
+            self._remember(user_id, user_query, query, result)
+            yield self._finish_trace(trace, result)
+    
+    async def aquery_stream(
+        self,
+        query: str,
+        n_results: Optional[int] = None,
+        verbose: bool = True,
+        user_id: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        n_results = n_results or self.top_k
+        if verbose:
+            self._print_header(query)
+        start_time_total = time.time()
+        trace = Trace('rag_query', query=query, n_results=n_results, stream=True)
+        user_query = query
+        
+        with use_trace(trace):
+            query, history = self._conversation(user_query, user_id)
+            #Tabla de datos, cache, BM25 y la apertura perezosa de Chroma bloquean: fuera del event loop
+            state = await asyncio.to_thread(
+                self._prepare_query, query, n_results, start_time_total, verbose, use_cache=not history
+            )
+            if self._needs_embedding(state):
+                try:
+                    query_embedding = await aget_query_embedding(query)
+                except Exception as e:
+                    print(f"Error al calcular embedding: {str(e)}")
+                    query_embedding = None
+                self._apply_query_embedding(state, query, query_embedding, n_results, start_time_total, verbose)
+        cached_result = state['cached_result']
+        query_embedding = state['query_embedding']
+        if cached_result is not None:
+            events = self._cached_stream_events(cached_result)
+            self._remember(user_id, user_query, query, events[-1])
+            self._finish_trace(trace, events[-1])
+            for event in events:
+                yield event
+            return
+        
+        with use_trace(trace):
+            documents = state['documents']
+            if documents is None:
+                documents = await self.aretrieve(query, n_results=n_results, query_embedding=query_embedding)
+            context_info = self._assemble_context(documents)
+        async for event in self.agenerate_stream(user_query, context_info['context'], trace=trace, history=history):
+            if event['type'] != 'final':
+                yield event
+                continue
+            result = self._stream_result_event(query, documents, event, start_time_total, context_info)
+            self._store_answer({k: v for k, v in result.items() if k != 'type'}, state, n_results)
+            self._remember(user_id, user_query, query, result)
+            yield self._finish_trace(trace, result)
@@ -0,0 +1,192 @@
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+
+from backend.embedding_cache import normalize_text
+from backend.config import (
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_MAX_ENTRIES
+)
+
+
+class SemanticAnswerCache:
+    """Cache de respuestas que reconoce preguntas parecidas por similitud de embeddings.
+
+    Cada entrada guarda la version del indice con la que se genero la respuesta;
+    si el indice cambia, todas las entradas se descartan para no servir datos viejos.
+    """
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES
+    ):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold debe estar entre 0 y 1")
+        if max_entries <= 0:
+            raise ValueError("max_entries debe ser mayor a 0")
+
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.index_version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        #Indice por texto exacto (normalizado): permite acertar sin calcular el embedding
+        self._exact: Dict[Tuple[str, int], int] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        #Matriz de embeddings de las entradas; se reconstruye solo cuando cambian las entradas
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: List[int] = []
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _check_version(self, index_version: Optional[str]) -> None:
+        if index_version != self.index_version:
+            if self._entries:
+                print(f"Indice actualizado ({self.index_version} -> {index_version}), cache de respuestas invalidado")
+            self._entries.clear()
+            self._exact.clear()
+            self._matrix = None
+            self.index_version = index_version
+
+    def _remove_expired(self) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        now = time.time()
+        expired = [
+            entry_id for entry_id, entry in self._entries.items()
+            if now - entry['created_at'] > self.ttl_seconds
+        ]
+        for entry_id in expired:
+            self._remove(entry_id)
+        if expired:
+            self._matrix = None
+
+    @staticmethod
+    def _exact_key(question: str, n_results: int) -> Tuple[str, int]:
+        return normalize_text(question).lower(), n_results
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        if self._exact.get(entry['exact_key']) == entry_id:
+            del self._exact[entry['exact_key']]
+
+    def _get_matrix(self) -> Tuple[np.ndarray, List[int]]:
+        if self._matrix is None:
+            #Las entradas sin embedding (ej. respondidas por el atajo lexico) solo sirven por texto exacto
+            self._matrix_ids = [
+                entry_id for entry_id, entry in self._entries.items()
+                if entry['embedding'] is not None
+            ]
+            if self._matrix_ids:
+                self._matrix = np.stack([self._entries[i]['embedding'] for i in self._matrix_ids])
+            else:
+                self._matrix = np.zeros((0, 0), dtype=np.float32)
+        return self._matrix, self._matrix_ids
+
+    def lookup_exact(
+        self,
+        question: str,
+        index_version: Optional[str],
+        n_results: int
+    ) -> Optional[Tuple[Dict, float]]:
+        with self._lock:
+            self._check_version(index_version)
+            self._remove_expired()
+            entry_id = self._exact.get(self._exact_key(question, n_results))
+            if entry_id is None:
+                return None
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return dict(self._entries[entry_id]['result']), 1.0
+
+    def lookup(
+        self,
+        query_embedding: List[float],
+        index_version: Optional[str],
+        n_results: int
+    ) -> Optional[Tuple[Dict, float]]:
+        with self._lock:
+            self._check_version(index_version)
+            self._remove_expired()
+            matrix, matrix_ids = self._get_matrix()
+            if not matrix_ids:
+                self.misses += 1
+                return None
+
+            query = self._normalize(query_embedding)
+            if query.shape[0] != matrix.shape[1]:
+                self.misses += 1
+                return None
+            similarities = matrix @ query
+
+            #Se recorren de mayor a menor similitud hasta encontrar una entrada con el mismo n_results
+            for position in np.argsort(-similarities):
+                similarity = float(similarities[position])
+                if similarity < self.threshold:
+                    break
+                entry_id = matrix_ids[position]
+                entry = self._entries[entry_id]
+                if entry['n_results'] != n_results:
+                    continue
+                self._entries.move_to_end(entry_id)
+                self.hits += 1
+                return dict(entry['result']), similarity
+
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        query_embedding: Optional[List[float]],
+        result: Dict,
+        index_version: Optional[str],
+        n_results: int
+    ) -> None:
+        with self._lock:
+            self._check_version(index_version)
+            exact_key = self._exact_key(result.get('query', ''), n_results)
+            self._entries[self._next_id] = {
+                'embedding': self._normalize(query_embedding) if query_embedding is not None else None,
+                'result': dict(result),
+                'n_results': n_results,
+                'exact_key': exact_key,
+                'created_at': time.time()
+            }
+            self._exact[exact_key] = self._next_id
+            self._next_id += 1
+            #Expulsion LRU cuando se supera el tamaño maximo
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            self._matrix = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._exact.clear()
+            self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total) if total else 0.0,
+            'index_version': self.index_version
+        }
@@ -0,0 +1,264 @@
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional
+
+from backend.vector_store_manager import VectorStoreManager, open_chroma_client
+from backend.rag_engine import RAGEngine
+from backend.config import (
+    CHROMA_PERSIST_DIRECTORY,
+    CHROMA_COLLECTION_NAME,
+    KNOWLEDGE_BASE_PATH,
+    VECTOR_SEARCH_BACKEND,
+    RETRIEVAL_MODE,
+    INDEX_PROFILE,
+    QUERY_ROUTING_ENABLED,
+    TOP_K_RESULTS,
+    SYSTEM_PROMPT,
+    ANSWER_CACHE_ENABLED,
+    TENANTS_CONFIG_PATH,
+    TENANT_POOL_MAX_TENANTS,
+    TENANT_POOL_MAX_MEMORY_MB,
+    TENANT_POOL_CHROMA_MEMORY_SHARE,
+    TENANT_IDLE_SECONDS
+)
+
+#El id se usa en nombres de coleccion y rutas: solo letras, numeros, guion y guion bajo
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,50}$")
+TENANT_SETTINGS = (
+    'collection_name',
+    'knowledge_base_path',
+    'system_prompt',
+    'top_k',
+    'search_backend',
+    'retrieval_mode',
+    'index_profile',
+    'query_routing'
+)
+
+
+def load_tenants(config_path: str = TENANTS_CONFIG_PATH) -> Dict[str, Dict]:
+    #Formato: {"tenant_id": {"system_prompt": "...", "top_k": 4, ...}}
+    if not os.path.exists(config_path):
+        return {}
+    try:
+        with open(config_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error al leer la configuracion de tenants: {str(e)}")
+        return {}
+
+
+class TenantManager:
+    """Pool de RAGEngine por tenant (PYME) sobre un solo cliente de Chroma.
+
+    Cada tenant abre su coleccion e indices locales una sola vez, en su primera consulta,
+    y queda en memoria mientras reciba trafico. Los tenants inactivos se liberan por LRU
+    al superar max_tenants o max_memory_mb, o al pasar idle_seconds sin consultas.
+
+    max_memory_mb se reparte: chroma_memory_share va al cache de segmentos HNSW que Chroma
+    libera por su cuenta, y el resto es el limite de los indices locales (numpy, snapshot,
+    BM25) que controla la eviccion de tenants. Juntos no pasan de max_memory_mb.
+    """
+
+    def __init__(
+        self,
+        tenants: Optional[Dict[str, Dict]] = None,
+        persist_directory: str = CHROMA_PERSIST_DIRECTORY,
+        max_tenants: int = TENANT_POOL_MAX_TENANTS,
+        max_memory_mb: float = TENANT_POOL_MAX_MEMORY_MB,
+        idle_seconds: float = TENANT_IDLE_SECONDS,
+        use_answer_cache: bool = ANSWER_CACHE_ENABLED,
+        chroma_memory_share: float = TENANT_POOL_CHROMA_MEMORY_SHARE
+    ):
+        if max_tenants <= 0:
+            raise ValueError("max_tenants debe ser mayor a 0")
+        if not 0 < chroma_memory_share < 1:
+            raise ValueError("chroma_memory_share debe estar entre 0 y 1")
+        self.persist_directory = persist_directory
+        self.max_tenants = max_tenants
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self.chroma_memory_bytes = int(self.max_memory_bytes * chroma_memory_share)
+        self.local_memory_bytes = self.max_memory_bytes - self.chroma_memory_bytes
+        self.idle_seconds = idle_seconds
+        self.use_answer_cache = use_answer_cache
+        self._tenants: Dict[str, Dict] = {}
+        self._pool: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        #Un lock por tenant: abrir un tenant frio no bloquea las consultas de los demas
+        self._open_locks: Dict[str, threading.Lock] = {}
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.hits = 0
+        self.opens = 0
+        self.evictions = 0
+        for tenant_id, settings in (load_tenants() if tenants is None else tenants).items():
+            self.register_tenant(tenant_id, **settings)
+
+    @property
+    def client(self):
+        #Un solo PersistentClient para todas las colecciones; Chroma libera por LRU los HNSW frios
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = open_chroma_client(self.persist_directory, self.chroma_memory_bytes)
+        return self._client
+
+    def register_tenant(self, tenant_id: str, **settings) -> None:
+        if not TENANT_ID_PATTERN.match(tenant_id or ""):
+            raise ValueError(f"Id de tenant invalido: {tenant_id!r}")
+        unknown = set(settings) - set(TENANT_SETTINGS)
+        if unknown:
+            raise ValueError(f"Opciones de tenant no soportadas: {', '.join(sorted(unknown))}")
+        self._tenants[tenant_id] = settings
+        #Si el tenant ya estaba abierto, la nueva configuracion aplica en su proxima consulta
+        with self._lock:
+            self._pool.pop(tenant_id, None)
+
+    def list_tenants(self) -> List[str]:
+        return sorted(self._tenants)
+
+    def tenant_settings(self, tenant_id: str) -> Dict:
+        if tenant_id not in self._tenants:
+            raise KeyError(f"Tenant no registrado: {tenant_id}")
+        tenant_directory = os.path.join(self.persist_directory, "tenants", tenant_id)
+        settings = {
+            'collection_name': f"{CHROMA_COLLECTION_NAME}_{tenant_id}",
+            'knowledge_base_path': os.path.join(KNOWLEDGE_BASE_PATH, tenant_id),
+            'system_prompt': SYSTEM_PROMPT,
+            'top_k': TOP_K_RESULTS,
+            'search_backend': VECTOR_SEARCH_BACKEND,
+            'retrieval_mode': RETRIEVAL_MODE,
+            'index_profile': INDEX_PROFILE,
+            'query_routing': QUERY_ROUTING_ENABLED,
+            'manifest_path': os.path.join(tenant_directory, "index_manifest.json"),
+            'bm25_path': os.path.join(tenant_directory, "bm25_index.json"),
+            'snapshot_path': os.path.join(tenant_directory, "snapshot")
+        }
+        settings.update(self._tenants[tenant_id])
+        return settings
+
+    def create_store(self, tenant_id: str) -> VectorStoreManager:
+        #Store del tenant sobre el cliente compartido (tambien lo usa el indexado)
+        settings = self.tenant_settings(tenant_id)
+        return VectorStoreManager(
+            persist_directory=self.persist_directory,
+            collection_name=settings['collection_name'],
+            search_backend=settings['search_backend'],
+            manifest_path=settings['manifest_path'],
+            retrieval_mode=settings['retrieval_mode'],
+            bm25_path=settings['bm25_path'],
+            client=self.client,
+            snapshot_path=settings['snapshot_path'],
+            index_profile=settings['index_profile'],
+            query_routing=settings['query_routing']
+        )
+
+    def _open(self, tenant_id: str) -> Dict:
+        settings = self.tenant_settings(tenant_id)
+        start_time = time.perf_counter()
+        store = self.create_store(tenant_id)
+        #Coleccion, BM25 y numpy se cargan ahora y no en cada request
+        store.warmup()
+        engine = RAGEngine(
+            use_answer_cache=self.use_answer_cache,
+            vector_store=store,
+            system_prompt=settings['system_prompt'],
+            top_k=settings['top_k']
+        )
+        print(f"Tenant {tenant_id} abierto en {time.perf_counter() - start_time:.3f}s")
+        return {'engine': engine, 'last_used': time.monotonic()}
+
+    def _lookup(self, tenant_id: str) -> Optional[RAGEngine]:
+        with self._lock:
+            entry = self._pool.get(tenant_id)
+            if entry is None:
+                return None
+            self._pool.move_to_end(tenant_id)
+            entry['last_used'] = time.monotonic()
+            self.hits += 1
+            return entry['engine']
+
+    def get_engine(self, tenant_id: str) -> RAGEngine:
+        engine = self._lookup(tenant_id)
+        if engine is not None:
+            return engine
+        with self._lock:
+            open_lock = self._open_locks.setdefault(tenant_id, threading.Lock())
+        with open_lock:
+            #Otro hilo pudo abrirlo mientras esperabamos
+            engine = self._lookup(tenant_id)
+            if engine is not None:
+                return engine
+            entry = self._open(tenant_id)
+            with self._lock:
+                self._pool[tenant_id] = entry
+                self.opens += 1
+                self._evict(keep=tenant_id)
+        return entry['engine']
+
+    def get_store(self, tenant_id: str) -> VectorStoreManager:
+        return self.get_engine(tenant_id).vector_store
+
+    def _memory_bytes(self) -> int:
+        return sum(entry['engine'].vector_store.memory_bytes() for entry in self._pool.values())
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        #Llamar con self._lock tomado. Primero los inactivos, luego LRU hasta cumplir los limites
+        now = time.monotonic()
+        for tenant_id in list(self._pool):
+            if tenant_id != keep and now - self._pool[tenant_id]['last_used'] > self.idle_seconds:
+                self._drop(tenant_id, "inactivo")
+        while len(self._pool) > 1 and (
+            len(self._pool) > self.max_tenants or self._memory_bytes() > self.local_memory_bytes
+        ):
+            tenant_id = next(iter(self._pool))
+            if tenant_id == keep:
+                self._pool.move_to_end(tenant_id)
+                tenant_id = next(iter(self._pool))
+            self._drop(tenant_id, "LRU")
+
+    def _drop(self, tenant_id: str, reason: str) -> None:
+        #Solo se sueltan las referencias: una consulta en curso termina con su propio engine
+        self._pool.pop(tenant_id, None)
+        self._open_locks.pop(tenant_id, None)
+        self.evictions += 1
+        print(f"Tenant {tenant_id} liberado ({reason})")
+
+    def evict_idle(self) -> int:
+        #Para llamar periodicamente (ej. desde un scheduler); retorna cuantos tenants se liberaron
+        with self._lock:
+            before = len(self._pool)
+            self._evict()
+            return before - len(self._pool)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'registered': len(self._tenants),
+                'loaded': list(self._pool),
+                'memory_mb': self._memory_bytes() / (1024 * 1024),
+                'max_tenants': self.max_tenants,
+                'max_memory_mb': self.max_memory_bytes / (1024 * 1024),
+                'local_memory_limit_mb': self.local_memory_bytes / (1024 * 1024),
+                'chroma_memory_limit_mb': self.chroma_memory_bytes / (1024 * 1024),
+                'hits': self.hits,
+                'opens': self.opens,
+                'evictions': self.evictions
+            }
+
+
+_tenant_manager: Optional[TenantManager] = None
+_tenant_manager_lock = threading.Lock()
+
+
+def get_tenant_manager() -> TenantManager:
+    global _tenant_manager
+    if _tenant_manager is None:
+        with _tenant_manager_lock:
+            if _tenant_manager is None:
+                _tenant_manager = TenantManager()
+    return _tenant_manager
@@ -0,0 +1,46 @@
+from typing import Optional
+
+from backend.config import CHAT_MODEL
+
+_encodings = {}
+
+def get_encoding(model: str = CHAT_MODEL):
+    #Retorna el tokenizer del modelo, o None si tiktoken no esta instalado
+    if model not in _encodings:
+        #tiktoken se importa la primera vez que se cuentan tokens, no al importar el modulo
+        try:
+            import tiktoken
+        except ImportError:
+            _encodings[model] = None
+            return None
+        try:
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                #Modelos que tiktoken aun no conoce usan la codificacion de la familia gpt-4o
+                _encodings[model] = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            #tiktoken descarga la codificacion la primera vez; sin red se usa la aproximacion
+            print(f"Advertencia: tokenizer no disponible para {model} ({type(e).__name__}), se usara una aproximacion")
+            _encodings[model] = None
+    return _encodings[model]
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding(model or CHAT_MODEL)
+    if encoding is None:
+        #Aproximacion de ~4 caracteres por token cuando no hay tokenizer
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    if max_tokens <= 0 or not text:
+        return ""
+    encoding = get_encoding(model or CHAT_MODEL)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import uuid
+import queue
+import atexit
+import bisect
+import hashlib
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Dict, Optional
+
+from backend.config import (
+    TRACING_ENABLED,
+    TRACE_LOG_PATH,
+    TRACE_LOG_MAX_MB,
+    TRACE_LOG_BACKUPS,
+    TRACE_QUERY_TEXT,
+    TRACE_QUERY_MAX_CHARS,
+    LATENCY_WINDOW_SIZE
+)
+
+#Limites de los buckets del histograma (segundos), estilo Prometheus
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    """Histograma acumulado (para Prometheus) mas una ventana reciente para percentiles."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window_size: int = LATENCY_WINDOW_SIZE):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.window = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            self.window.append(seconds)
+
+    def percentiles(self, quantiles=(0.5, 0.95, 0.99)) -> Dict[float, float]:
+        with self._lock:
+            samples = sorted(self.window)
+        if not samples:
+            return {q: 0.0 for q in quantiles}
+        return {
+            q: samples[min(len(samples) - 1, int(round(q * (len(samples) - 1))))]
+            for q in quantiles
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, LatencyHistogram())
+        histogram.observe(seconds)
+
+    def get_summary(self) -> Dict[str, Dict]:
+        summary = {}
+        for stage, histogram in sorted(self.histograms.items()):
+            p = histogram.percentiles()
+            summary[stage] = {
+                'count': histogram.count,
+                'p50_ms': p[0.5] * 1000,
+                'p95_ms': p[0.95] * 1000,
+                'p99_ms': p[0.99] * 1000
+            }
+        return summary
+
+    def render_prometheus(self) -> str:
+        #Formato de texto de Prometheus: histograma acumulado y resumen con percentiles recientes
+        lines = [
+            "# HELP rag_stage_latency_seconds Latencia por etapa del pipeline RAG",
+            "# TYPE rag_stage_latency_seconds histogram"
+        ]
+        for stage, histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for limit, count in zip(histogram.buckets, histogram.bucket_counts):
+                cumulative += count
+                lines.append(f'rag_stage_latency_seconds_bucket{{stage="{stage}",le="{limit}"}} {cumulative}')
+            lines.append(f'rag_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'rag_stage_latency_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+            lines.append(f'rag_stage_latency_seconds_count{{stage="{stage}"}} {histogram.count}')
+        lines.append("# HELP rag_stage_latency_recent_seconds Percentiles de la ventana reciente por etapa")
+        lines.append("# TYPE rag_stage_latency_recent_seconds summary")
+        for stage, histogram in sorted(self.histograms.items()):
+            for quantile, value in histogram.percentiles().items():
+                lines.append(f'rag_stage_latency_recent_seconds{{stage="{stage}",quantile="{quantile}"}} {value:.6f}')
+            lines.append(f'rag_stage_latency_recent_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+            lines.append(f'rag_stage_latency_recent_seconds_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("rag_trace", default=None)
+#Un logger por archivo de trazas; el listener escribe desde su propio hilo
+_trace_loggers: Dict[str, logging.Logger] = {}
+_trace_listeners: Dict[str, QueueListener] = {}
+_trace_loggers_lock = threading.Lock()
+
+
+class Trace:
+    """Conjunto de spans (etapas con duracion y tokens) de una consulta."""
+
+    def __init__(self, name: str, **attributes):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = dict(attributes)
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.duration_ms: Optional[float] = None
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        #El diccionario que se entrega permite agregar atributos (ej. tokens) dentro del bloque
+        data = dict(attributes)
+        start = time.perf_counter()
+        try:
+            yield data
+        finally:
+            elapsed = time.perf_counter() - start
+            self.add_span(name, elapsed, start - self._start, **data)
+
+    def add_span(self, name: str, elapsed: float, offset: Optional[float] = None, **attributes) -> None:
+        #offset: segundos desde el inicio de la traza; por defecto el span termina ahora
+        if offset is None:
+            offset = time.perf_counter() - self._start - elapsed
+        span = {
+            'name': name,
+            'start_ms': round(offset * 1000, 3),
+            'duration_ms': round(elapsed * 1000, 3)
+        }
+        span.update(attributes)
+        self.spans.append(span)
+        metrics.observe(name, elapsed)
+
+    def finish(self) -> Dict:
+        if self.duration_ms is None:
+            elapsed = time.perf_counter() - self._start
+            self.duration_ms = round(elapsed * 1000, 3)
+            metrics.observe(f"{self.name}_total", elapsed)
+            write_trace(self)
+        return self.to_dict()
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'start_time': self.start_time,
+            'duration_ms': self.duration_ms,
+            'attributes': self.attributes,
+            'spans': list(self.spans)
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def use_trace(trace: Optional[Trace]):
+    #Activa la traza para el codigo dentro del bloque (no usar alrededor de un yield)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    #Span sobre la traza activa; sin traza activa solo alimenta las metricas
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace.span(name, **attributes) as data:
+            yield data
+        return
+    data = dict(attributes)
+    start = time.perf_counter()
+    try:
+        yield data
+    finally:
+        metrics.observe(name, time.perf_counter() - start)
+
+
+def record_span(name: str, elapsed: float, trace: Optional[Trace] = None, **attributes) -> None:
+    #Para etapas que no caben en un bloque with (ej. un stream que hace yield)
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, elapsed, **attributes)
+    else:
+        metrics.observe(name, elapsed)
+
+
+def redact_query(text: str, mode: str = TRACE_QUERY_TEXT, max_chars: int = TRACE_QUERY_MAX_CHARS) -> Optional[str]:
+    #Las preguntas pueden traer datos personales (nombres, telefonos, direcciones)
+    if mode == "full":
+        return text
+    if mode == "truncate":
+        return text if len(text) <= max_chars else text[:max_chars] + "..."
+    if mode == "hash":
+        return "sha256:" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+    return None
+
+
+def _get_trace_logger(path: str) -> logging.Logger:
+    logger = _trace_loggers.get(path)
+    if logger is None:
+        with _trace_loggers_lock:
+            logger = _trace_loggers.get(path)
+            if logger is None:
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                handler = RotatingFileHandler(
+                    path,
+                    maxBytes=int(TRACE_LOG_MAX_MB * 1024 * 1024),
+                    backupCount=TRACE_LOG_BACKUPS,
+                    encoding='utf-8',
+                    delay=True
+                )
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                log_queue = queue.SimpleQueue()
+                listener = QueueListener(log_queue, handler)
+                listener.start()
+                logger = logging.getLogger(f"rag_traces.{path}")
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                logger.addHandler(QueueHandler(log_queue))
+                _trace_listeners[path] = listener
+                _trace_loggers[path] = logger
+    return logger
+
+
+def close_trace_logs() -> None:
+    #Escribe lo que quede en la cola y cierra los archivos (al salir del proceso o en pruebas)
+    with _trace_loggers_lock:
+        for path, listener in _trace_listeners.items():
+            listener.stop()
+            for handler in list(_trace_loggers[path].handlers):
+                _trace_loggers[path].removeHandler(handler)
+            for handler in listener.handlers:
+                handler.close()
+        _trace_listeners.clear()
+        _trace_loggers.clear()
+
+
+atexit.register(close_trace_logs)
+
+
+def write_trace(trace: Trace, path: str = TRACE_LOG_PATH) -> None:
+    #Solo encola la linea: la escritura y la rotacion del archivo ocurren en el hilo del listener
+    if not TRACING_ENABLED:
+        return
+    try:
+        record = trace.to_dict()
+        if 'query' in record['attributes']:
+            record['attributes'] = dict(record['attributes'], query=redact_query(record['attributes']['query']))
+        _get_trace_logger(path).info(json.dumps(record, ensure_ascii=False, default=str))
+    except OSError as e:
+        print(f"Advertencia: no se pudo escribir la traza ({str(e)})")
@@ -1,94 +1,644 @@
-import chromadb
-from chromadb.config import Settings
 from typing import List, Dict, Optional
+import os
+import json
 import time
-from backend.embeddings_manual import get_embeddings_batch
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from backend.bulk_embedding_client import BulkEmbeddingClient
+from backend.numpy_vector_index import NumpyVectorIndex
+from backend.embedding_snapshot import SnapshotVectorIndex, SIDECAR_NAME, export_snapshot
+from backend.incremental_indexer import get_index_version
+from backend.bm25_index import BM25Index, is_confident, reciprocal_rank_fusion
+from backend.query_router import QueryRouter
+from backend.fact_index import FactIndex
+from backend.tracing import span
 from backend.config import (
     CHROMA_PERSIST_DIRECTORY,
-    CHROMA_COLLECTION_NAME
+    CHROMA_COLLECTION_NAME,
+    VECTOR_SEARCH_BACKEND,
+    INDEX_MANIFEST_PATH,
+    CHROMA_EXECUTOR_WORKERS,
+    RETRIEVAL_MODE,
+    BM25_INDEX_PATH,
+    HYBRID_CANDIDATES,
+    BM25_FAST_PATH_ENABLED,
+    BM25_FAST_PATH_MIN_SCORE,
+    BM25_FAST_PATH_MIN_RATIO,
+    EMBEDDING_SNAPSHOT_PATH,
+    EMBEDDING_SNAPSHOT_DTYPE,
+    INDEX_PROFILES,
+    INDEX_PROFILE,
+    QUERY_ROUTING_ENABLED,
+    QUERY_ROUTING_METHOD,
+    QUERY_ROUTING_MIN_CONFIDENCE,
+    QUERY_ROUTING_SOURCE_RATIO
 )
 
+def open_chroma_client(persist_directory: str, memory_limit_bytes: Optional[int] = None):
+    #chromadb tarda en importarse: solo se paga cuando realmente se usa la base
+    import chromadb
+    from chromadb.config import Settings
+    settings = {
+        'anonymized_telemetry': False,
+        'allow_reset': True #En produccion false
+    }
+    if memory_limit_bytes:
+        #Chroma descarga de memoria los segmentos (HNSW) menos usados al pasar el limite
+        settings['chroma_segment_cache_policy'] = "LRU"
+        settings['chroma_memory_limit_bytes'] = memory_limit_bytes
+    return chromadb.PersistentClient(path=persist_directory, settings=Settings(**settings))
+
+def is_collection_not_found(error: Exception) -> bool:
+    #La coleccion abierta fue borrada o reemplazada por otro proceso
+    from chromadb.errors import NotFoundError
+    return isinstance(error, NotFoundError)
+
+def profile_metadata(profile: str) -> Dict:
+    #Metadata con la que Chroma construye el HNSW de una coleccion nueva
+    if profile not in INDEX_PROFILES:
+        raise ValueError(f"Perfil de indice desconocido: {profile} (opciones: {', '.join(INDEX_PROFILES)})")
+    settings = INDEX_PROFILES[profile]
+    return {
+        'hnsw:space': settings['space'],
+        'hnsw:M': settings['M'],
+        'hnsw:construction_ef': settings['construction_ef'],
+        'hnsw:search_ef': settings['search_ef'],
+        'index_profile': profile
+    }
+
+def distance_to_similarity(distance: Optional[float], space: str) -> Optional[float]:
+    #Similitud entre 0 y 1 para mostrar; 1 - distancia solo vale en coseno
+    if distance is None:
+        return None
+    if space == "l2":
+        #Chroma reporta L2 al cuadrado; entre vectores unitarios va de 0 a 4
+        return 1.0 - distance / 2.0
+    return 1.0 - distance
+
 class VectorStoreManager:
     def __init__(
         self,
         persist_directory: str = CHROMA_PERSIST_DIRECTORY,
-        collection_name: str = CHROMA_COLLECTION_NAME
+        collection_name: str = CHROMA_COLLECTION_NAME,
+        search_backend: str = VECTOR_SEARCH_BACKEND,
+        manifest_path: str = INDEX_MANIFEST_PATH,
+        retrieval_mode: str = RETRIEVAL_MODE,
+        bm25_path: str = BM25_INDEX_PATH,
+        client=None,
+        snapshot_path: str = EMBEDDING_SNAPSHOT_PATH,
+        index_profile: str = INDEX_PROFILE,
+        query_routing: bool = QUERY_ROUTING_ENABLED,
+        routing_method: str = QUERY_ROUTING_METHOD,
+        fast_path: bool = BM25_FAST_PATH_ENABLED
     ):
+        if search_backend not in ("chroma", "numpy", "snapshot"):
+            raise ValueError(f"Backend de busqueda no soportado: {search_backend}")
+        if retrieval_mode not in ("vector", "hybrid"):
+            raise ValueError(f"Modo de recuperacion no soportado: {retrieval_mode}")
+        profile_metadata(index_profile)
+        if routing_method not in ("keywords", "centroid"):
+            raise ValueError(f"Metodo de ruteo no soportado: {routing_method}")
         self.persist_directory = persist_directory
         self.collection_name = collection_name
-        self.client = chromadb.PersistentClient(
-            path = persist_directory,
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True #En produccion false
-            )
-        )
-        self.collection = self._get_or_create_collection()
+        self.search_backend = search_backend
+        self.manifest_path = manifest_path
+        self.retrieval_mode = retrieval_mode
+        self.bm25_path = bm25_path
+        self.snapshot_path = snapshot_path
+        self.index_profile = index_profile
+        self.query_routing = query_routing
+        self.routing_method = routing_method
+        #Atajo lexico: si BM25 es concluyente se responde sin embedding ni busqueda vectorial
+        self.fast_path = fast_path
+        self.fast_path_hits = 0
+        #Alias de la version activa de la base (ver kb_versions): apunta a otra coleccion y otro BM25
+        self.alias_path = os.path.join(persist_directory, "aliases", f"{collection_name}.json")
+        self.versions_directory = os.path.join(os.path.dirname(bm25_path) or ".", "versions")
+        self._alias: Optional[Dict] = None
+        self._alias_mtime: Optional[int] = None
+        #Clasificador de fuentes; se rearma si cambia el indice BM25 o la version indexada
+        self._router: Optional[QueryRouter] = None
+        self._router_key = None
+        #Tabla de precios y horarios; se arma con los mismos chunks que el BM25
+        self._fact_index: Optional[FactIndex] = None
+        self._fact_index_key = None
+        #Indice BM25 cargado desde disco; se recarga si el archivo cambia
+        self._bm25_index: Optional[BM25Index] = None
+        self._bm25_mtime: Optional[tuple] = None
+        #Indice en memoria para el backend numpy, se construye en la primera busqueda
+        self._numpy_index: Optional[NumpyVectorIndex] = None
+        #Snapshot mapeado en memoria (backend snapshot); se reabre si se exporta uno nuevo
+        self._snapshot_index: Optional[SnapshotVectorIndex] = None
+        self._snapshot_mtime: Optional[int] = None
+        self._snapshot_warning: Optional[str] = None
+        #Pool acotado para ejecutar las llamadas bloqueantes de Chroma desde codigo async
+        self._executor: Optional[ThreadPoolExecutor] = None
+        #Resultado del ultimo indexado masivo (incluye los chunks que fallaron)
+        self.last_index_report: Optional[Dict] = None
+        #Cliente y coleccion de Chroma se abren al primer uso (o en warmup); el cliente puede ser compartido
+        self._client = client
+        self._collection = None
+        self._open_lock = threading.Lock()
         
         print(f"VectorStoreManager Inicializado")
         print(f"Directorio: {persist_directory}")
         print(f"Coleccion: {collection_name}")
+        print(f"Backend de busqueda: {search_backend} ({retrieval_mode})")
         
-    def _get_or_create_collection(self):
+    @property
+    def client(self):
+        if self._client is None:
+            with self._open_lock:
+                if self._client is None:
+                    self._client = open_chroma_client(self.persist_directory)
+        return self._client
+    
+    @property
+    def collection(self):
+        self._check_alias()
+        if self._collection is None:
+            client = self.client
+            with self._open_lock:
+                if self._collection is None:
+                    self._collection = self._get_or_create_collection(client)
+        return self._collection
+    
+    @collection.setter
+    def collection(self, collection) -> None:
+        self._collection = collection
+    
+    def _with_collection(self, operation):
+        #Si otro proceso borro la coleccion que teniamos abierta se reabre por nombre (o alias) y se reintenta una vez
+        collection = self.collection
+        try:
+            return operation(collection)
+        except Exception as e:
+            if not is_collection_not_found(e):
+                raise
+            print(f"La coleccion abierta ya no existe, se reabre {self.collection_name}")
+            with self._open_lock:
+                if self._collection is collection:
+                    self._collection = None
+            return operation(self.collection)
+    
+    def warmup(self) -> Dict:
+        #Abre la coleccion y carga los indices locales antes de la primera consulta
+        timings = {}
+        start_time = time.perf_counter()
+        self.collection.count()
+        timings['chroma'] = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        if self.retrieval_mode == "hybrid":
+            self._get_bm25_index()
+        timings['bm25'] = time.perf_counter() - start_time
+        if self.search_backend == "numpy":
+            start_time = time.perf_counter()
+            self._get_numpy_index()
+            timings['numpy'] = time.perf_counter() - start_time
+        if self.search_backend == "snapshot":
+            start_time = time.perf_counter()
+            self._get_snapshot_index()
+            timings['snapshot'] = time.perf_counter() - start_time
+        return timings
+    
+    def memory_bytes(self) -> int:
+        #Memoria aproximada de los indices locales cargados (numpy y BM25); HNSW lo maneja Chroma
+        total = 0
+        if self._numpy_index is not None:
+            total += self._numpy_index.memory_bytes()
+        if self._bm25_index is not None:
+            total += self._bm25_index.memory_bytes()
+        if self._snapshot_index is not None:
+            total += self._snapshot_index.memory_bytes()
+        return total
+    
+    def _check_alias(self) -> Optional[Dict]:
+        #Si otro proceso activo una version, se cambia de coleccion en la siguiente consulta;
+        #las consultas en curso terminan con la coleccion que ya tenian
+        try:
+            mtime = os.stat(self.alias_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._alias_mtime:
+            alias = None
+            if mtime is not None:
+                try:
+                    with open(self.alias_path, 'r', encoding='utf-8') as file:
+                        alias = json.load(file)
+                except (OSError, ValueError) as e:
+                    print(f"Error al leer el alias {self.alias_path}: {str(e)}")
+            self._alias = alias
+            self._alias_mtime = mtime
+            self._collection = None
+            self._numpy_index = None
+        return self._alias
+    
+    def get_alias(self) -> Optional[Dict]:
+        return self._check_alias()
+    
+    def set_alias(self, alias: Dict) -> None:
+        #Reemplazo atomico: los lectores ven el alias anterior o el nuevo, nunca uno a medias
+        os.makedirs(os.path.dirname(self.alias_path), exist_ok=True)
+        tmp_path = f"{self.alias_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(alias, file, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.alias_path)
+    
+    def is_profile_copy(self, name: str) -> bool:
+        #Colecciones creadas por rebuild_with_profile
+        return name.startswith(f"{self.collection_name}__profile_")
+    
+    def clear_alias(self) -> bool:
+        """Desactiva la version de kb_versions y vuelve a la coleccion base (la que mantiene create_embeddings.py).
+
+        Un alias sin version lo publico rebuild_index.py y no se quita: volver a la base
+        dejaria el perfil HNSW anterior y la copia sin nadie que la borre. Las copias de
+        perfil de la version desactivada se eliminan; las consultas en curso sobre ellas
+        reabren la coleccion base (ver _with_collection).
+        """
+        alias = self.get_alias()
+        if not alias:
+            return False
+        if not alias.get('version'):
+            print(
+                f"El alias activo es la coleccion {alias['collection']} (perfil {alias.get('index_profile')}), "
+                f"no una version: se mantiene"
+            )
+            return False
+        try:
+            os.remove(self.alias_path)
+        except OSError:
+            return False
+        copies = [entry['collection'] for entry in alias.get('retired', [])]
+        if self.is_profile_copy(alias['collection']):
+            copies.append(alias['collection'])
+        for name in copies:
             try:
-                collection = self.client.get_collection(name=self.collection_name)
+                self.client.delete_collection(name=name)
+                print(f"Coleccion {name} eliminada (perfil de la version {alias['version']})")
+            except Exception as e:
+                if not is_collection_not_found(e):
+                    print(f"Error al eliminar {name}: {str(e)}")
+        return True
+    
+    def _get_or_create_collection(self, client=None):
+            client = client or self.client
+            alias = self._alias
+            if alias:
+                label = alias.get('version') or alias.get('index_profile')
+                try:
+                    collection = client.get_collection(name=alias['collection'])
+                    print(f"Coleccion {alias['collection']} ({label}) encontrada")
+                    return collection
+                except Exception as e:
+                    print(f"Error al abrir {alias['collection']} ({label}): {str(e)}; se usa {self.collection_name}")
+            try:
+                collection = client.get_collection(name=self.collection_name)
                 print(f"Coleccion {self.collection_name} encontrada")
+                current = (collection.metadata or {}).get('index_profile')
+                if current != self.index_profile:
+                    #Los parametros de construccion no se pueden cambiar en una coleccion existente
+                    print(
+                        f"Advertencia: la coleccion usa el perfil {current or 'por defecto (l2)'} y no "
+                        f"{self.index_profile}; migrala con scripts/rebuild_index.py --profile {self.index_profile}"
+                    )
             except Exception:
-                collection = self.client.create_collection(name=self.collection_name)    
-                print(f"Coleccion {self.collection_name} creada")
+                collection = client.create_collection(
+                    name=self.collection_name,
+                    metadata=profile_metadata(self.index_profile)
+                )
+                print(f"Coleccion {self.collection_name} creada (perfil {self.index_profile})")
             return collection
 
+    def _write_documents(
+        self,
+        documents: List[Dict[str, str]],
+        mode: str,
+        batch_size: Optional[int] = None,
+        resume: bool = True
+    ) -> Dict:
+        #Embebe con el cliente masivo (limites de la API, reintentos, checkpoint) y escribe cada lote
+        checkpoint_path = BulkEmbeddingClient.checkpoint_path_for(self.collection_name) if resume else None
+        client_options = {'checkpoint_path': checkpoint_path}
+        if batch_size:
+            client_options['max_items_per_batch'] = batch_size
+        bulk_client = BulkEmbeddingClient(**client_options)
+        
+        def write_batch(batch, embeddings):
+            payload = {
+                'documents': [doc['content'] for doc in batch],
+                'embeddings': embeddings,
+                'ids': [doc['_id'] for doc in batch],
+                'metadatas': [self._chunk_metadata(doc) for doc in batch]
+            }
+            if mode == 'upsert':
+                self.collection.upsert(**payload)
+            else:
+                self.collection.add(**payload)
+            self._numpy_index = None
+        
+        report = bulk_client.embed_documents(documents, write_batch, self.get_document_id)
+        self.last_index_report = report
+        return report
+
     def add_documents(
         self,
         documents: List[Dict[str, str]],
-        batch_size: int = 100,
+        batch_size: Optional[int] = None,
     ) -> int:
         if not documents or len(documents) == 0:
             print("No hay documentos para agregar")
             return 0
         print(f"\n Agregando {len(documents)} documentos a ChromaDB...")
         start_time = time.time()
-        total_added = 0
-        for i in range(0, len(documents), batch_size):
-            batch = documents[i:i + batch_size]
-            batch_num = (i // batch_size) + 1
-            total_batches = (len(documents) + batch_size - 1) // batch_size
-            print(f" Procesando lote {batch_num}/{total_batches}...")
-            
-            try:
-                texts = [doc['content'] for doc in batch]
-                embeddings = get_embeddings_batch(texts)
-                ids = [
-                    f"{doc['source']}_chunk{doc['chunk_index']}"
-                    for doc in batch
-                ]
-                metadatas = [
-                    {
-                        'source': doc['source'],
-                        'chunk_index': doc['chunk_index']
-                    }
-                    for doc in batch
-                ]
-                self.collection.add(
-                    documents=texts,
-                    embeddings=embeddings,
-                    ids=ids,
-                    metadatas=metadatas
-                )
-                total_added += len(batch)
-            except Exception as e:
-                continue
+        report = self._write_documents(documents, 'add', batch_size=batch_size)
+        #Los chunks que ya estaban en el checkpoint de una corrida interrumpida cuentan como agregados
+        total_added = report['succeeded'] + report['skipped']
         elapsed_time = time.time() - start_time
         print(f"\nDocumentos agregados: {total_added}/{len(documents)}")
         print(f"   Tiempo total: {elapsed_time:.2f}s")
         print(f"   Promedio: {elapsed_time/len(documents):.3f}s por documento")
+        if report['failed']:
+            print(f"   Fallidos: {len(report['failed'])} (ver last_index_report)")
         
         return total_added   
     
+    @staticmethod
+    def _chunk_metadata(doc: Dict) -> Dict:
+        return {
+            'source': doc['source'],
+            'chunk_index': doc['chunk_index'],
+            'section': doc.get('section', "")
+        }
+    
+    @staticmethod
+    def get_document_id(doc: Dict) -> str:
+        #Los chunks estructurados traen un id por hash de contenido; los de ventana usan la posicion
+        if doc.get('chunk_id'):
+            return doc['chunk_id']
+        return f"{doc['source']}_chunk{doc['chunk_index']}"
+    
+    def upsert_documents(
+        self,
+        documents: List[Dict[str, str]],
+        batch_size: Optional[int] = None,
+    ) -> List[str]:
+        #A diferencia de add_documents, sobrescribe ids existentes y retorna los ids escritos
+        if not documents:
+            return []
+        print(f"\n Actualizando {len(documents)} documentos en ChromaDB...")
+        #Sin checkpoint: el manifest del indexado incremental ya registra lo que quedo escrito
+        report = self._write_documents(documents, 'upsert', batch_size=batch_size, resume=False)
+        return report['succeeded_ids']
+    
+    def update_metadata(self, documents: List[Dict]) -> int:
+        #Actualiza solo la metadata (ej. la posicion del chunk) sin volver a embeber
+        if not documents:
+            return 0
+        try:
+            self.collection.update(
+                ids=[self.get_document_id(doc) for doc in documents],
+                metadatas=[self._chunk_metadata(doc) for doc in documents]
+            )
+            self._numpy_index = None
+            return len(documents)
+        except Exception as e:
+            print(f"Error al actualizar metadata: {str(e)}")
+            return 0
+    
+    def delete_documents(self, ids: List[str]) -> int:
+        if not ids:
+            return 0
+        try:
+            self.collection.delete(ids=ids)
+            self._numpy_index = None
+            return len(ids)
+        except Exception as e:
+            print(f"Error al eliminar documentos: {str(e)}")
+            return 0
+    
+    def get_existing_ids(self, ids: List[str]) -> List[str]:
+        if not ids:
+            return []
+        try:
+            results = self.collection.get(ids=ids, include=[])
+            return results['ids']
+        except Exception as e:
+            print(f"Error al consultar ids: {str(e)}")
+            return []
+    
+    def get_distance_space(self) -> str:
+        #Chroma usa L2 cuando la coleccion se creo sin especificar el espacio
+        metadata = self.collection.metadata or {}
+        return metadata.get('hnsw:space', 'l2')
+    
+    def distance_to_similarity(self, distance: Optional[float]) -> Optional[float]:
+        return distance_to_similarity(distance, self.get_distance_space())
+    
+    def rebuild_with_profile(self, profile: str, batch_size: int = 5000, grace_seconds: float = 600) -> Dict:
+        """Migra la coleccion a otro perfil HNSW copiando los embeddings guardados (sin llamar a OpenAI).
+
+        La copia se construye en una coleccion nueva y se publica con el alias (igual que
+        kb_versions): los workers la abren en su siguiente consulta y las consultas en curso
+        terminan con la anterior. La coleccion reemplazada se borra en una migracion
+        posterior, cuando pasaron grace_seconds (ver drop_retired_collections).
+        """
+        metadata = profile_metadata(profile)
+        start_time = time.time()
+        self.drop_retired_collections(grace_seconds)
+        source = self.collection
+        current = self.get_alias() or {}
+        new_name = f"{self.collection_name}__profile_{profile}_{int(start_time * 1000)}"
+        target = self.client.create_collection(name=new_name, metadata=metadata)
+        total = source.count()
+        batch_size = min(batch_size, self.client.get_max_batch_size())
+        try:
+            for offset in range(0, total, batch_size):
+                batch = source.get(
+                    include=['embeddings', 'documents', 'metadatas'],
+                    limit=batch_size,
+                    offset=offset
+                )
+                target.add(
+                    ids=batch['ids'],
+                    embeddings=batch['embeddings'],
+                    documents=batch['documents'],
+                    metadatas=batch['metadatas']
+                )
+                print(f"Copiados {min(offset + batch_size, total)}/{total} chunks")
+            if target.count() != total:
+                raise RuntimeError(f"La copia quedo incompleta: {target.count()} de {total} chunks")
+        except Exception:
+            self.client.delete_collection(name=new_name)
+            raise
+        
+        retired = list(current.get('retired', []))
+        #La coleccion base y las de kb_versions tienen su propio ciclo de vida; solo se retiran copias de perfil
+        if self.is_profile_copy(source.name):
+            retired.append({'collection': source.name, 'retired_at': time.time()})
+        self.set_alias({
+            'version': current.get('version'),
+            'collection': new_name,
+            'bm25_path': current.get('bm25_path', self.bm25_path),
+            'index_version': current.get('index_version'),
+            'index_profile': profile,
+            'previous': current.get('previous'),
+            'retired': retired,
+            'activated_at': time.strftime("%Y-%m-%dT%H:%M:%S")
+        })
+        self.index_profile = profile
+        elapsed = time.time() - start_time
+        print(f"Coleccion {new_name} publicada con el perfil {profile} en {elapsed:.2f}s")
+        return {
+            'profile': profile, 'collection': new_name, 'chunks': total,
+            'seconds': elapsed, 'space': metadata['hnsw:space']
+        }
+    
+    def drop_retired_collections(self, grace_seconds: float = 600) -> List[str]:
+        #Borra las colecciones reemplazadas por rebuild_with_profile hace mas de grace_seconds
+        alias = self.get_alias()
+        if not alias or not alias.get('retired'):
+            return []
+        cutoff = time.time() - grace_seconds
+        dropped, kept = [], []
+        for entry in alias['retired']:
+            if entry['retired_at'] > cutoff or entry['collection'] == alias['collection']:
+                kept.append(entry)
+                continue
+            try:
+                self.client.delete_collection(name=entry['collection'])
+            except Exception as e:
+                if not is_collection_not_found(e):
+                    print(f"Error al eliminar {entry['collection']}: {str(e)}")
+                    kept.append(entry)
+                    continue
+            dropped.append(entry['collection'])
+            print(f"Coleccion {entry['collection']} eliminada (perfil anterior)")
+        if dropped:
+            self.set_alias(dict(alias, retired=kept))
+        return dropped
+    
+    def _get_numpy_index(self) -> NumpyVectorIndex:
+        if self._numpy_index is None:
+            start_time = time.time()
+            self._numpy_index = NumpyVectorIndex.from_collection(
+                self.collection,
+                space=self.get_distance_space()
+            )
+            print(f"Indice numpy construido: {len(self._numpy_index)} vectores en {time.time() - start_time:.3f}s")
+        return self._numpy_index
+    
+    def _get_snapshot_index(self) -> Optional[SnapshotVectorIndex]:
+        #None si no hay snapshot o si es de otro contenido (se activo otra version): se busca en Chroma
+        try:
+            mtime = os.stat(os.path.join(self.snapshot_path, SIDECAR_NAME)).st_mtime_ns
+        except OSError:
+            self._warn_snapshot(f"Snapshot no encontrado en {self.snapshot_path}, se usa Chroma")
+            return None
+        if self._snapshot_index is None or mtime != self._snapshot_mtime:
+            start_time = time.time()
+            self._snapshot_index = SnapshotVectorIndex.load(self.snapshot_path)
+            self._snapshot_mtime = mtime
+            print(
+                f"Snapshot {self._snapshot_index.dtype} mapeado: {len(self._snapshot_index)} vectores "
+                f"en {time.time() - start_time:.3f}s"
+            )
+        expected = self._content_version()
+        if expected is not None and self._snapshot_index.index_version != expected:
+            self._warn_snapshot(
+                f"El snapshot es de la version {self._snapshot_index.index_version} y la activa es {expected}: "
+                f"se usa Chroma hasta que se exporte de nuevo"
+            )
+            return None
+        self._snapshot_warning = None
+        return self._snapshot_index
+    
+    def _warn_snapshot(self, message: str) -> None:
+        #Se avisa una vez por situacion, no en cada consulta
+        if message != self._snapshot_warning:
+            print(message)
+            self._snapshot_warning = message
+    
+    def export_snapshot(self, dtype: str = EMBEDDING_SNAPSHOT_DTYPE, directory: Optional[str] = None) -> Dict:
+        #Copia la coleccion a un snapshot cuantizado que los workers mapean en memoria
+        index = NumpyVectorIndex.from_collection(self.collection, space=self.get_distance_space())
+        return export_snapshot(
+            index,
+            directory or self.snapshot_path,
+            dtype=dtype,
+            index_version=self._content_version()
+        )
+    
+    def search_by_embeddings(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 3,
+        sources: Optional[List[str]] = None
+    ) -> List[List[Dict]]:
+        #Busqueda por lote: una sola consulta al backend para todas las preguntas.
+        #Con sources solo se buscan chunks de esas fuentes (where de Chroma o mascara en numpy)
+        if not query_embeddings:
+            return []
+        n_sources = len(sources) if sources else 0
+        if self.search_backend == "numpy":
+            index = self._get_numpy_index()
+            with span('numpy_search', n_queries=len(query_embeddings), n_results=n_results, sources=n_sources):
+                return index.search(query_embeddings, n_results=n_results, sources=sources)
+        if self.search_backend == "snapshot":
+            index = self._get_snapshot_index()
+            if index is not None:
+                with span('snapshot_search', n_queries=len(query_embeddings), n_results=n_results, sources=n_sources):
+                    return index.search(query_embeddings, n_results=n_results, sources=sources)
+        
+        options = {}
+        if sources:
+            options['where'] = {'source': {'$in': list(sources)}}
+        with span('chroma_query', n_queries=len(query_embeddings), n_results=n_results, sources=n_sources):
+            results = self._with_collection(lambda collection: collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                include=['documents', 'metadatas', 'distances'],
+                **options
+            ))
+        all_results = []
+        for q in range(len(query_embeddings)):
+            processed_results = []
+            for i in range(len(results['documents'][q])):
+                doc_result = {
+                    'id': results['ids'][q][i],
+                    'content': results['documents'][q][i],
+                    'source': results['metadatas'][q][i]['source'],
+                    'chunk_index': results['metadatas'][q][i]['chunk_index'],
+                    'section': results['metadatas'][q][i].get('section', ""),
+                    'distance': results['distances'][q][i]
+                }
+                processed_results.append(doc_result)
+            all_results.append(processed_results)
+        return all_results
+    
+    def _content_version(self) -> Optional[str]:
+        #Version del contenido publicado sin consultar Chroma (alias o manifest); None si no se sabe
+        alias = self._check_alias()
+        #Un alias de perfil (rebuild_with_profile) no cambia el contenido: sigue valiendo el manifest
+        if alias and alias.get('index_version'):
+            return alias['index_version']
+        return get_index_version(self.manifest_path)
+    
+    def get_index_version(self) -> Optional[str]:
+        #Cambia cada vez que se reindexa contenido distinto (ver incremental_indexer) o se activa otra version
+        version = self._content_version()
+        if version is None:
+            #Sin manifest solo podemos detectar cambios en la cantidad de documentos
+            version = f"count-{self._with_collection(lambda collection: collection.count())}"
+        return version
+    
     def search_similar(
         self,
         query: str,
         n_results: int = 3,
+        query_embedding: Optional[List[float]] = None,
     ) -> List[Dict]:
         if not query or query.strip() == "":
             print("Query vacía")
@@ -98,43 +648,288 @@ class VectorStoreManager:
         start_time = time.time()
         
         try:
-            from backend.embeddings_manual import get_embedding
-            query_embedding = get_embedding(query)
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                include=['documents', 'metadatas', 'distances']
-            )
-            processed_results = []
-            for i in range(len(results['documents'][0])):
-                doc_result = {
-                    'content': results['documents'][0][i],
-                    'source': results['metadatas'][0][i]['source'],
-                    'chunk_index': results['metadatas'][0][i]['chunk_index'],
-                    'distance': results['distances'][0][i]
-                }
-                processed_results.append(doc_result)
-            elapsed_time = time.time() - start_time
-            
-            print(f"Encontrados {len(processed_results)} documentos")
-            print(f"Tiempo: {elapsed_time:.3f}s")
-            
-            for i, doc in enumerate(processed_results, 1):
-                print(f"{i}. [{doc['source']}] Distancia: {doc['distance']:.4f}")
-                print(f"Preview: {doc['content'][:80]}...")
-                return processed_results
+            sources, lexical_results = self._route_and_lexical(query, query_embedding)
+            if query_embedding is None:
+                fast_results = self._fast_path_results(lexical_results, n_results)
+                if fast_results is not None:
+                    self._log_results(fast_results, time.time() - start_time)
+                    return fast_results
+                from backend.embedding_coalescer import get_query_embedding
+                query_embedding = get_query_embedding(query)
+                if self._routes_by_embedding():
+                    sources, lexical_results = self._route_and_lexical(query, query_embedding)
+            vector_results = self.search_by_embeddings(
+                [query_embedding],
+                n_results=self._vector_candidates(n_results),
+                sources=sources
+            )[0]
+            processed_results = self._fuse_results(vector_results, lexical_results, n_results)
+            if sources and len(processed_results) < n_results:
+                print("Pocos resultados en las fuentes ruteadas, se busca en toda la coleccion")
+                vector_results = self.search_by_embeddings(
+                    [query_embedding],
+                    n_results=self._vector_candidates(n_results)
+                )[0]
+                processed_results = self._fuse_results(vector_results, self._lexical_candidates(query), n_results)
+            self._log_results(processed_results, time.time() - start_time)
+            return processed_results
         except Exception as e:
             print(f"Error en busqueda: {str(e)}")
             return []    
     
+    def search_similar_batch(
+        self,
+        queries: List[str],
+        query_embeddings: List[List[float]],
+        n_results: int = 3
+    ) -> List[List[Dict]]:
+        #Muchas preguntas ya embebidas: una consulta al backend por grupo de fuentes ruteadas
+        #(una sola si el ruteo esta apagado) en lugar de una por pregunta
+        if not queries:
+            return []
+        start_time = time.time()
+        try:
+            routes = [self._route(query, embedding) for query, embedding in zip(queries, query_embeddings)]
+            candidates = self._vector_candidates(n_results)
+            groups: Dict[tuple, List[int]] = {}
+            for i, sources in enumerate(routes):
+                groups.setdefault(tuple(sources or ()), []).append(i)
+            vector_results: List[List[Dict]] = [[] for _ in queries]
+            for sources, indexes in groups.items():
+                found = self.search_by_embeddings(
+                    [query_embeddings[i] for i in indexes],
+                    n_results=candidates,
+                    sources=list(sources) or None
+                )
+                for i, results in zip(indexes, found):
+                    vector_results[i] = results
+            processed_results = [
+                self._fuse_results(vector_results[i], self._lexical_candidates(query, routes[i]), n_results)
+                for i, query in enumerate(queries)
+            ]
+            #Igual que search_similar: si las fuentes ruteadas no alcanzan se busca en toda la coleccion
+            fallback = [i for i, sources in enumerate(routes) if sources and len(processed_results[i]) < n_results]
+            if fallback:
+                found = self.search_by_embeddings([query_embeddings[i] for i in fallback], n_results=candidates)
+                for i, results in zip(fallback, found):
+                    processed_results[i] = self._fuse_results(results, self._lexical_candidates(queries[i]), n_results)
+            print(f"Busqueda por lote: {len(queries)} preguntas en {len(groups) + bool(fallback)} consultas, {time.time() - start_time:.3f}s")
+            return processed_results
+        except Exception as e:
+            print(f"Error en busqueda por lote: {str(e)}")
+            return [[] for _ in queries]
+    
+    def _log_results(self, processed_results: List[Dict], elapsed_time: float) -> None:
+        print(f"Encontrados {len(processed_results)} documentos")
+        print(f"Tiempo: {elapsed_time:.3f}s")
+        
+        for i, doc in enumerate(processed_results, 1):
+            if doc.get('distance') is not None:
+                print(f"{i}. [{doc['source']}] Distancia: {doc['distance']:.4f}")
+            else:
+                print(f"{i}. [{doc['source']}] BM25: {doc.get('bm25_score', 0.0):.2f}")
+            print(f"Preview: {doc['content'][:80]}...")
+    
+    def rebuild_lexical_index(self, chunks: List[Dict]) -> BM25Index:
+        #Se construye con los mismos chunks (e ids) que se guardan en Chroma
+        index = BM25Index.from_chunks(chunks, self.get_document_id)
+        index.save(self.bm25_path)
+        self._bm25_index = None
+        self._bm25_mtime = None
+        print(f"Indice BM25 guardado: {len(index)} chunks en {self.bm25_path}")
+        return index
+    
+    def _get_bm25_index(self) -> Optional[BM25Index]:
+        alias = self._check_alias()
+        path = alias['bm25_path'] if alias else self.bm25_path
+        try:
+            mtime = (path, os.stat(path).st_mtime_ns)
+        except OSError:
+            return None
+        if self._bm25_index is None or mtime != self._bm25_mtime:
+            self._bm25_index = BM25Index.load(path)
+            self._bm25_mtime = mtime
+        return self._bm25_index
+    
+    def _get_router(self) -> Optional[QueryRouter]:
+        if not self.query_routing:
+            return None
+        options = {'min_confidence': QUERY_ROUTING_MIN_CONFIDENCE, 'source_ratio': QUERY_ROUTING_SOURCE_RATIO}
+        if self.routing_method == "keywords":
+            index = self._get_bm25_index()
+            if index is None:
+                return None
+            if self._router is None or self._router_key is not index:
+                self._router = QueryRouter.from_bm25(index, **options)
+                self._router_key = index
+            return self._router
+        version = self.get_index_version()
+        if self._router is None or self._router_key != version:
+            #Los centroides salen del indice local si ya esta cargado; con Chroma se leen una vez
+            snapshot = self._get_snapshot_index() if self.search_backend == "snapshot" else None
+            if self.search_backend == "numpy":
+                index = self._get_numpy_index()
+            elif snapshot is not None:
+                index = snapshot
+            else:
+                index = NumpyVectorIndex.from_collection(self.collection, space=self.get_distance_space())
+            #Un snapshot int8 guarda la escala de cada fila aparte
+            self._router = QueryRouter.from_embeddings(
+                index.matrix, index.metadatas, scales=getattr(index, 'scales', None), **options
+            )
+            self._router_key = version
+        return self._router
+    
+    def get_fact_index(self) -> Optional[FactIndex]:
+        #Se rearma cuando cambia el indice BM25 (reindexado o activacion de otra version)
+        index = self._get_bm25_index()
+        if index is None:
+            return None
+        if self._fact_index is None or self._fact_index_key is not index:
+            self._fact_index = FactIndex.from_chunks(index.documents)
+            self._fact_index_key = index
+        return self._fact_index
+    
+    def _routes_by_embedding(self) -> bool:
+        return self.query_routing and self.routing_method == "centroid"
+    
+    def _route(self, query: str, query_embedding: Optional[List[float]] = None) -> Optional[List[str]]:
+        #Fuentes donde buscar, o None para buscar en toda la coleccion (ruteo apagado o poco seguro)
+        if self._routes_by_embedding() and query_embedding is None:
+            return None
+        router = self._get_router()
+        if router is None:
+            return None
+        with span('query_route', method=router.method) as data:
+            route = router.route(query, query_embedding)
+            data['sources'] = route['sources'] if route else None
+            data['confidence'] = round(route['confidence'], 3) if route else None
+        return route['sources'] if route else None
+    
+    def _lexical_candidates(self, query: str, sources: Optional[List[str]] = None) -> List[Dict]:
+        if self.retrieval_mode != "hybrid":
+            return []
+        index = self._get_bm25_index()
+        if index is None:
+            return []
+        with span('bm25_search') as data:
+            results = index.search(query, n_results=HYBRID_CANDIDATES, sources=sources)
+            data['candidates'] = len(results)
+        return results
+    
+    def _fast_path_results(self, lexical_results: List[Dict], n_results: int) -> Optional[List[Dict]]:
+        if not self.fast_path or not lexical_results:
+            return None
+        if not is_confident(lexical_results, BM25_FAST_PATH_MIN_SCORE, BM25_FAST_PATH_MIN_RATIO):
+            return None
+        self.fast_path_hits += 1
+        return lexical_results[:n_results]
+    
+    def lexical_fast_path(self, query: str, n_results: int = 3) -> Optional[List[Dict]]:
+        #Resultados solo lexicos si BM25 es concluyente; None si hace falta la busqueda vectorial
+        if not query or query.strip() == "":
+            return None
+        return self._fast_path_results(self._lexical_candidates(query, self._route(query)), n_results)
+    
+    def _vector_candidates(self, n_results: int) -> int:
+        if self.retrieval_mode == "hybrid":
+            return max(n_results, HYBRID_CANDIDATES)
+        return n_results
+    
+    def _fuse_results(
+        self,
+        vector_results: List[Dict],
+        lexical_results: List[Dict],
+        n_results: int
+    ) -> List[Dict]:
+        if not lexical_results:
+            return vector_results[:n_results]
+        return reciprocal_rank_fusion([vector_results, lexical_results], n_results)
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=CHROMA_EXECUTOR_WORKERS,
+                thread_name_prefix="chroma"
+            )
+        return self._executor
+    
+    async def _run_in_executor(self, function, *args):
+        loop = asyncio.get_running_loop()
+        #Se copia el contexto para que los spans del hilo queden en la traza de la consulta
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._get_executor(), context.run, function, *args)
+    
+    async def asearch_by_embeddings(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 3,
+        sources: Optional[List[str]] = None
+    ) -> List[List[Dict]]:
+        return await self._run_in_executor(self.search_by_embeddings, query_embeddings, n_results, sources)
+    
+    def _route_and_lexical(self, query: str, query_embedding: Optional[List[float]] = None) -> tuple:
+        #Ruteo y candidatos BM25 (pueden cargar el indice o armar el router): CPU y disco
+        sources = self._route(query, query_embedding)
+        return sources, self._lexical_candidates(query, sources)
+    
+    async def asearch_similar(
+        self,
+        query: str,
+        n_results: int = 3,
+        query_embedding: Optional[List[float]] = None,
+    ) -> List[Dict]:
+        if not query or query.strip() == "":
+            print("Query vacía")
+            return []
+
+        print(f"Buscando documentos similares a: {query}")
+        start_time = time.time()
+        
+        try:
+            #En el event loop solo se espera: el trabajo de CPU va al pool de hilos
+            sources, lexical_results = await self._run_in_executor(self._route_and_lexical, query, query_embedding)
+            if query_embedding is None:
+                fast_results = self._fast_path_results(lexical_results, n_results)
+                if fast_results is not None:
+                    self._log_results(fast_results, time.time() - start_time)
+                    return fast_results
+                from backend.embedding_coalescer import aget_query_embedding
+                query_embedding = await aget_query_embedding(query)
+                if self._routes_by_embedding():
+                    sources, lexical_results = await self._run_in_executor(
+                        self._route_and_lexical, query, query_embedding
+                    )
+            vector_results = (await self.asearch_by_embeddings(
+                [query_embedding],
+                n_results=self._vector_candidates(n_results),
+                sources=sources
+            ))[0]
+            processed_results = self._fuse_results(vector_results, lexical_results, n_results)
+            if sources and len(processed_results) < n_results:
+                print("Pocos resultados en las fuentes ruteadas, se busca en toda la coleccion")
+                vector_results = (await self.asearch_by_embeddings(
+                    [query_embedding],
+                    n_results=self._vector_candidates(n_results)
+                ))[0]
+                lexical_results = await self._run_in_executor(self._lexical_candidates, query)
+                processed_results = self._fuse_results(vector_results, lexical_results, n_results)
+            self._log_results(processed_results, time.time() - start_time)
+            return processed_results
+        except Exception as e:
+            print(f"Error en busqueda: {str(e)}")
+            return []
+    
     def get_collection_stats(self) -> Dict:
         try:
             count = self.collection.count()
             
+            alias = self._check_alias()
             stats = {
                 'collection_name': self.collection_name,
                 'total_documents': count,
-                'persist_directory': self.persist_directory
+                'persist_directory': self.persist_directory,
+                'active_version': alias['version'] if alias else None
             }
             
             return stats
@@ -142,10 +937,24 @@ class VectorStoreManager:
             print(f"Error al obtener estadisticas: {str(e)}")
             return {}
         
+    def _clear_checkpoint(self) -> None:
+        #Con la coleccion vacia, el checkpoint de una corrida anterior ya no es valido
+        checkpoint_path = BulkEmbeddingClient.checkpoint_path_for(self.collection_name)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        
     def delete_collection(self) -> bool:
         try:
-          self.client.delete_collection(name=self.collection_name)
+          alias = self.get_alias()
+          if alias and not alias.get('version'):
+              #Con un alias de perfil se vacia la copia publicada, que es la que sirve las consultas
+              self.client.delete_collection(name=alias['collection'])
+              self.client.create_collection(name=alias['collection'], metadata=profile_metadata(alias['index_profile']))
+          else:
+              self.client.delete_collection(name=self.collection_name)
           self.collection = self._get_or_create_collection()
+          self._numpy_index = None
+          self._clear_checkpoint()
           return True
         except Exception as e:
             return False    
@@ -153,7 +962,13 @@ class VectorStoreManager:
     def reset_database(self) -> bool:
         try:
             self.client.reset()
+            #reset borra todas las colecciones, tambien las del alias (versiones y copias de perfil)
+            if os.path.exists(self.alias_path):
+                os.remove(self.alias_path)
+            self._check_alias()
             self.collection = self._get_or_create_collection()
+            self._numpy_index = None
+            self._clear_checkpoint()
             return True
         except Exception as e:
             return False
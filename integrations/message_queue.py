@@ -0,0 +1,408 @@
+import os
+import time
+import socket
+import sqlite3
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+from backend.config import (
+    WHATSAPP_QUEUE_BACKEND,
+    WHATSAPP_QUEUE_PATH,
+    WHATSAPP_MAX_ATTEMPTS,
+    WHATSAPP_RETRY_DELAY_SECONDS,
+    WHATSAPP_VISIBILITY_TIMEOUT_SECONDS,
+    WHATSAPP_SESSION_AFFINITY_SECONDS,
+    WHATSAPP_DEDUPE_TTL_SECONDS
+)
+
+#pending -> processing -> done | (pending de nuevo para reintentar) | failed
+STATUSES = ("pending", "processing", "done", "failed")
+#Un proceso que no toma mensajes en este plazo se da por caido y pierde sus sesiones
+OWNER_TIMEOUT_SECONDS = 30
+
+
+class SQLiteMessageQueue:
+    """Cola persistente de mensajes entrantes con deduplicacion por MessageSid.
+
+    Twilio reintenta el webhook si no recibe respuesta a tiempo: el mismo MessageSid se
+    inserta una sola vez y los reintentos se descartan. Los mensajes terminados quedan
+    dedupe_ttl segundos para seguir reconociendo reintentos tardios. La respuesta generada
+    se guarda antes de enviarla, asi un fallo al enviar no repite la llamada al LLM.
+
+    Varios procesos (uvicorn --workers N) pueden compartir el archivo: un mensaje tomado
+    queda en processing con claimed_at y solo vuelve a la cola si pasa visibility_timeout
+    sin terminar. No se toma un mensaje mientras haya uno anterior del mismo usuario sin
+    terminar, asi las preguntas de cada numero se responden en orden. La memoria de
+    conversacion vive en cada proceso: un numero queda asignado al proceso que tomo su
+    ultimo mensaje durante session_affinity segundos (mientras ese proceso siga vivo).
+    """
+
+    def __init__(
+        self,
+        path: str = WHATSAPP_QUEUE_PATH,
+        max_attempts: int = WHATSAPP_MAX_ATTEMPTS,
+        retry_delay: float = WHATSAPP_RETRY_DELAY_SECONDS,
+        dedupe_ttl: float = WHATSAPP_DEDUPE_TTL_SECONDS,
+        visibility_timeout: float = WHATSAPP_VISIBILITY_TIMEOUT_SECONDS,
+        session_affinity: float = WHATSAPP_SESSION_AFFINITY_SECONDS,
+        owner: Optional[str] = None
+    ):
+        if max_attempts <= 0:
+            raise ValueError("max_attempts debe ser mayor a 0")
+        self.path = path
+        self.session_affinity = session_affinity
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.dedupe_ttl = dedupe_ttl
+        self.visibility_timeout = visibility_timeout
+        self.duplicates = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+        directory = os.path.dirname(path)
+        if directory and path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+
+        #isolation_level=None: las transacciones se abren a mano con BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS messages (
+                message_sid TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL,
+                answer TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                claimed_at REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        #Colas creadas antes de que existiera el lease
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(messages)")}
+        if 'claimed_at' not in columns:
+            self._conn.execute("ALTER TABLE messages ADD COLUMN claimed_at REAL")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_pending ON messages(status, available_at)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_user ON messages(user_id, status)"
+        )
+        #Proceso asignado a cada numero y ultima vez que cada proceso tomo mensajes
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (user_id TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS owners (owner TEXT PRIMARY KEY, seen_at REAL NOT NULL)"
+        )
+
+    def enqueue(self, message_sid: str, user_id: str, body: str) -> bool:
+        #False si el MessageSid ya estaba (reintento de Twilio)
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                """INSERT OR IGNORE INTO messages
+                   (message_sid, user_id, body, status, available_at, created_at, updated_at)
+                   VALUES (?, ?, ?, 'pending', ?, ?, ?)""",
+                (message_sid, user_id, body, now, now, now)
+            )
+            if cursor.rowcount == 0:
+                self.duplicates += 1
+                return False
+            self._available.notify()
+        return True
+
+    def claim(self, timeout: float = 1.0) -> Optional[Dict]:
+        #Toma el mensaje pendiente mas antiguo de un usuario libre; espera hasta timeout si no hay ninguno
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                message = self._claim_next()
+                remaining = deadline - time.monotonic()
+                if message is not None or remaining <= 0:
+                    return message
+                #Tambien se despierta periodicamente: otro proceso puede haber encolado o vencido un reintento
+                self._available.wait(min(remaining, 0.5))
+
+    def _claim_next(self) -> Optional[Dict]:
+        #Llamar con self._lock tomado; BEGIN IMMEDIATE evita que otro proceso tome el mismo mensaje
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._release_expired(now)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO owners (owner, seen_at) VALUES (?, ?)", (self.owner, now)
+            )
+            #Se salta al usuario con un mensaje en processing, uno anterior aun pendiente (esperando
+            #reintento) o asignado a otro proceso vivo
+            row = self._conn.execute(
+                """SELECT * FROM messages AS m
+                   WHERE m.status = 'pending' AND m.available_at <= ?
+                   AND NOT EXISTS (
+                       SELECT 1 FROM messages AS o
+                       WHERE o.user_id = m.user_id
+                       AND (o.status = 'processing' OR (o.status = 'pending' AND o.rowid < m.rowid))
+                   )
+                   AND NOT EXISTS (
+                       SELECT 1 FROM sessions AS s JOIN owners AS w ON w.owner = s.owner
+                       WHERE s.user_id = m.user_id AND s.owner != ? AND s.expires_at > ? AND w.seen_at > ?
+                   )
+                   ORDER BY m.rowid LIMIT 1""",
+                (now, self.owner, now, now - OWNER_TIMEOUT_SECONDS)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    """UPDATE messages SET status = 'processing', attempts = attempts + 1,
+                       claimed_at = ?, updated_at = ? WHERE message_sid = ?""",
+                    (now, now, row['message_sid'])
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sessions (user_id, owner, expires_at) VALUES (?, ?, ?)",
+                    (row['user_id'], self.owner, now + self.session_affinity)
+                )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        message = dict(row)
+        message['attempts'] += 1
+        message['claimed_at'] = now
+        return message
+
+    def _release_expired(self, now: float) -> int:
+        #Leases vencidos: el worker que los tomo murio o se colgo
+        cursor = self._conn.execute(
+            "UPDATE messages SET status = 'pending', updated_at = ? WHERE status = 'processing' AND COALESCE(claimed_at, updated_at) < ?",
+            (now, now - self.visibility_timeout)
+        )
+        return cursor.rowcount
+
+    def save_answer(self, message_sid: str, answer: str) -> None:
+        self._update(message_sid, answer=answer)
+
+    def complete(self, message_sid: str) -> None:
+        self._update(message_sid, status="done", error=None)
+
+    def fail(self, message_sid: str, error: str) -> bool:
+        #Vuelve a pending con espera exponencial; True si se reintentara
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts FROM messages WHERE message_sid = ?", (message_sid,)
+            ).fetchone()
+        if row is None:
+            return False
+        attempts = row['attempts']
+        if attempts >= self.max_attempts:
+            self._update(message_sid, status="failed", error=error)
+            return False
+        delay = self.retry_delay * (2 ** (attempts - 1))
+        self._update(message_sid, status="pending", error=error, available_at=time.time() + delay)
+        return True
+
+    def _update(self, message_sid: str, **fields) -> None:
+        fields['updated_at'] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE messages SET {assignments} WHERE message_sid = ?",
+                (*fields.values(), message_sid)
+            )
+            #Un mensaje que vuelve a la cola o que termina (libera al usuario) puede despertar a un worker
+            if 'status' in fields:
+                self._available.notify()
+
+    def recover(self) -> int:
+        #Mensajes que quedaron en processing porque un proceso murio; los de workers vivos no se tocan
+        with self._lock:
+            recovered = self._release_expired(time.time())
+            if recovered:
+                self._available.notify_all()
+            return recovered
+
+    def prune(self) -> int:
+        #Borra los terminados que ya no pueden recibir reintentos del webhook
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM messages WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (now - self.dedupe_ttl,)
+            )
+            self._conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+            self._conn.execute("DELETE FROM owners WHERE seen_at < ?", (now - OWNER_TIMEOUT_SECONDS,))
+            return cursor.rowcount
+
+    def get(self, message_sid: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM messages WHERE message_sid = ?", (message_sid,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS total FROM messages GROUP BY status"
+            ).fetchall()
+        stats = {status: 0 for status in STATUSES}
+        stats.update({row['status']: row['total'] for row in rows})
+        stats['duplicates'] = self.duplicates
+        return stats
+
+    def close(self) -> None:
+        #Los numeros de este proceso pasan enseguida a otro, sin esperar OWNER_TIMEOUT_SECONDS
+        with self._lock:
+            self._conn.execute("DELETE FROM owners WHERE owner = ?", (self.owner,))
+            self._conn.close()
+
+
+class InMemoryMessageQueue:
+    """Misma interfaz que SQLiteMessageQueue sin disco (pruebas y desarrollo local).
+
+    Los mensajes se pierden al reiniciar el proceso.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = WHATSAPP_MAX_ATTEMPTS,
+        retry_delay: float = WHATSAPP_RETRY_DELAY_SECONDS,
+        dedupe_ttl: float = WHATSAPP_DEDUPE_TTL_SECONDS,
+        visibility_timeout: float = WHATSAPP_VISIBILITY_TIMEOUT_SECONDS
+    ):
+        if max_attempts <= 0:
+            raise ValueError("max_attempts debe ser mayor a 0")
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.dedupe_ttl = dedupe_ttl
+        self.visibility_timeout = visibility_timeout
+        self.duplicates = 0
+        self._messages: Dict[str, Dict] = {}
+        self._pending: deque = deque()
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+    def enqueue(self, message_sid: str, user_id: str, body: str) -> bool:
+        now = time.time()
+        with self._lock:
+            if message_sid in self._messages:
+                self.duplicates += 1
+                return False
+            self._messages[message_sid] = {
+                'message_sid': message_sid, 'user_id': user_id, 'body': body, 'status': "pending",
+                'answer': None, 'error': None, 'attempts': 0, 'available_at': now,
+                'claimed_at': None, 'created_at': now, 'updated_at': now
+            }
+            self._pending.append(message_sid)
+            self._available.notify()
+        return True
+
+    def claim(self, timeout: float = 1.0) -> Optional[Dict]:
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                now = time.time()
+                self._release_expired(now)
+                #Mismo orden que SQLite: por llegada y sin adelantar a un mensaje anterior del mismo usuario
+                busy = {m['user_id'] for m in self._messages.values() if m['status'] == "processing"}
+                for message_sid in sorted(self._pending, key=lambda sid: self._messages[sid]['created_at']):
+                    message = self._messages[message_sid]
+                    if message['user_id'] in busy:
+                        continue
+                    if message['available_at'] > now:
+                        busy.add(message['user_id'])
+                        continue
+                    self._pending.remove(message_sid)
+                    message.update(status="processing", claimed_at=now, updated_at=now)
+                    message['attempts'] += 1
+                    return dict(message)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                #Los reintentos con espera no notifican al vencer: se revisa periodicamente
+                self._available.wait(min(remaining, 0.5))
+
+    def save_answer(self, message_sid: str, answer: str) -> None:
+        with self._lock:
+            self._messages[message_sid].update(answer=answer, updated_at=time.time())
+
+    def complete(self, message_sid: str) -> None:
+        with self._lock:
+            self._messages[message_sid].update(status="done", error=None, updated_at=time.time())
+            self._available.notify()
+
+    def fail(self, message_sid: str, error: str) -> bool:
+        with self._lock:
+            message = self._messages.get(message_sid)
+            if message is None:
+                return False
+            now = time.time()
+            if message['attempts'] >= self.max_attempts:
+                message.update(status="failed", error=error, updated_at=now)
+                self._available.notify()
+                return False
+            delay = self.retry_delay * (2 ** (message['attempts'] - 1))
+            message.update(status="pending", error=error, available_at=now + delay, updated_at=now)
+            self._pending.append(message_sid)
+            self._available.notify()
+            return True
+
+    def _release_expired(self, now: float) -> int:
+        #Llamar con self._lock tomado
+        expired = [
+            message_sid for message_sid, message in self._messages.items()
+            if message['status'] == "processing" and message['claimed_at'] < now - self.visibility_timeout
+        ]
+        for message_sid in expired:
+            self._messages[message_sid].update(status="pending", updated_at=now)
+            self._pending.append(message_sid)
+        return len(expired)
+
+    def recover(self) -> int:
+        with self._lock:
+            recovered = self._release_expired(time.time())
+            if recovered:
+                self._available.notify_all()
+            return recovered
+
+    def prune(self) -> int:
+        cutoff = time.time() - self.dedupe_ttl
+        with self._lock:
+            expired = [
+                message_sid for message_sid, message in self._messages.items()
+                if message['status'] in ("done", "failed") and message['updated_at'] < cutoff
+            ]
+            for message_sid in expired:
+                del self._messages[message_sid]
+        return len(expired)
+
+    def get(self, message_sid: str) -> Optional[Dict]:
+        with self._lock:
+            message = self._messages.get(message_sid)
+            return dict(message) if message is not None else None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = {status: 0 for status in STATUSES}
+            for message in self._messages.values():
+                stats[message['status']] += 1
+            stats['duplicates'] = self.duplicates
+            return stats
+
+    def close(self) -> None:
+        pass
+
+
+def create_message_queue(backend: str = WHATSAPP_QUEUE_BACKEND, **options):
+    if backend == "sqlite":
+        return SQLiteMessageQueue(**options)
+    if backend == "memory":
+        return InMemoryMessageQueue(**options)
+    raise ValueError(f"Backend de cola no soportado: {backend}")
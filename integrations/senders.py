@@ -0,0 +1,72 @@
+import threading
+from typing import List, Dict, Optional
+
+import requests
+
+from backend.config import (
+    WHATSAPP_SENDER,
+    TWILIO_ACCOUNT_SID,
+    TWILIO_AUTH_TOKEN,
+    TWILIO_WHATSAPP_NUMBER
+)
+
+#Twilio corta los mensajes de WhatsApp mas largos que esto
+MAX_MESSAGE_CHARS = 1600
+
+
+class TwilioSender:
+    """Envia la respuesta por la API REST de Twilio (WhatsApp)."""
+
+    API_URL = "https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json"
+
+    def __init__(
+        self,
+        account_sid: Optional[str] = TWILIO_ACCOUNT_SID,
+        auth_token: Optional[str] = TWILIO_AUTH_TOKEN,
+        from_number: Optional[str] = TWILIO_WHATSAPP_NUMBER,
+        timeout: float = 10.0
+    ):
+        if not account_sid or not auth_token or not from_number:
+            raise ValueError("TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN y TWILIO_WHATSAPP_NUMBER son requeridos")
+        self.url = self.API_URL.format(account_sid=account_sid)
+        self.from_number = from_number if from_number.startswith("whatsapp:") else f"whatsapp:{from_number}"
+        self.timeout = timeout
+        #Una sesion reutiliza la conexion TLS entre envios
+        self._session = requests.Session()
+        self._session.auth = (account_sid, auth_token)
+
+    def send(self, to: str, body: str) -> str:
+        #Retorna el sid del mensaje enviado; un error HTTP se propaga para reintentar
+        response = self._session.post(
+            self.url,
+            data={'From': self.from_number, 'To': to, 'Body': body[:MAX_MESSAGE_CHARS]},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json().get('sid', "")
+
+
+class FakeSender:
+    """Guarda los mensajes en memoria en lugar de enviarlos (pruebas y desarrollo sin Twilio)."""
+
+    def __init__(self, fail_times: int = 0):
+        #fail_times: cuantos envios fallan antes de empezar a funcionar (para probar reintentos)
+        self.fail_times = fail_times
+        self.sent: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def send(self, to: str, body: str) -> str:
+        with self._lock:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                raise ConnectionError("Fallo simulado al enviar")
+            self.sent.append({'to': to, 'body': body[:MAX_MESSAGE_CHARS]})
+            return f"FAKE{len(self.sent)}"
+
+
+def create_sender(kind: str = WHATSAPP_SENDER):
+    if kind == "twilio":
+        return TwilioSender()
+    if kind == "fake":
+        return FakeSender()
+    raise ValueError(f"Sender no soportado: {kind}")
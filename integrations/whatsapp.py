@@ -0,0 +1,142 @@
+import time
+import threading
+from typing import List, Dict, Optional, Callable
+
+from backend.rag_engine import RAGEngine
+from integrations.message_queue import create_message_queue
+from integrations.senders import create_sender
+from backend.config import WHATSAPP_WORKERS, WHATSAPP_VALIDATE_SIGNATURE, TWILIO_AUTH_TOKEN
+
+
+class WhatsAppPipeline:
+    """Procesa los mensajes de WhatsApp fuera del request del webhook.
+
+    handle_webhook() solo encola (deduplicando por MessageSid) y retorna; un pool de
+    workers toma los mensajes, llama a RAGEngine.query con el numero como user_id y envia
+    la respuesta con el sender. La cola no entrega un mensaje mientras otro del mismo numero
+    siga sin terminar (tambien entre procesos), asi la memoria de conversacion ve las
+    preguntas en orden. Con validate_signature solo se encolan requests firmados por
+    Twilio: sin firma cualquiera podria gastar LLM y enviar mensajes a cualquier numero.
+    """
+
+    def __init__(
+        self,
+        queue=None,
+        sender=None,
+        engine_factory: Callable[[], RAGEngine] = RAGEngine,
+        workers: int = WHATSAPP_WORKERS,
+        validate_signature: bool = WHATSAPP_VALIDATE_SIGNATURE,
+        auth_token: Optional[str] = TWILIO_AUTH_TOKEN
+    ):
+        if workers <= 0:
+            raise ValueError("workers debe ser mayor a 0")
+        self.validator = None
+        if validate_signature:
+            if not auth_token:
+                raise ValueError("TWILIO_AUTH_TOKEN es requerido para validar el webhook (o WHATSAPP_VALIDATE_SIGNATURE=false)")
+            from twilio.request_validator import RequestValidator
+            self.validator = RequestValidator(auth_token)
+        self.queue = queue if queue is not None else create_message_queue()
+        self.sender = sender if sender is not None else create_sender()
+        self.engine_factory = engine_factory
+        self.workers = workers
+        self._engine: Optional[RAGEngine] = None
+        self._engine_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.processed = 0
+        self.failed = 0
+        self.send_errors = 0
+        self.rejected = 0
+
+    def handle_webhook(self, form: Dict, url: Optional[str] = None, signature: Optional[str] = None) -> bool:
+        #Campos del webhook de Twilio; True si el mensaje es nuevo, False si es un reintento.
+        #url es la URL publica del webhook (la que firma Twilio); PermissionError si la firma no coincide
+        if self.validator is not None:
+            if not url or not signature or not self.validator.validate(url, form, signature):
+                self.rejected += 1
+                raise PermissionError("Firma de Twilio invalida")
+        message_sid = form.get('MessageSid') or form.get('SmsMessageSid')
+        user_id = form.get('From')
+        body = (form.get('Body') or "").strip()
+        if not message_sid or not user_id:
+            raise ValueError("El webhook no trae MessageSid o From")
+        if not body:
+            #Audios, imagenes o ubicaciones sin texto: no hay pregunta que responder
+            return False
+        return self.queue.enqueue(message_sid, user_id, body)
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        #Solo vuelven a la cola los mensajes con el lease vencido, no los de otro worker vivo
+        recovered = self.queue.recover()
+        if recovered:
+            print(f"Mensajes recuperados de una ejecucion anterior: {recovered}")
+        self.queue.prune()
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"whatsapp-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        #Los workers terminan el mensaje en curso; lo que quede pendiente sigue en la cola
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def _get_engine(self) -> RAGEngine:
+        with self._engine_lock:
+            if self._engine is None:
+                self._engine = self.engine_factory()
+            return self._engine
+
+    def _run(self) -> None:
+        last_prune = time.monotonic()
+        while not self._stop.is_set():
+            message = self.queue.claim(timeout=0.5)
+            if message is not None:
+                self.process(message)
+            if time.monotonic() - last_prune > 3600:
+                self.queue.prune()
+                last_prune = time.monotonic()
+
+    def process(self, message: Dict) -> None:
+        message_sid = message['message_sid']
+        answer = message.get('answer')
+        #Si ya se genero en un intento anterior (fallo el envio) no se vuelve a llamar al LLM
+        if answer is None:
+            try:
+                result = self._get_engine().query(message['body'], verbose=False, user_id=message['user_id'])
+            except Exception as e:
+                result = {'error': str(e)}
+            if 'error' in result and message['attempts'] < self.queue.max_attempts:
+                print(f"Error al generar respuesta para {message_sid}: {result['error']}")
+                self.queue.fail(message_sid, result['error'])
+                return
+            #En el ultimo intento se envia la disculpa que arma RAGEngine en lugar de no responder
+            answer = result.get('answer') or 'Lo siento, hubo un error al procesar tu pregunta. Por favor intenta de nuevo'
+            self.queue.save_answer(message_sid, answer)
+        try:
+            self.sender.send(message['user_id'], answer)
+        except Exception as e:
+            self.send_errors += 1
+            print(f"Error al enviar respuesta para {message_sid}: {str(e)}")
+            if not self.queue.fail(message_sid, str(e)):
+                self.failed += 1
+            return
+        self.queue.complete(message_sid)
+        self.processed += 1
+
+    def get_stats(self) -> Dict:
+        return {
+            'workers': len(self._threads),
+            'processed': self.processed,
+            'failed': self.failed,
+            'send_errors': self.send_errors,
+            'rejected': self.rejected,
+            'queue': self.queue.get_stats()
+        }
@@ -0,0 +1,196 @@
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+import argparse
+import shutil
+import tempfile
+import time
+import numpy as np
+import chromadb
+from chromadb.config import Settings
+
+from backend.numpy_vector_index import NumpyVectorIndex
+from backend.vector_store_manager import profile_metadata
+from backend.config import INDEX_PROFILES
+
+#Compara la busqueda en Chroma (SQLite + HNSW) contra el indice numpy en memoria
+#usando vectores aleatorios, sin llamar a la API de OpenAI
+
+def random_embeddings(n: int, dim: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    matrix = rng.standard_normal((n, dim)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+def percentile_ms(times, p):
+    return float(np.percentile(np.asarray(times) * 1000, p))
+
+def benchmark_size(n_docs: int, dim: int, n_queries: int, n_results: int, batch_size: int):
+    embeddings = random_embeddings(n_docs, dim, seed=n_docs)
+    queries = random_embeddings(n_queries, dim, seed=n_docs + 1)
+    ids = [f"doc_{i}" for i in range(n_docs)]
+    documents = [f"Documento sintetico {i}" for i in range(n_docs)]
+    metadatas = [{'source': f"fuente_{i % 4}.txt", 'chunk_index': i} for i in range(n_docs)]
+
+    result = {'n_docs': n_docs, 'dim': dim}
+
+    #Chroma
+    temp_dir = tempfile.mkdtemp(prefix="bench_chroma_")
+    try:
+        client = chromadb.PersistentClient(
+            path=temp_dir,
+            settings=Settings(anonymized_telemetry=False)
+        )
+        collection = client.create_collection(
+            name="benchmark_search",
+            metadata={'hnsw:space': 'cosine'}
+        )
+        max_batch = min(batch_size, client.get_max_batch_size())
+        start = time.perf_counter()
+        for i in range(0, n_docs, max_batch):
+            collection.add(
+                ids=ids[i:i + max_batch],
+                embeddings=embeddings[i:i + max_batch],
+                documents=documents[i:i + max_batch],
+                metadatas=metadatas[i:i + max_batch]
+            )
+        result['chroma_build_s'] = time.perf_counter() - start
+
+        times = []
+        for query in queries:
+            start = time.perf_counter()
+            collection.query(
+                query_embeddings=[query],
+                n_results=n_results,
+                include=['documents', 'metadatas', 'distances']
+            )
+            times.append(time.perf_counter() - start)
+        result['chroma_p50_ms'] = percentile_ms(times, 50)
+        result['chroma_p95_ms'] = percentile_ms(times, 95)
+
+        #Construccion del indice numpy desde la misma coleccion
+        start = time.perf_counter()
+        NumpyVectorIndex.from_collection(collection, space='cosine')
+        result['numpy_load_from_chroma_s'] = time.perf_counter() - start
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    #Numpy
+    start = time.perf_counter()
+    index = NumpyVectorIndex(space='cosine').build(ids, embeddings, documents, metadatas)
+    result['numpy_build_s'] = time.perf_counter() - start
+
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, n_results=n_results)
+        times.append(time.perf_counter() - start)
+    result['numpy_p50_ms'] = percentile_ms(times, 50)
+    result['numpy_p95_ms'] = percentile_ms(times, 95)
+
+    start = time.perf_counter()
+    index.search(queries, n_results=n_results)
+    result['numpy_batch_per_query_ms'] = (time.perf_counter() - start) * 1000 / n_queries
+
+    return result
+
+def benchmark_profiles(n_docs: int, dim: int, n_queries: int, n_results: int, batch_size: int, profiles):
+    #Latencia y recall@k de cada perfil HNSW frente a la busqueda exacta (numpy)
+    embeddings = random_embeddings(n_docs, dim, seed=n_docs)
+    #Preguntas cercanas a documentos reales, como pasa con preguntas de clientes
+    rng = np.random.default_rng(n_docs + 2)
+    queries = embeddings[rng.choice(n_docs, n_queries)] + 0.5 * random_embeddings(n_queries, dim, seed=n_docs + 3)
+    ids = [f"doc_{i}" for i in range(n_docs)]
+    documents = [f"Documento sintetico {i}" for i in range(n_docs)]
+    metadatas = [{'source': f"fuente_{i % 4}.txt", 'chunk_index': i} for i in range(n_docs)]
+    exact_index = NumpyVectorIndex(space='cosine').build(ids, embeddings, documents, metadatas)
+    expected = [{doc['id'] for doc in row} for row in exact_index.search(queries, n_results=n_results)]
+
+    rows = []
+    temp_dir = tempfile.mkdtemp(prefix="bench_profiles_")
+    try:
+        client = chromadb.PersistentClient(path=temp_dir, settings=Settings(anonymized_telemetry=False))
+        max_batch = min(batch_size, client.get_max_batch_size())
+        for profile in profiles:
+            collection = client.create_collection(name=f"bench_{profile}", metadata=profile_metadata(profile))
+            start = time.perf_counter()
+            for i in range(0, n_docs, max_batch):
+                collection.add(
+                    ids=ids[i:i + max_batch],
+                    embeddings=embeddings[i:i + max_batch],
+                    documents=documents[i:i + max_batch],
+                    metadatas=metadatas[i:i + max_batch]
+                )
+            build_s = time.perf_counter() - start
+
+            times = []
+            hits = 0
+            for query, relevant in zip(queries, expected):
+                start = time.perf_counter()
+                results = collection.query(query_embeddings=[query], n_results=n_results, include=['distances'])
+                times.append(time.perf_counter() - start)
+                hits += len(relevant & set(results['ids'][0]))
+            rows.append({
+                'profile': profile,
+                'n_docs': n_docs,
+                'build_s': build_s,
+                'p50_ms': percentile_ms(times, 50),
+                'p95_ms': percentile_ms(times, 95),
+                'recall': hits / (n_queries * n_results)
+            })
+            client.delete_collection(name=f"bench_{profile}")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Chroma vs indice numpy")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--profiles", nargs="*", choices=sorted(INDEX_PROFILES),
+                        help="Comparar perfiles HNSW (latencia y recall@k); sin valores usa todos")
+    args = parser.parse_args()
+
+    if args.profiles is not None:
+        profiles = args.profiles or list(INDEX_PROFILES)
+        print(f"BENCHMARK DE PERFILES HNSW (dim={args.dim}, consultas={args.queries}, k={args.top_k})")
+        rows = []
+        for size in args.sizes:
+            print(f"\nEvaluando {size:,} chunks...")
+            rows.extend(benchmark_profiles(size, args.dim, args.queries, args.top_k, args.batch_size, profiles))
+        print("\n" + "=" * 70)
+        print(f"{'chunks':>8} | {'perfil':<12} | {'build':>8} | {'p50':>9} | {'p95':>9} | {'recall@k':>8}")
+        print("-" * 70)
+        for row in rows:
+            print(
+                f"{row['n_docs']:>8,} | {row['profile']:<12} | {row['build_s']:>7.2f}s | "
+                f"{row['p50_ms']:>7.3f}ms | {row['p95_ms']:>7.3f}ms | {row['recall']:>8.3f}"
+            )
+        print("=" * 70)
+        return rows
+
+    print("=" * 70)
+    print(f"BENCHMARK DE BUSQUEDA (dim={args.dim}, consultas={args.queries}, k={args.top_k})")
+    print("=" * 70)
+    rows = []
+    for size in args.sizes:
+        print(f"\nEvaluando {size:,} chunks...")
+        rows.append(benchmark_size(size, args.dim, args.queries, args.top_k, args.batch_size))
+
+    print("\n" + "=" * 70)
+    print(f"{'chunks':>8} | {'chroma p50':>11} | {'chroma p95':>11} | {'numpy p50':>10} | {'numpy p95':>10} | {'numpy lote':>10}")
+    print("-" * 70)
+    for row in rows:
+        print(
+            f"{row['n_docs']:>8,} | {row['chroma_p50_ms']:>9.3f}ms | {row['chroma_p95_ms']:>9.3f}ms | "
+            f"{row['numpy_p50_ms']:>8.3f}ms | {row['numpy_p95_ms']:>8.3f}ms | {row['numpy_batch_per_query_ms']:>8.3f}ms"
+        )
+    print("=" * 70)
+    return rows
+
+if __name__ == "__main__":
+    main()
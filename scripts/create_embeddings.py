@@ -3,17 +3,38 @@ import os
 project_root = os.path.dirname(os.path.dirname(__file__))
 sys.path.insert(0, project_root)
 
-from backend.document_loader import load_and_split_documents
+from backend.config import print_config
+from backend.document_loader import load_all_documents, load_and_split_documents
 from backend.vector_store_manager import VectorStoreManager
+from backend.incremental_indexer import incremental_index, build_manifest, save_manifest
+from backend.tenant_manager import TenantManager
 
 def index_documents(
     knowlodge_base_path : str = "./knowledge_base",
     chunk_size: int = 500,
     chunk_overlap: int = 50,
-    reset_db: bool = False
+    reset_db: bool = False,
+    incremental: bool = False,
+    vector_store: VectorStoreManager = None
 ):
+    #Modo incremental: solo re-embebe lo que cambio y la coleccion sigue disponible
+    if incremental and not reset_db:
+        try:
+            documents = load_all_documents(knowlodge_base_path)
+            vector_store = vector_store or VectorStoreManager()
+            return incremental_index(
+                documents,
+                vector_store,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                manifest_path=vector_store.manifest_path
+            )
+        except Exception as e:
+            print(f"Error en indexado incremental: {str(e)}")
+            return None
     #Leer todos los .txt, dividirlos en chunks y retornarlos con metada
     try:
+        documents = load_all_documents(knowlodge_base_path)
         chunks = load_and_split_documents(
             directory_path=knowlodge_base_path,
             chunk_size=chunk_size,
@@ -23,9 +44,13 @@ def index_documents(
         return None
     #Inicializar el VectorStorageManager
     try:
-        vector_store = VectorStoreManager()
+        shared_database = vector_store is not None
+        vector_store = vector_store or VectorStoreManager()
         #Necesario cuando se modificaron archivos o se agregan nuevos archivos, mas no cuando se crea la BD desde 0
-        if reset_db:
+        if reset_db and shared_database:
+            #La base la comparten otros tenants: solo se borra la coleccion propia
+            vector_store.delete_collection()
+        elif reset_db:
             vector_store.reset_database()
     except Exception as e:
         return None
@@ -40,20 +65,54 @@ def index_documents(
             return None
     except Exception as e:
         return None
+    vector_store.rebuild_lexical_index(chunks)
+    #Registrar el estado indexado para que los siguientes indexados sean incrementales
+    manifest = build_manifest(documents, chunks, vector_store, chunk_size, chunk_overlap)
+    save_manifest(manifest, vector_store.manifest_path)
+    return {
+        'chunks_added': docs_added,
+        'version': manifest['version']
+    }
     
-def verify_indexation():
-    vector_storage = VectorStoreManager()
+def verify_indexation(vector_storage: VectorStoreManager = None):
+    vector_storage = vector_storage or VectorStoreManager()
     stats = vector_storage.get_collection_stats()
     total_docs = stats.get('total_documents', 0)
     print(f'Documentos totales en chroma: {total_docs}')
 
 if __name__ == "__main__":
+    #Por defecto se indexa de forma incremental; --reset reconstruye la base desde cero
+    full_rebuild = '--reset' in sys.argv
+    print_config()
+    #--tenant <id> indexa la base de una PYME registrada en tenants.json en su propia coleccion
+    knowledge_base_path = "./knowledge_base"
+    store = None
+    if '--tenant' in sys.argv:
+        tenant_id = sys.argv[sys.argv.index('--tenant') + 1]
+        tenants = TenantManager()
+        knowledge_base_path = tenants.tenant_settings(tenant_id)['knowledge_base_path']
+        store = tenants.create_store(tenant_id)
+    #Indexar desde knowledge_base/ vuelve a publicar la coleccion base en lugar de la version activa
+    alias_store = store or VectorStoreManager()
+    alias = alias_store.get_alias()
+    if alias and alias.get('version'):
+        print(f"Se desactiva la version {alias['version']} (scripts/kb_versions.py activate para volver a ella)")
+        alias_store.clear_alias()
+    elif alias:
+        #Alias de rebuild_index.py: se indexa en la copia publicada para conservar su perfil HNSW
+        print(f"Se indexa en {alias['collection']} (perfil {alias.get('index_profile')})")
     result = index_documents(
-        knowlodge_base_path="./knowledge_base",
+        knowlodge_base_path=knowledge_base_path,
         chunk_size=500,
         chunk_overlap=50,
-        reset_db=True
+        reset_db=full_rebuild,
+        incremental=not full_rebuild,
+        vector_store=store
     )
     
     if result:
-        verify_indexation()
\ No newline at end of file
+        verify_indexation(store)
+        #Con el backend snapshot los workers leen la matriz exportada: se regenera despues de indexar
+        snapshot_store = store or VectorStoreManager()
+        if snapshot_store.search_backend == "snapshot":
+            snapshot_store.export_snapshot()
@@ -0,0 +1,90 @@
+import sys
+import os
+import json
+import argparse
+import subprocess
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.vector_store_manager import VectorStoreManager
+from backend.embedding_snapshot import SNAPSHOT_DTYPES
+from backend.config import EMBEDDING_SNAPSHOT_DTYPE, EMBEDDING_SNAPSHOT_PATH
+
+#Cada backend se mide en un proceso nuevo, como lo veria un worker de uvicorn al arrancar
+CHILD_CODE = r'''
+import json, sys, time, os
+sys.path.insert(0, {root!r})
+
+def rss():
+    #RssAnon es memoria privada del proceso; RssFile son paginas de archivos (compartibles)
+    values = {{}}
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith(("RssAnon:", "RssFile:")):
+                    name, value = line.split(":")
+                    values[name] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    return values
+
+from backend.vector_store_manager import VectorStoreManager
+store = VectorStoreManager(search_backend={backend!r}, snapshot_path={snapshot!r}, retrieval_mode="vector")
+store.collection.count()
+before = rss()
+start = time.perf_counter()
+store.warmup()
+dim = {dim}
+probe = [[1.0 / dim ** 0.5] * dim]
+store.search_by_embeddings(probe, n_results=3)
+load_time = time.perf_counter() - start
+latencies = []
+for _ in range(20):
+    step = time.perf_counter()
+    store.search_by_embeddings(probe, n_results=3)
+    latencies.append(time.perf_counter() - step)
+after = rss()
+print("__SNAPSHOT__" + json.dumps({{
+    'load_seconds': load_time,
+    'search_ms': sorted(latencies)[len(latencies) // 2] * 1000,
+    'private_bytes': after.get('RssAnon', 0) - before.get('RssAnon', 0),
+    'shared_bytes': after.get('RssFile', 0) - before.get('RssFile', 0)
+}}))
+'''
+
+def measure_backend(backend: str, snapshot_path: str, dim: int) -> dict:
+    code = CHILD_CODE.format(root=project_root, backend=backend, snapshot=snapshot_path, dim=dim)
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=project_root)
+    for line in completed.stdout.splitlines():
+        if line.startswith("__SNAPSHOT__"):
+            return json.loads(line[len("__SNAPSHOT__"):])
+    raise RuntimeError(f"La medicion de {backend} fallo:\n{completed.stderr[-2000:]}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta los embeddings de Chroma a un snapshot cuantizado")
+    parser.add_argument("--dtype", choices=SNAPSHOT_DTYPES, default=EMBEDDING_SNAPSHOT_DTYPE)
+    parser.add_argument("--output", default=EMBEDDING_SNAPSHOT_PATH, help="Directorio del snapshot")
+    parser.add_argument("--measure", action="store_true",
+                        help="Comparar tiempo de carga y memoria contra Chroma y numpy")
+    args = parser.parse_args()
+
+    store = VectorStoreManager(snapshot_path=args.output)
+    summary = store.export_snapshot(dtype=args.dtype)
+    if summary['count'] == 0:
+        print("La coleccion esta vacia: indexa primero con scripts/create_embeddings.py")
+        sys.exit(1)
+    print(f"   Matriz: {summary['matrix_bytes'] / 1e6:.1f} MB (float32: {summary['float32_bytes'] / 1e6:.1f} MB)")
+
+    if args.measure:
+        dim = summary['float32_bytes'] // (summary['count'] * 4)
+        print(f"\n{'backend':<10}{'carga s':>10}{'busqueda ms':>13}{'privada MB':>12}{'compartida MB':>15}")
+        for backend in ("chroma", "numpy", "snapshot"):
+            result = measure_backend(backend, args.output, dim)
+            print(
+                f"{backend:<10}{result['load_seconds']:>10.3f}{result['search_ms']:>13.2f}"
+                f"{result['private_bytes'] / 1e6:>12.1f}{result['shared_bytes'] / 1e6:>15.1f}"
+            )
+        print("\nLa memoria compartida del snapshot se paga una sola vez para todos los workers")
+
+if __name__ == "__main__":
+    main()
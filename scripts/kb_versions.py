@@ -0,0 +1,79 @@
+import sys
+import os
+import argparse
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.kb_versions import KnowledgeBaseVersionStore
+from backend.vector_store_manager import VectorStoreManager
+from backend.tenant_manager import TenantManager
+from backend.config import KB_VERSIONS_PATH, KNOWLEDGE_BASE_PATH
+
+def main():
+    parser = argparse.ArgumentParser(description="Versiones de la base de conocimiento: crear, activar y volver atras")
+    parser.add_argument("--tenant", help="Versiones de este tenant (tenants.json)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="Guardar knowledge_base/ como una version nueva")
+    create.add_argument("--label", help="Descripcion (ej. 'menu de diciembre')")
+    create.add_argument("--chunk-size", type=int, default=500)
+    create.add_argument("--chunk-overlap", type=int, default=50)
+    create.add_argument("--activate", action="store_true", help="Activar la version al terminar")
+    commands.add_parser("list", help="Listar las versiones guardadas")
+    activate = commands.add_parser("activate", help="Publicar una version (sin llamar a la API)")
+    activate.add_argument("version")
+    commands.add_parser("rollback", help="Volver a la version activa anterior")
+    commands.add_parser("deactivate", help="Volver a la coleccion que mantiene create_embeddings.py")
+    restore = commands.add_parser("restore", help="Reescribir los archivos de una version")
+    restore.add_argument("version")
+    restore.add_argument("--output", required=True, help="Directorio destino")
+    args = parser.parse_args()
+
+    knowledge_base_path = KNOWLEDGE_BASE_PATH
+    root = KB_VERSIONS_PATH
+    if args.tenant:
+        tenants = TenantManager()
+        knowledge_base_path = tenants.tenant_settings(args.tenant)['knowledge_base_path']
+        root = os.path.join(KB_VERSIONS_PATH, "tenants", args.tenant)
+        store = tenants.create_store(args.tenant)
+    else:
+        store = VectorStoreManager()
+    versions = KnowledgeBaseVersionStore(root)
+
+    try:
+        if args.command == "create":
+            version = versions.create_version(
+                knowledge_base_path,
+                chunk_size=args.chunk_size,
+                chunk_overlap=args.chunk_overlap,
+                label=args.label
+            )
+            if args.activate:
+                versions.activate(version['version'], store)
+        elif args.command == "list":
+            active = (store.get_alias() or {}).get('version')
+            for version in versions.list_versions():
+                marker = "*" if version['version'] == active else " "
+                print(
+                    f" {marker} {version['version']}  {version['created_at']}  "
+                    f"{len(version['files'])} archivos, {version['new_chunks']} chunks nuevos  {version['label'] or ''}"
+                )
+        elif args.command == "activate":
+            versions.activate(args.version, store)
+        elif args.command == "rollback":
+            versions.rollback(store)
+        elif args.command == "deactivate":
+            if store.clear_alias():
+                print(f"Se usa otra vez la coleccion {store.collection_name}")
+        elif args.command == "restore":
+            restored = versions.restore_documents(args.version, args.output)
+            print(f"{len(restored)} archivos escritos en {args.output}")
+    except (KeyError, ValueError, RuntimeError) as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+    #El snapshot se exporta de la coleccion activa
+    if args.command in ("activate", "rollback", "deactivate") or getattr(args, 'activate', False):
+        if store.search_backend == "snapshot":
+            store.export_snapshot()
+
+if __name__ == "__main__":
+    main()
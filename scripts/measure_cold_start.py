@@ -0,0 +1,91 @@
+import sys
+import os
+import json
+import argparse
+import statistics
+import subprocess
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+#Cada corrida es un proceso nuevo: asi se mide el arranque en frio real (imports incluidos)
+CHILD_CODE = r'''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+timings = {{}}
+import backend.config
+timings['import_config'] = time.perf_counter() - start
+step = time.perf_counter()
+from backend.rag_engine import RAGEngine
+timings['import_rag_engine'] = time.perf_counter() - step
+step = time.perf_counter()
+engine = RAGEngine()
+timings['rag_engine_init'] = time.perf_counter() - step
+timings['ready'] = time.perf_counter() - start
+if {warmup}:
+    step = time.perf_counter()
+    engine.warmup(prime_connections={prime})
+    timings['warmup'] = time.perf_counter() - step
+timings['total'] = time.perf_counter() - start
+loaded = [name for name in ('chromadb', 'openai', 'tiktoken') if name in sys.modules]
+print("__COLD_START__" + json.dumps({{'timings': timings, 'loaded': loaded}}))
+'''
+
+def run_once(warmup: bool, prime: bool) -> dict:
+    code = CHILD_CODE.format(root=project_root, warmup=warmup, prime=prime)
+    completed = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=project_root
+    )
+    for line in completed.stdout.splitlines():
+        if line.startswith("__COLD_START__"):
+            return json.loads(line[len("__COLD_START__"):])
+    raise RuntimeError(f"La corrida fallo:\n{completed.stderr[-2000:]}")
+
+def measure_cold_start(runs: int = 5, warmup: bool = False, prime: bool = False) -> dict:
+    samples = [run_once(warmup, prime) for _ in range(runs)]
+    stages = samples[0]['timings'].keys()
+    summary = {
+        stage: {
+            'median_ms': statistics.median(s['timings'][stage] for s in samples) * 1000,
+            'max_ms': max(s['timings'][stage] for s in samples) * 1000
+        }
+        for stage in stages
+    }
+    return {'runs': runs, 'stages': summary, 'loaded_before_warmup': samples[0]['loaded']}
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el arranque en frio del backend RAG")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=500.0,
+                        help="Presupuesto para importar y construir RAGEngine (mediana)")
+    parser.add_argument("--warmup", action="store_true", help="Incluir RAGEngine.warmup()")
+    parser.add_argument("--prime", action="store_true", help="En el warmup, abrir la conexion con OpenAI")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    args = parser.parse_args()
+
+    results = measure_cold_start(args.runs, args.warmup, args.prime)
+    print(f"\nArranque en frio ({args.runs} corridas)")
+    print("=" * 50)
+    for stage, values in results['stages'].items():
+        print(f"   {stage:<20} mediana {values['median_ms']:8.1f} ms   max {values['max_ms']:8.1f} ms")
+    #Sin warmup no se deberia haber importado nada pesado
+    if not args.warmup:
+        print(f"\n Modulos pesados cargados: {', '.join(results['loaded_before_warmup']) or 'ninguno'}")
+
+    ready_ms = results['stages']['ready']['median_ms']
+    results['budget_ms'] = args.budget_ms
+    results['within_budget'] = ready_ms <= args.budget_ms
+    print(f"\n Listo para recibir consultas: {ready_ms:.1f} ms (presupuesto {args.budget_ms:.0f} ms)")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    if not results['within_budget']:
+        print(" Presupuesto de arranque superado")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import sys
+import os
+import json
+import time
+import argparse
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.rag_engine import RAGEngine
+from backend.tenant_manager import get_tenant_manager
+from backend.config import BATCH_MAX_CONCURRENCY
+
+def read_questions(path: str):
+    #Cada linea es {"question": "...", ...} (los demas campos se copian a la salida) o un string JSON
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {'question': record}
+            if not record.get('question'):
+                raise ValueError(f"Linea {line_number} sin 'question'")
+            yield record
+
+def output_record(record: dict, result: dict) -> dict:
+    output = dict(record)
+    output.update({
+        'answer': result['answer'],
+        'sources': [
+            {'source': doc['source'], 'chunk_index': doc['chunk_index'], 'similarity': doc.get('similarity')}
+            for doc in result.get('sources', [])
+        ],
+        'cache_hit': result.get('cache_hit', False),
+        'tokens_used': result.get('tokens_used', 0),
+        'cost': result.get('cost', 0.0)
+    })
+    if 'error' in result:
+        output['error'] = result['error']
+    return output
+
+def main():
+    parser = argparse.ArgumentParser(description="Responder un archivo JSONL de preguntas con RAGEngine.query_batch")
+    parser.add_argument("--input", required=True, help="JSONL con una pregunta por linea")
+    parser.add_argument("--output", required=True, help="JSONL de salida, en el mismo orden que la entrada")
+    parser.add_argument("--tenant", help="Responder con la coleccion de este tenant (tenants.json)")
+    parser.add_argument("--n-results", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=BATCH_MAX_CONCURRENCY, help="Llamadas al LLM en paralelo")
+    parser.add_argument("--batch-size", type=int, default=500, help="Preguntas por lote (acota la memoria)")
+    args = parser.parse_args()
+
+    engine = get_tenant_manager().get_engine(args.tenant) if args.tenant else RAGEngine()
+    records = list(read_questions(args.input))
+    print(f"Preguntas: {len(records)}")
+    start_time = time.time()
+    totals = {'answers': 0, 'errors': 0, 'cache_hits': 0, 'tokens': 0, 'cost': 0.0}
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        for start in range(0, len(records), args.batch_size):
+            batch = records[start:start + args.batch_size]
+            results = engine.query_batch(
+                [record['question'] for record in batch],
+                n_results=args.n_results,
+                max_concurrency=args.concurrency
+            )
+            #Se escribe cada respuesta apenas esta lista (en orden): un corte deja el archivo util
+            for record, result in zip(batch, results):
+                f.write(json.dumps(output_record(record, result), ensure_ascii=False) + "\n")
+                f.flush()
+                totals['answers'] += 1
+                totals['errors'] += 'error' in result
+                totals['cache_hits'] += result.get('cache_hit', False)
+                totals['tokens'] += result.get('tokens_used', 0)
+                totals['cost'] += result.get('cost', 0.0)
+
+    elapsed = time.time() - start_time
+    print("\n" + "=" * 60)
+    print(f"Respuestas: {totals['answers']} en {elapsed:.1f}s ({totals['answers'] / max(elapsed, 1e-9):.1f}/s)")
+    print(f"Desde cache: {totals['cache_hits']}  Errores: {totals['errors']}")
+    print(f"Tokens: {totals['tokens']}  Costo: ${totals['cost']:.4f}")
+    print(f"Salida: {args.output}")
+    return 1 if totals['errors'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
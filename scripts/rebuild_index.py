@@ -0,0 +1,52 @@
+import sys
+import os
+import argparse
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.vector_store_manager import VectorStoreManager
+from backend.tenant_manager import TenantManager
+from backend.config import INDEX_PROFILES, INDEX_PROFILE
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra la coleccion de Chroma a otro perfil de indice HNSW")
+    parser.add_argument("--profile", choices=sorted(INDEX_PROFILES), default=INDEX_PROFILE)
+    parser.add_argument("--tenant", help="Migrar la coleccion de este tenant (tenants.json)")
+    parser.add_argument("--list", action="store_true", help="Mostrar los perfiles disponibles")
+    parser.add_argument("--grace-seconds", type=float, default=600,
+                        help="Antiguedad minima de una coleccion reemplazada antes de borrarla")
+    parser.add_argument("--drop-retired", action="store_true",
+                        help="Solo borrar las colecciones reemplazadas por migraciones anteriores")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, settings in INDEX_PROFILES.items():
+            print(f"   {name:<12} space={settings['space']} M={settings['M']} "
+                  f"construction_ef={settings['construction_ef']} search_ef={settings['search_ef']}")
+        return
+
+    store = TenantManager().create_store(args.tenant) if args.tenant else VectorStoreManager()
+    if args.drop_retired:
+        dropped = store.drop_retired_collections(args.grace_seconds)
+        print(f"Colecciones eliminadas: {len(dropped)}")
+        return
+    current = (store.collection.metadata or {}).get('index_profile')
+    if current == args.profile:
+        print(f"La coleccion ya usa el perfil {args.profile}")
+        return
+    try:
+        summary = store.rebuild_with_profile(args.profile, grace_seconds=args.grace_seconds)
+    except Exception as e:
+        print(f"Error al reconstruir el indice: {str(e)}")
+        sys.exit(1)
+    print(f"\n {summary['chunks']} chunks migrados a {args.profile} ({summary['space']}) en {summary['seconds']:.2f}s")
+    #El snapshot guarda el espacio de distancia: se regenera con la coleccion nueva
+    if store.search_backend == "snapshot":
+        store.export_snapshot()
+    if args.profile != INDEX_PROFILE:
+        print(f" Recuerda configurar INDEX_PROFILE={args.profile} para las colecciones nuevas")
+    #Publicada con el alias: los workers la abren en su siguiente consulta, sin reiniciar
+    print(f" Coleccion activa: {summary['collection']} (la anterior se borra en la proxima migracion o con --drop-retired)")
+
+if __name__ == "__main__":
+    main()
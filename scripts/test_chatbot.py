@@ -3,7 +3,9 @@ import os
 project_root = os.path.dirname(os.path.dirname(__file__))
 sys.path.insert(0, project_root)
 
+from backend.config import print_config, require_api_key
 from backend.rag_engine import RAGEngine
+from backend.tracing import metrics
 
 def show_banner():
     """Muestra el banner de bienvenida del chatbot."""
@@ -27,6 +29,9 @@ def show_banner():
     print("   'ayuda' - Ver esta ayuda")
     print("\n" + "=" * 70 + "\n")
     
+#La consola es un solo usuario: asi "¿y cuánto cuesta?" sigue a la pregunta anterior
+CHAT_USER_ID = "consola"
+
 def show_help():
     """Muestra la ayuda con comandos disponibles."""
     
@@ -39,6 +44,7 @@ def show_help():
     print("   salir - Terminar el programa")
     print("   stats - Ver estadísticas de uso (tokens, costo)")
     print("   ayuda - Mostrar esta ayuda")
+    print("   nueva - Olvidar la conversación (las preguntas de seguimiento usan el historial)")
     print("\n Ejemplos de preguntas:")
     print("   - ¿Cuánto cuesta el ajiaco?")
     print("   - ¿Cuál es el horario de atención?")
@@ -61,32 +67,67 @@ def show_stats(stats):
         print(f" Costo total: ${stats['total_cost']:.6f} USD")
         print(f" Costo promedio por consulta: ${stats['avg_cost']:.6f} USD")
     
+    latencies = metrics.get_summary()
+    if latencies:
+        print("\n Latencia por etapa (p50 / p95 / p99):")
+        for stage, summary in latencies.items():
+            print(f"   - {stage}: {summary['p50_ms']:.1f} / {summary['p95_ms']:.1f} / {summary['p99_ms']:.1f} ms ({summary['count']})")
+    
     print("\n" + "=" * 70 + "\n")
     
-def format_response(result, show_sources=True, show_stats_inline=True):
-    print("\n El Buen Sabor:")
-    print("-" * 70)
-    print(result['answer'])
-    print("-" * 70)
+def format_response(result, show_sources=True, show_stats_inline=True, print_answer=True):
+    if print_answer:
+        print("\n El Buen Sabor:")
+        print("-" * 70)
+        print(result['answer'])
+        print("-" * 70)
     
     if show_sources and result['sources']:
         print('\nFuentes consultadas: ')
         for i, source in enumerate(result['sources'], 1):
-            print(f"   {i}. {source['source']} (chunk {source['chunk_index']}) - similitud: {1 - source['distance']:.2%}")
+            if source['distance'] is not None:
+                #La similitud depende del espacio de la coleccion (coseno o l2), la calcula el vector store
+                similarity = source.get('similarity', 1 - source['distance'])
+                print(f"   {i}. {source['source']} (chunk {source['chunk_index']}) - similitud: {similarity:.2%}")
+            else:
+                #Resultado encontrado solo por coincidencia de palabras (BM25)
+                print(f"   {i}. {source['source']} (chunk {source['chunk_index']}) - coincidencia lexica")
             
     if show_stats_inline:
         print(f"\n📊 Tokens: {result['tokens_used']} | Costo: ${result['cost']:.6f} | Tiempo: {result['time_total']:.2f}s")
+        if result.get('time_to_first_token') is not None:
+            print(f"   Primer token: {result['time_to_first_token']:.2f}s")
+        if result.get('context_tokens') is not None:
+            print(f"   Contexto: {result['context_tokens']} tokens ({result['context_tokens_saved']} ahorrados)")
 
-def interactive_chat():
+def stream_response(engine, user_input):
+    #Imprime la respuesta a medida que llega y retorna el evento final
+    print("\n El Buen Sabor:")
+    print("-" * 70)
+    result = None
+    for event in engine.query_stream(user_input, verbose=False, user_id=CHAT_USER_ID):
+        if event['type'] == 'delta':
+            print(event['content'], end="", flush=True)
+        else:
+            result = event
+    print("\n" + "-" * 70)
+    return result
+
+def interactive_chat(stream=True):
     show_banner()
     try:
+        require_api_key()
+        print_config()
         engine = RAGEngine()
+        #Abrir la base y la conexion antes de la primera pregunta
+        engine.warmup()
     except Exception as es:
+        print(f" Error al iniciar: {str(es)}")
         return
     stats = {
         'total_queries': 0,
         'successful_queries': 0,
-        'failes_queries': 0,
+        'failed_queries': 0,
         'total_tokens': 0,
         'total_cost': 0.0,
         'total_time': 0.0,
@@ -109,17 +150,31 @@ def interactive_chat():
             elif command == 'stats':
                 show_stats(stats)
                 continue
+            elif command == 'nueva':
+                if engine.memory is not None:
+                    engine.memory.clear(CHAT_USER_ID)
+                print(" Conversación reiniciada")
+                continue
             stats['total_queries'] += 1
-            result = engine.query(user_input, verbose=False)
+            if stream:
+                result = stream_response(engine, user_input)
+            else:
+                result = engine.query(user_input, verbose=False, user_id=CHAT_USER_ID)
             if 'error' in result:
-                stats['failes_queries'] += 1
+                stats['failed_queries'] += 1
                 print(f"\n Error: {result['error']}")
             else:
                 stats['successful_queries'] += 1
-                format_response(result, show_sources=True, show_stats_inline=True)
+                stats['total_tokens'] += result.get('tokens_used', 0)
+                stats['total_cost'] += result.get('cost', 0.0)
+                stats['total_time'] += result['time_total']
+                stats['avg_time'] = stats['total_time'] / stats['successful_queries']
+                stats['avg_cost'] = stats['total_cost'] / stats['successful_queries']
+                format_response(result, show_sources=True, show_stats_inline=True, print_answer=not stream)
                 
         except Exception:
-            stats['failes_queries'] += 1
+            stats['failed_queries'] += 1
             continue
 if __name__ == "__main__":
-    interactive_chat()
\ No newline at end of file
+    #--no-stream espera la respuesta completa antes de mostrarla
+    interactive_chat(stream='--no-stream' not in sys.argv)
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""Pruebas del control de admision: cola llena (429), plazo vencido (503) y liberacion de lugares.
+
+    python -m pytest tests/backend
+"""
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+import asyncio
+
+import pytest
+
+from backend.admission import AdmissionController, Overloaded
+
+
+async def hold(controller, release: asyncio.Event):
+    async with controller.admit():
+        await release.wait()
+
+
+def test_full_queue_is_rejected_with_429():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=5)
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as error:
+            async with controller.admit():
+                pass
+        assert error.value.status == 429
+        assert controller.get_stats()['waiting'] == 1
+        release.set()
+        await asyncio.gather(running, queued)
+        return controller
+
+    controller = asyncio.run(scenario())
+    stats = controller.get_stats()
+    assert stats['admitted'] == 2
+    assert stats['rejected_queue_full'] == 1
+    assert stats['in_flight'] == 0
+
+
+def test_queue_timeout_is_rejected_with_503():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=5, queue_timeout=0.05)
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as error:
+            async with controller.admit():
+                pass
+        assert error.value.status == 503
+        release.set()
+        await running
+        #El lugar que se libero se puede volver a tomar
+        async with controller.admit():
+            pass
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert controller.rejected_timeout == 1
+    assert controller.get_stats()['waiting'] == 0
+
+
+def test_slot_is_released_when_the_query_fails():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=0)
+        with pytest.raises(RuntimeError):
+            async with controller.admit():
+                raise RuntimeError("fallo OpenAI")
+        async with controller.admit():
+            pass
+        return controller
+
+    assert asyncio.run(scenario()).admitted == 2
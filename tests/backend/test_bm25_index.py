@@ -0,0 +1,58 @@
+"""Pruebas del indice BM25 y de la fusion de resultados (RRF).
+
+    python -m pytest tests/backend
+"""
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.vector_store_manager import VectorStoreManager
+from backend.bm25_index import BM25Index, reciprocal_rank_fusion, is_confident, tokenize
+
+
+def doc(doc_id, **fields):
+    return {'id': doc_id, 'content': doc_id, 'source': "menu.txt", **fields}
+
+
+def test_rrf_prefers_documents_found_by_both_lists():
+    vector = [doc("a", distance=0.1), doc("b", distance=0.2), doc("c", distance=0.3)]
+    lexical = [doc("c", bm25_score=9.0), doc("d", bm25_score=5.0)]
+    fused = reciprocal_rank_fusion([vector, lexical], n_results=4)
+    #b y d quedan empatados (segundos en su lista): se conserva el orden en que aparecieron
+    assert [result['id'] for result in fused] == ["c", "a", "b", "d"]
+    assert fused[0]['rrf_score'] == 1 / 63 + 1 / 61
+
+
+def test_rrf_keeps_fields_from_every_list():
+    vector = [doc("a", distance=0.1, bm25_score=None)]
+    lexical = [doc("a", distance=None, bm25_score=4.0)]
+    [fused] = reciprocal_rank_fusion([vector, lexical], n_results=3)
+    assert fused['distance'] == 0.1
+    assert fused['bm25_score'] == 4.0
+
+
+def test_rrf_truncates_to_n_results():
+    fused = reciprocal_rank_fusion([[doc("a")], [doc("b")], [doc("c")]], n_results=2)
+    assert [result['id'] for result in fused] == ["a", "b"]
+
+
+def test_tokenize_ignores_accents_and_plurals():
+    assert tokenize("Empanadas de CARNÉ") == tokenize("empanada carne")
+
+
+def test_search_ranks_exact_terms_first(tmp_path):
+    chunks = [
+        {'content': "Bandeja paisa con chicharron", 'source': "menu.txt", 'chunk_index': 0},
+        {'content': "Horario de lunes a viernes", 'source': "horarios.txt", 'chunk_index': 0},
+        {'content': "Limonada de coco", 'source': "menu.txt", 'chunk_index': 1}
+    ]
+    index = BM25Index.from_chunks(chunks, VectorStoreManager.get_document_id)
+    results = index.search("¿cuanto vale la bandeja paisa?", n_results=3)
+    assert results[0]['id'] == "menu.txt_chunk0"
+    assert is_confident(results, min_score=0.1, min_ratio=1.5)
+    assert index.search("bandeja", sources=["horarios.txt"]) == []
+
+    path = str(tmp_path / "bm25_index.json")
+    index.save(path)
+    assert BM25Index.load(path).search("limonada", n_results=1)[0]['content'] == "Limonada de coco"
@@ -0,0 +1,120 @@
+"""Pruebas del cliente masivo de embeddings con una funcion de embedding falsa (sin OpenAI).
+
+    python -m pytest tests/backend
+"""
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+import httpx
+import openai
+import pytest
+
+from backend.bulk_embedding_client import BulkEmbeddingClient, EmbeddingCheckpoint
+
+
+def api_error(error_class, status_code):
+    request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+    return error_class("error de prueba", response=httpx.Response(status_code, request=request), body=None)
+
+
+def make_documents(count):
+    return [{'content': f"chunk numero {i}", 'source': "menu.txt"} for i in range(count)]
+
+
+def make_client(embed_function, tmp_path=None, **options):
+    options.setdefault('max_items_per_batch', 8)
+    options.setdefault('max_concurrency', 1)
+    checkpoint_path = str(tmp_path / "checkpoint.jsonl") if tmp_path is not None else None
+    return BulkEmbeddingClient(
+        checkpoint_path=checkpoint_path,
+        embed_function=embed_function,
+        base_delay=0,
+        **options
+    )
+
+
+def test_bad_chunk_is_isolated_by_bisection():
+    calls = []
+
+    def embed(texts):
+        calls.append(len(texts))
+        if "chunk numero 5" in texts:
+            raise api_error(openai.BadRequestError, 400)
+        return [[1.0, 0.0] for _ in texts]
+
+    written = []
+    report = make_client(embed).embed_documents(
+        make_documents(8), lambda batch, embeddings: written.extend(batch), lambda doc: doc['content']
+    )
+    assert report['succeeded'] == 7
+    assert [item['id'] for item in report['failed']] == ["chunk numero 5"]
+    assert len(written) == 7
+    #Solo se parten las mitades que contienen el chunk invalido
+    assert calls == [8, 4, 4, 2, 1, 1, 2]
+
+
+def test_count_mismatch_is_bisected():
+    def embed(texts):
+        #Siempre un solo embedding: solo los lotes de un chunk coinciden
+        return [[1.0, 0.0]]
+
+    report = make_client(embed).embed_documents(make_documents(4), lambda batch, embeddings: None, lambda doc: doc['content'])
+    assert report['succeeded'] == 4
+    assert report['failed'] == []
+
+
+@pytest.mark.parametrize("error_class, status_code", [
+    (openai.AuthenticationError, 401),
+    (openai.PermissionDeniedError, 403),
+    (openai.NotFoundError, 404)
+])
+def test_fatal_errors_abort_without_bisection(error_class, status_code):
+    calls = []
+
+    def embed(texts):
+        calls.append(len(texts))
+        raise api_error(error_class, status_code)
+
+    with pytest.raises(error_class):
+        make_client(embed).embed_documents(make_documents(32), lambda batch, embeddings: None, lambda doc: doc['content'])
+    #Ni se divide el lote ni se envian los lotes restantes
+    assert calls == [8]
+
+
+def test_other_errors_fail_the_batch_without_bisection():
+    calls = []
+
+    def embed(texts):
+        calls.append(len(texts))
+        raise RuntimeError("respuesta inesperada")
+
+    report = make_client(embed).embed_documents(make_documents(8), lambda batch, embeddings: None, lambda doc: doc['content'])
+    assert calls == [8]
+    assert len(report['failed']) == 8
+
+
+def test_checkpoint_resumes_only_pending_chunks(tmp_path):
+    def failing_embed(texts):
+        if "chunk numero 9" in texts:
+            raise RuntimeError("corte")
+        return [[1.0, 0.0] for _ in texts]
+
+    documents = make_documents(16)
+    first = make_client(failing_embed, tmp_path).embed_documents(documents, lambda batch, embeddings: None, lambda doc: doc['content'])
+    assert first['succeeded'] == 8
+    assert len(EmbeddingCheckpoint(str(tmp_path / "checkpoint.jsonl")).done) == 8
+
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return [[1.0, 0.0] for _ in texts]
+
+    second = make_client(embed, tmp_path).embed_documents(documents, lambda batch, embeddings: None, lambda doc: doc['content'])
+    assert second['skipped'] == 8
+    assert second['succeeded'] == 8
+    assert sorted(text for batch in calls for text in batch) == sorted(doc['content'] for doc in documents[8:])
+    #Con todo indexado el checkpoint se borra
+    assert not os.path.exists(tmp_path / "checkpoint.jsonl")
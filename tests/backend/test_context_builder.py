@@ -0,0 +1,71 @@
+"""Pruebas del armado del contexto: union de chunks solapados, duplicados y presupuesto de tokens.
+
+    python -m pytest tests/backend
+"""
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.context_builder import build_context
+from backend.token_counter import count_tokens
+
+
+def chunk(source, chunk_index, content):
+    return {'source': source, 'chunk_index': chunk_index, 'content': content}
+
+
+def test_consecutive_chunks_are_merged_without_repeating_the_overlap():
+    documents = [
+        chunk("menu.txt", 1, "la bandeja paisa trae chicharron y arepa"),
+        chunk("menu.txt", 0, "Platos fuertes: la bandeja paisa trae"),
+    ]
+    result = build_context(documents, max_tokens=0)
+    assert result['merged'] == 1
+    assert result['context'] == "Documento 1 (menu.txt):\nPlatos fuertes: la bandeja paisa trae chicharron y arepa"
+    assert len(result['documents_used']) == 2
+
+
+def test_structured_chunks_of_the_same_section_share_the_header():
+    documents = [
+        chunk("menu.txt", 0, "=== Bebidas ===\nLimonada de coco - $9.000"),
+        chunk("menu.txt", 1, "=== Bebidas ===\nJugo de lulo - $6.000"),
+    ]
+    context = build_context(documents, max_tokens=0)['context']
+    assert context.count("=== Bebidas ===") == 1
+    assert "Jugo de lulo" in context
+
+
+def test_blocks_keep_the_order_of_their_best_chunk():
+    documents = [
+        chunk("horarios.txt", 0, "Abrimos de lunes a viernes de 11 a 22"),
+        chunk("menu.txt", 4, "Ajiaco santafereño con pollo y guascas"),
+        chunk("horarios.txt", 0, "Abrimos de lunes a viernes de 11 a 22"),
+    ]
+    result = build_context(documents, max_tokens=0)
+    assert result['context'].index("horarios.txt") < result['context'].index("menu.txt")
+    assert result['merged'] == 1
+
+
+def test_near_duplicates_are_dropped():
+    text = "el domicilio cuesta 5000 pesos y llega en cuarenta minutos a toda la ciudad"
+    documents = [chunk("domicilios.txt", 0, text), chunk("faq.txt", 3, text + " hoy")]
+    result = build_context(documents, max_tokens=0, dedup_threshold=0.8)
+    assert result['dropped_duplicates'] == 1
+    assert "faq.txt" not in result['context']
+    assert result['tokens_saved'] > 0
+
+
+def test_budget_truncates_first_block_and_drops_the_rest():
+    documents = [
+        chunk("menu.txt", 0, " ".join(f"plato{i}" for i in range(400))),
+        chunk("horarios.txt", 0, "Abrimos de lunes a viernes de 11 a 22"),
+    ]
+    result = build_context(documents, max_tokens=100)
+    assert result['tokens'] <= 100
+    assert result['dropped_budget'] == 1
+    assert count_tokens(result['context']) == result['tokens']
+
+
+def test_empty_input():
+    assert build_context([])['context'] == ""
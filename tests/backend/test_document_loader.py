@@ -0,0 +1,67 @@
+"""Pruebas del chunking estructurado y de los ids de chunk por contenido.
+
+    python -m pytest tests/backend
+"""
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+import pytest
+
+from backend.document_loader import iter_document_chunks, iter_structured_chunks, make_chunk_id
+
+MENU = """Restaurante La Fonda
+
+=== Entradas ===
+Empanadas de carne - $8.000
+
+=== Preguntas ===
+¿Tienen opciones vegetarianas?
+Si, el ajiaco se puede pedir sin pollo.
+"""
+
+
+def chunks_of(content, strategy="structured", chunk_size=500):
+    return list(iter_document_chunks({'source': "menu.txt", 'content': content}, chunk_size, 50, strategy))
+
+
+def test_sections_become_headers_and_questions_keep_their_answer():
+    chunks = chunks_of(MENU)
+    assert [chunk['content'] for chunk in chunks] == [
+        "=== Entradas ===\nEmpanadas de carne - $8.000",
+        "=== Preguntas ===\n¿Tienen opciones vegetarianas?\nSi, el ajiaco se puede pedir sin pollo."
+    ]
+    assert [chunk['section'] for chunk in chunks] == ["Entradas", "Preguntas"]
+    assert [chunk['chunk_index'] for chunk in chunks] == [0, 1]
+
+
+def test_chunk_ids_depend_only_on_content():
+    before = {chunk['content']: chunk['chunk_id'] for chunk in chunks_of(MENU)}
+    edited = MENU.replace("Restaurante La Fonda\n", "Restaurante La Fonda\n\n=== Sopas ===\nAjiaco - $28.000\n")
+    after = {chunk['content']: chunk['chunk_id'] for chunk in chunks_of(edited)}
+    for content, chunk_id in before.items():
+        assert after[content] == chunk_id
+    assert make_chunk_id("menu.txt", "x") != make_chunk_id("bebidas.txt", "x")
+
+
+def test_repeated_text_gets_numbered_ids():
+    repeated = "=== Promos ===\n2x1 en limonadas\n\n=== Otras ===\nX\n\n=== Promos ===\n2x1 en limonadas\n"
+    ids = [chunk['chunk_id'] for chunk in chunks_of(repeated)]
+    assert len(set(ids)) == len(ids)
+    assert ids[2] == f"{ids[0]}_2"
+
+
+def test_long_block_is_split_by_lines():
+    block = "\n".join(f"Plato {i} - ${i}.000" for i in range(20))
+    parts = list(iter_structured_chunks(f"=== Menu ===\n{block}", chunk_size=60, chunk_overlap=10))
+    assert all(len(part) <= 60 for _, part in parts)
+    assert "\n".join(part for _, part in parts) == block
+
+
+def test_chars_strategy_uses_position_ids():
+    chunks = chunks_of("a" * 1200, strategy="chars")
+    assert [chunk['chunk_index'] for chunk in chunks] == [0, 1, 2]
+    assert 'chunk_id' not in chunks[0]
+    with pytest.raises(ValueError):
+        chunks_of(MENU, strategy="words")
@@ -0,0 +1,93 @@
+"""Pruebas del cache de embeddings en SQLite: LRU, almacenamiento float32 y el singleton.
+
+    python -m pytest tests/backend
+"""
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+import sqlite3
+import threading
+import time
+from array import array
+
+import numpy as np
+
+import backend.embeddings_manual as embeddings_manual
+from backend.embedding_cache import EmbeddingCache, make_cache_key
+
+MODEL = "text-embedding-3-small"
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.put(MODEL, "uno", [1.0, 0.0])
+    time.sleep(0.01)
+    cache.put(MODEL, "dos", [0.0, 1.0])
+    time.sleep(0.01)
+    #Leer "uno" lo vuelve el mas reciente: se expulsa "dos"
+    assert cache.get(MODEL, "uno") == [1.0, 0.0]
+    time.sleep(0.01)
+    cache.put(MODEL, "tres", [1.0, 1.0])
+    assert len(cache) == 2
+    assert cache.get(MODEL, "dos") is None
+    assert cache.get(MODEL, "uno") is not None
+    assert cache.get(MODEL, "tres") is not None
+
+
+def test_embeddings_are_stored_as_float32(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path=path)
+    embedding = np.random.default_rng(0).normal(size=1536).tolist()
+    cache.put(MODEL, "hola", embedding)
+    blob = sqlite3.connect(path).execute("SELECT embedding FROM embeddings").fetchone()[0]
+    assert len(blob) == 1536 * 4
+    assert np.allclose(cache.get(MODEL, "hola"), embedding, atol=1e-6)
+    #Otro modelo es otra clave
+    assert cache.get("otro-modelo", "hola") is None
+
+
+def test_float64_rows_from_older_caches_are_still_read(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """CREATE TABLE embeddings (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            last_access REAL NOT NULL
+        )"""
+    )
+    conn.execute(
+        "INSERT INTO embeddings VALUES (?, ?, ?, ?)",
+        (make_cache_key(MODEL, "viejo"), MODEL, array('d', [0.25, -0.5]).tobytes(), time.time())
+    )
+    conn.commit()
+    conn.close()
+    cache = EmbeddingCache(path=path)
+    assert cache.get(MODEL, "viejo") == [0.25, -0.5]
+    cache.put(MODEL, "nuevo", [0.5, 0.25])
+    assert cache.get(MODEL, "nuevo") == [0.5, 0.25]
+
+
+def test_singleton_is_created_once(tmp_path, monkeypatch):
+    created = []
+
+    class CountingCache(EmbeddingCache):
+        def __init__(self):
+            time.sleep(0.05)
+            created.append(self)
+            super().__init__(path=str(tmp_path / "cache.sqlite3"))
+
+    monkeypatch.setattr(embeddings_manual, 'EMBEDDING_CACHE_ENABLED', True)
+    monkeypatch.setattr(embeddings_manual, 'EmbeddingCache', CountingCache)
+    monkeypatch.setattr(embeddings_manual, '_embedding_cache', None)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(embeddings_manual.get_embedding_cache())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert all(cache is created[0] for cache in results)
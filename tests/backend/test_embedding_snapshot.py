@@ -0,0 +1,111 @@
+"""Pruebas del snapshot cuantizado: ida y vuelta de la cuantizacion, centroides y snapshot desactualizado.
+
+    python -m pytest tests/backend
+"""
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+import numpy as np
+import pytest
+
+from backend.embedding_snapshot import quantize, export_snapshot, SnapshotVectorIndex
+from backend.numpy_vector_index import NumpyVectorIndex
+from backend.query_router import QueryRouter
+from backend.vector_store_manager import VectorStoreManager, open_chroma_client
+
+
+def random_embeddings(count, dim=32, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_index(vectors, sources=None):
+    sources = sources or ["menu.txt"] * len(vectors)
+    return NumpyVectorIndex().build(
+        ids=[f"chunk_{i}" for i in range(len(vectors))],
+        embeddings=vectors,
+        documents=[f"texto {i}" for i in range(len(vectors))],
+        metadatas=[{'source': source, 'chunk_index': i} for i, source in enumerate(sources)]
+    )
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float16", 1e-3), ("int8", 1e-2)])
+def test_quantize_round_trip(dtype, tolerance):
+    vectors = random_embeddings(200)
+    quantized, scales = quantize(vectors, dtype)
+    restored = quantized.astype(np.float32)
+    if scales is not None:
+        restored *= scales[:, np.newaxis]
+    assert quantized.dtype == np.dtype(dtype)
+    assert np.abs(restored - vectors).max() < tolerance
+
+
+def test_quantize_rejects_unknown_dtype():
+    with pytest.raises(ValueError):
+        quantize(random_embeddings(2), "int4")
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_snapshot_search_matches_float32(tmp_path, dtype):
+    vectors = random_embeddings(300, seed=1)
+    index = build_index(vectors)
+    export_snapshot(index, str(tmp_path), dtype=dtype)
+    snapshot = SnapshotVectorIndex.load(str(tmp_path), block_size=64)
+    queries = random_embeddings(10, seed=2)
+    expected = [[doc['id'] for doc in result] for result in index.search(queries, n_results=1)]
+    found = [[doc['id'] for doc in result] for result in snapshot.search(queries, n_results=1)]
+    assert found == expected
+
+
+def test_router_centroids_dequantize_int8_rows():
+    #En cada fuente una fila larga y una corta: sin la escala por fila pesarian lo mismo
+    vectors = np.zeros((4, 8), dtype=np.float32)
+    vectors[0, 0], vectors[1, 1] = 10.0, 0.1
+    vectors[2, 2], vectors[3, 3] = 10.0, 0.1
+    metadatas = [{'source': "menu.txt"}] * 2 + [{'source': "horarios.txt"}] * 2
+    expected = QueryRouter.from_embeddings(vectors, metadatas)
+    quantized, scales = quantize(vectors, "int8")
+    router = QueryRouter.from_embeddings(quantized, metadatas, scales=scales)
+    assert np.allclose(router.centroids, expected.centroids, atol=1e-3)
+    assert not np.allclose(QueryRouter.from_embeddings(quantized, metadatas).centroids, expected.centroids, atol=1e-3)
+
+
+def test_stale_snapshot_falls_back_to_chroma(tmp_path):
+    client = open_chroma_client(str(tmp_path / "chroma"))
+    store = VectorStoreManager(
+        persist_directory=str(tmp_path / "chroma"),
+        collection_name="menu_kb",
+        search_backend="snapshot",
+        manifest_path=str(tmp_path / "manifest.json"),
+        retrieval_mode="vector",
+        bm25_path=str(tmp_path / "bm25_index.json"),
+        client=client,
+        snapshot_path=str(tmp_path / "snapshot"),
+        query_routing=False,
+        fast_path=False
+    )
+    vectors = random_embeddings(4, seed=5)
+    for name, prefix in (("menu_kb", "base"), ("menu_kb__vnueva", "nueva")):
+        collection = client.get_or_create_collection(name=name, metadata={'hnsw:space': "cosine"})
+        collection.add(
+            ids=[f"{prefix}_{i}" for i in range(4)],
+            embeddings=vectors.tolist(),
+            documents=[f"{prefix} {i}" for i in range(4)],
+            metadatas=[{'source': "menu.txt", 'chunk_index': i} for i in range(4)]
+        )
+    store.set_alias({'version': "v1", 'collection': "menu_kb", 'bm25_path': store.bm25_path, 'index_version': "kb-v1"})
+    store.export_snapshot(dtype="int8")
+    assert store.search_by_embeddings([vectors[0].tolist()], 1)[0][0]['id'] == "base_0"
+    assert store._get_snapshot_index() is not None
+
+    #Otro proceso activa una version nueva: el snapshot viejo no se usa
+    store.set_alias({'version': "v2", 'collection': "menu_kb__vnueva", 'bm25_path': store.bm25_path, 'index_version': "kb-v2"})
+    store._alias_mtime = None
+    assert store._get_snapshot_index() is None
+    assert store.search_by_embeddings([vectors[0].tolist()], 1)[0][0]['id'] == "nueva_0"
+
+    store.export_snapshot(dtype="int8")
+    assert store._get_snapshot_index().index_version == "kb-v2"
+    assert store.search_by_embeddings([vectors[0].tolist()], 1)[0][0]['id'] == "nueva_0"
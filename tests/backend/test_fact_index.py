@@ -0,0 +1,119 @@
+"""Pruebas de la tabla de precios y horarios (extract_facts y FactIndex.answer).
+
+    python -m pytest tests/backend
+"""
+import sys
+import os
+from datetime import datetime, timezone
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+import pytest
+
+import backend.fact_index as fact_index
+from backend.document_loader import extract_facts
+from backend.fact_index import FactIndex
+
+MENU = """=== PLATOS PRINCIPALES ===
+
+Bandeja Paisa - $15.000
+Frijoles, arroz, carne molida y chicharron.
+
+Punta de Anca - $16.000
+Corte de res a la parrilla.
+
+=== BEBIDAS ===
+
+Café Colombiano - $2.500
+Limonada de Coco - $5.000
+Limonada Natural - $3.000
+
+=== POSTRES ===
+
+Tres Leches - $6.000"""
+
+HOURS = """=== HORARIOS DE ATENCIÓN ===
+
+Lunes a Viernes: 8:00 AM - 8:00 PM
+Sábados: 9:00 AM - 9:00 PM
+Domingos: CERRADO"""
+
+CHUNKS = [
+    {'content': MENU, 'source': "menu.txt", 'chunk_index': 0},
+    {'content': HOURS, 'source': "horarios.txt", 'chunk_index': 0}
+]
+
+
+@pytest.fixture
+def index():
+    return FactIndex.from_chunks(CHUNKS, timezone="America/Bogota")
+
+
+def freeze_now(monkeypatch, instant):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return instant.astimezone(tz)
+    monkeypatch.setattr(fact_index, 'datetime', FrozenDatetime)
+
+
+def test_extract_facts_reads_prices_categories_and_hours():
+    facts = extract_facts(CHUNKS)
+    items = {item['name']: item for item in facts['items']}
+    assert items['Bandeja Paisa']['price'] == 15000
+    assert items['Bandeja Paisa']['category'] == "PLATOS PRINCIPALES"
+    assert items['Café Colombiano']['price'] == 2500
+    assert items['Tres Leches']['category'] == "POSTRES"
+    hours = {entry['day']: entry for entry in facts['hours']}
+    assert sorted(hours) == sorted(['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo'])
+    assert hours['miercoles']['hours'] == "8:00 AM - 8:00 PM"
+    assert hours['domingo']['closed'] is True
+
+
+def test_extract_facts_drops_conflicting_prices():
+    #Un chunk solapado que corto el precio no debe producir un dato falso
+    chunks = CHUNKS + [{'content': "=== BEBIDAS ===\nCafé Colombiano - $2.000", 'source': "menu.txt", 'chunk_index': 1}]
+    names = [item['name'] for item in extract_facts(chunks)['items']]
+    assert "Café Colombiano" not in names
+    assert "Bandeja Paisa" in names
+
+
+def test_price_of_a_single_item(index):
+    result = index.answer("¿Cuánto cuesta la bandeja paisa?")
+    assert result['answer'] == "Bandeja Paisa cuesta $15.000."
+    assert result['sources'] == [{'source': "menu.txt", 'chunk_index': 0}]
+    assert index.answer("precio de la bandja")['answer'] == "Bandeja Paisa cuesta $15.000."
+
+
+def test_ambiguous_items_go_to_the_llm(index):
+    #Ningun plato contiene "cafe" y "leche" a la vez
+    assert index.answer("¿cuánto cuesta el café con leche?") is None
+    #Dos limonadas igual de parecidas
+    assert index.answer("¿cuánto vale la limonada?") is None
+    assert index.answer("precio de la limonada de coco")['answer'] == "Limonada de Coco cuesta $5.000."
+
+
+def test_unknown_words_go_to_the_llm(index):
+    assert index.answer("plato del día") is None
+    assert index.answer("¿cuánto cuesta el plato del día?") is None
+    assert index.answer("¿la bandeja paisa trae aguacate?") is None
+
+
+def test_category_lists_its_items(index):
+    result = index.answer("¿cuánto cuestan los postres?")
+    assert result['fact_type'] == 'category'
+    assert "Tres Leches: $6.000" in result['answer']
+
+
+def test_hours_for_a_day_and_full_schedule(index):
+    assert index.answer("¿a qué hora abren el sábado?")['answer'] == "El sábado atendemos de 9:00 AM a 9:00 PM."
+    assert index.answer("¿abren el domingo?")['answer'] == "El domingo estamos cerrados."
+    assert "Lunes a Viernes: 8:00 AM - 8:00 PM" in index.answer("¿cuál es el horario?")['answer']
+
+
+def test_today_uses_the_business_timezone(index, monkeypatch):
+    #Lunes 03:00 UTC todavia es domingo en Bogota
+    freeze_now(monkeypatch, datetime(2026, 10, 19, 3, 0, tzinfo=timezone.utc))
+    assert index.answer("¿hasta qué hora atienden hoy?")['answer'] == "El domingo estamos cerrados."
+    freeze_now(monkeypatch, datetime(2026, 10, 19, 15, 0, tzinfo=timezone.utc))
+    assert index.answer("¿hasta qué hora atienden hoy?")['answer'] == "El lunes atendemos de 8:00 AM a 8:00 PM."
@@ -0,0 +1,143 @@
+"""Pruebas del indexado incremental: diferencia contra el manifest (sin Chroma ni OpenAI).
+
+    python -m pytest tests/backend
+"""
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from backend.incremental_indexer import incremental_index, load_manifest
+from backend.vector_store_manager import VectorStoreManager
+
+MENU = """=== Entradas ===
+Empanadas de carne - $8.000
+
+Patacones con hogao - $9.500
+
+=== Platos fuertes ===
+Bandeja paisa - $32.000
+"""
+
+HORARIOS = """=== Horarios ===
+Lunes a viernes de 11:00 a 22:00
+"""
+
+
+class FakeVectorStore:
+    #Guarda los chunks en un dict y registra cada escritura
+    get_document_id = staticmethod(VectorStoreManager.get_document_id)
+
+    def __init__(self):
+        self.chunks = {}
+        self.upserted = []
+        self.deleted = []
+        self.lexical_chunks = None
+
+    def get_existing_ids(self, ids):
+        return [chunk_id for chunk_id in ids if chunk_id in self.chunks]
+
+    def upsert_documents(self, documents):
+        ids = [self.get_document_id(doc) for doc in documents]
+        for chunk_id, doc in zip(ids, documents):
+            self.chunks[chunk_id] = doc
+        self.upserted.extend(ids)
+        return ids
+
+    def delete_documents(self, ids):
+        for chunk_id in ids:
+            self.chunks.pop(chunk_id, None)
+        self.deleted.extend(ids)
+        return len(ids)
+
+    def update_metadata(self, documents):
+        for doc in documents:
+            self.chunks[self.get_document_id(doc)] = doc
+        return len(documents)
+
+    def rebuild_lexical_index(self, chunks):
+        self.lexical_chunks = chunks
+
+
+def run(documents, store, manifest_path):
+    return incremental_index(
+        [{'source': source, 'content': content} for source, content in documents.items()],
+        store,
+        chunk_size=60,
+        chunk_overlap=10,
+        manifest_path=manifest_path,
+        strategy="structured"
+    )
+
+
+def test_unchanged_files_are_not_reembedded(tmp_path):
+    store = FakeVectorStore()
+    manifest_path = str(tmp_path / "manifest.json")
+    first = run({"menu.txt": MENU, "horarios.txt": HORARIOS}, store, manifest_path)
+    assert first['chunks_upserted'] == len(store.chunks) > 0
+    store.upserted.clear()
+
+    second = run({"menu.txt": MENU, "horarios.txt": HORARIOS}, store, manifest_path)
+    assert store.upserted == []
+    assert second['files_unchanged'] == 2
+    assert second['version'] == first['version']
+
+
+def test_edit_only_touches_changed_chunks(tmp_path):
+    store = FakeVectorStore()
+    manifest_path = str(tmp_path / "manifest.json")
+    run({"menu.txt": MENU, "horarios.txt": HORARIOS}, store, manifest_path)
+    before = set(store.chunks)
+    store.upserted.clear()
+
+    summary = run({"menu.txt": MENU.replace("$32.000", "$34.000"), "horarios.txt": HORARIOS}, store, manifest_path)
+    assert summary['files_unchanged'] == 1
+    assert summary['chunks_upserted'] == 1
+    assert summary['chunks_deleted'] == 1
+    [new_id] = store.upserted
+    assert "$34.000" in store.chunks[new_id]['content']
+    assert set(store.chunks) == (before - set(store.deleted)) | {new_id}
+    manifest = load_manifest(manifest_path)
+    assert new_id in manifest['files']['menu.txt']['chunks']
+    assert summary['version'] == manifest['version']
+
+
+def test_removed_file_deletes_its_chunks(tmp_path):
+    store = FakeVectorStore()
+    manifest_path = str(tmp_path / "manifest.json")
+    run({"menu.txt": MENU, "horarios.txt": HORARIOS}, store, manifest_path)
+    horarios_ids = set(load_manifest(manifest_path)['files']['horarios.txt']['chunks'])
+
+    summary = run({"menu.txt": MENU}, store, manifest_path)
+    assert set(store.deleted) == horarios_ids
+    assert summary['chunks_deleted'] == len(horarios_ids)
+    assert summary['chunks_upserted'] == 0
+    assert 'horarios.txt' not in load_manifest(manifest_path)['files']
+    assert {chunk['source'] for chunk in store.lexical_chunks} == {"menu.txt"}
+
+
+def test_inserted_section_only_moves_following_chunks(tmp_path):
+    store = FakeVectorStore()
+    manifest_path = str(tmp_path / "manifest.json")
+    run({"menu.txt": MENU}, store, manifest_path)
+    store.upserted.clear()
+
+    summary = run({"menu.txt": "=== Sopas ===\nSopa del dia - $7.000\n\n" + MENU}, store, manifest_path)
+    assert [store.chunks[chunk_id]['content'] for chunk_id in store.upserted] == [
+        "=== Sopas ===\nSopa del dia - $7.000"
+    ]
+    assert summary['chunks_moved'] == 2
+    assert sorted(chunk['chunk_index'] for chunk in store.chunks.values()) == [0, 1, 2]
+    assert summary['chunks_deleted'] == 0
+
+
+def test_missing_chunks_are_rewritten_after_reset(tmp_path):
+    store = FakeVectorStore()
+    manifest_path = str(tmp_path / "manifest.json")
+    run({"menu.txt": MENU}, store, manifest_path)
+    count = len(store.chunks)
+
+    #La coleccion se vacio por fuera pero el manifest sigue igual
+    store = FakeVectorStore()
+    summary = run({"menu.txt": MENU}, store, manifest_path)
+    assert summary['chunks_upserted'] == count == len(store.chunks)
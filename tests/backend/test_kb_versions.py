@@ -0,0 +1,139 @@
+"""Pruebas de las versiones de la base de conocimiento: crear, activar y volver atras (sin OpenAI).
+
+    python -m pytest tests/backend
+"""
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+import hashlib
+
+import pytest
+
+import backend.kb_versions as kb_versions
+from backend.bulk_embedding_client import BulkEmbeddingClient
+from backend.kb_versions import KnowledgeBaseVersionStore
+from backend.vector_store_manager import VectorStoreManager, open_chroma_client
+
+MENU = """=== Platos fuertes ===
+Bandeja paisa - $32.000
+
+Ajiaco santafereño - $28.000
+"""
+
+
+def fake_embed(texts):
+    #Vector determinista por texto: el mismo chunk siempre tiene el mismo embedding
+    vectors = []
+    for text in texts:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        vectors.append([byte / 255 for byte in digest[:16]])
+    return vectors
+
+
+@pytest.fixture
+def embedded(monkeypatch):
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return fake_embed(texts)
+
+    monkeypatch.setattr(
+        kb_versions,
+        'BulkEmbeddingClient',
+        lambda: BulkEmbeddingClient(embed_function=embed, base_delay=0, max_concurrency=1)
+    )
+    return calls
+
+
+@pytest.fixture
+def versions(tmp_path, embedded):
+    version_store = KnowledgeBaseVersionStore(root=str(tmp_path / "kb_versions"))
+    yield version_store
+    version_store.close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return VectorStoreManager(
+        persist_directory=str(tmp_path / "chroma"),
+        collection_name="menu_kb",
+        manifest_path=str(tmp_path / "manifest.json"),
+        bm25_path=str(tmp_path / "bm25_index.json"),
+        client=open_chroma_client(str(tmp_path / "chroma")),
+        query_routing=False,
+        fast_path=False
+    )
+
+
+def write_menu(tmp_path, content):
+    directory = tmp_path / "knowledge_base"
+    directory.mkdir(exist_ok=True)
+    (directory / "menu.txt").write_text(content, encoding="utf-8")
+    return str(directory)
+
+
+def test_new_version_only_embeds_new_chunks(tmp_path, versions, embedded):
+    first = versions.create_version(write_menu(tmp_path, MENU), chunk_size=40, chunk_overlap=5)
+    assert first['new_chunks'] == len(first['chunks']) == 2
+
+    #Misma base: misma version, sin llamar a la API
+    assert versions.create_version(write_menu(tmp_path, MENU), chunk_size=40, chunk_overlap=5)['version'] == first['version']
+    embedded.clear()
+
+    edited = MENU.replace("$28.000", "$29.000")
+    second = versions.create_version(write_menu(tmp_path, edited), chunk_size=40, chunk_overlap=5)
+    assert second['version'] != first['version']
+    assert second['new_chunks'] == 1
+    assert [text for call in embedded for text in call] == ["=== Platos fuertes ===\nAjiaco santafereño - $29.000"]
+
+
+def test_activate_and_rollback_switch_the_alias(tmp_path, versions, store):
+    first = versions.create_version(write_menu(tmp_path, MENU), chunk_size=40, chunk_overlap=5)
+    second = versions.create_version(
+        write_menu(tmp_path, MENU.replace("$28.000", "$29.000")), chunk_size=40, chunk_overlap=5
+    )
+
+    versions.activate(first['version'], store)
+    alias = store.get_alias()
+    assert alias['collection'] == f"menu_kb__v{first['version']}"
+    assert alias['index_version'] == f"kb-{first['version']}"
+    assert alias['previous'] is None
+    assert os.path.exists(alias['bm25_path'])
+
+    versions.activate(second['version'], store)
+    alias = store.get_alias()
+    assert alias['version'] == second['version']
+    assert alias['previous'] == first['version']
+    documents = store.client.get_collection(alias['collection']).get()['documents']
+    assert any("$29.000" in document for document in documents)
+
+    #Volver atras reutiliza la coleccion que ya existia
+    result = versions.rollback(store)
+    assert result['reused'] is True
+    alias = store.get_alias()
+    assert alias['version'] == first['version']
+    assert alias['previous'] == second['version']
+
+    #Reactivar la version activa no pisa la anterior
+    versions.activate(first['version'], store)
+    assert store.get_alias()['previous'] == second['version']
+
+
+def test_rollback_without_previous_version_fails(tmp_path, versions, store):
+    version = versions.create_version(write_menu(tmp_path, MENU), chunk_size=40, chunk_overlap=5)
+    with pytest.raises(ValueError):
+        versions.rollback(store)
+    versions.activate(version['version'], store)
+    with pytest.raises(ValueError):
+        versions.rollback(store)
+
+
+def test_restore_documents_rewrites_the_files(tmp_path, versions):
+    version = versions.create_version(write_menu(tmp_path, MENU), chunk_size=40, chunk_overlap=5)
+    write_menu(tmp_path, "otro menu")
+    restored = tmp_path / "restaurado"
+    assert versions.restore_documents(version['version'], str(restored)) == ["menu.txt"]
+    assert (restored / "menu.txt").read_text(encoding="utf-8") == MENU.strip()
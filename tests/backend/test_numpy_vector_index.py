@@ -0,0 +1,69 @@
+"""Pruebas del indice vectorial en memoria (NumPy) contra una busqueda exhaustiva.
+
+    python -m pytest tests/backend
+"""
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+import numpy as np
+import pytest
+
+from backend.numpy_vector_index import NumpyVectorIndex
+
+
+def build_index(count=50, dim=16, space="cosine", seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    index = NumpyVectorIndex(space=space).build(
+        ids=[f"chunk_{i}" for i in range(count)],
+        embeddings=vectors,
+        documents=[f"texto {i}" for i in range(count)],
+        metadatas=[{'source': "menu.txt" if i % 2 else "horarios.txt", 'chunk_index': i} for i in range(count)]
+    )
+    return index, vectors
+
+
+def cosine_distances(vectors, query):
+    similarities = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    return 1.0 - similarities
+
+
+def test_search_matches_brute_force():
+    index, vectors = build_index()
+    queries = np.random.default_rng(1).normal(size=(5, 16)).astype(np.float32)
+    results = index.search(queries, n_results=4)
+    for query, found in zip(queries, results):
+        distances = cosine_distances(vectors, query)
+        assert [doc['id'] for doc in found] == [f"chunk_{i}" for i in np.argsort(distances)[:4]]
+        assert np.allclose([doc['distance'] for doc in found], np.sort(distances)[:4], atol=1e-5)
+
+
+def test_l2_distances_match_chroma():
+    index, vectors = build_index(space="l2")
+    query = vectors[3]
+    [found] = index.search(query, n_results=2)
+    assert found[0]['id'] == "chunk_3"
+    assert found[0]['distance'] == pytest.approx(0.0, abs=1e-5)
+    #Chroma reporta la distancia L2 al cuadrado entre vectores normalizados
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.sum((unit - unit[3]) ** 2, axis=1)
+    assert found[1]['distance'] == pytest.approx(np.sort(expected)[1], abs=1e-5)
+
+
+def test_source_filter_only_returns_allowed_rows():
+    index, _ = build_index()
+    [found] = index.search(np.ones(16, dtype=np.float32), n_results=60, sources=["menu.txt"])
+    assert len(found) == 25
+    assert {doc['source'] for doc in found} == {"menu.txt"}
+
+
+def test_edge_cases():
+    index, _ = build_index(count=3)
+    assert len(index.search(np.ones(16), n_results=10)[0]) == 3
+    assert index.search(np.ones((2, 16)), n_results=0) == [[], []]
+    assert NumpyVectorIndex().search(np.ones(16)) == [[]]
+    with pytest.raises(ValueError):
+        index.search(np.ones(8))
+    with pytest.raises(ValueError):
+        NumpyVectorIndex(space="dot")
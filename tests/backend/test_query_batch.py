@@ -0,0 +1,111 @@
+"""Pruebas de RAGEngine.query_batch con un vector store y un LLM falsos (sin Chroma ni OpenAI).
+
+    python -m pytest tests/backend
+"""
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+import threading
+
+import pytest
+
+import backend.rag_engine as rag_engine
+import backend.tracing as tracing
+from backend.rag_engine import RAGEngine
+
+EMBEDDINGS = {
+    "¿tienen domicilio?": [1.0, 0.0, 0.0],
+    "¿a que hora abren?": [0.0, 1.0, 0.0],
+    "¿cuanto vale la bandeja paisa?": [0.0, 0.0, 1.0]
+}
+
+
+class FakeVectorStore:
+    def __init__(self):
+        self.batch_searches = []
+        self.single_searches = []
+
+    def get_index_version(self):
+        return "v1"
+
+    def lexical_fast_path(self, query, n_results):
+        return None
+
+    @staticmethod
+    def _documents(query):
+        return [{'id': query, 'content': f"info sobre {query}", 'source': "faq.txt", 'chunk_index': 0, 'distance': 0.1}]
+
+    def search_similar_batch(self, queries, query_embeddings, n_results):
+        self.batch_searches.append(list(queries))
+        return [self._documents(query) for query in queries]
+
+    def search_similar(self, query, n_results, query_embedding=None):
+        self.single_searches.append(query)
+        return self._documents(query)
+
+    @staticmethod
+    def distance_to_similarity(distance):
+        return 1.0 - distance
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(tracing, 'TRACING_ENABLED', False)
+    engine = RAGEngine(use_answer_cache=True, vector_store=FakeVectorStore(), use_memory=False, use_facts=False)
+    engine.embedding_calls = []
+    engine.generated = []
+    lock = threading.Lock()
+
+    def embed(texts):
+        engine.embedding_calls.append(list(texts))
+        return [EMBEDDINGS[text] for text in texts]
+
+    def generate(query, context, history=None):
+        with lock:
+            engine.generated.append(query)
+        return {'answer': f"respuesta: {context.splitlines()[-1]}", 'model': "fake", 'tokens_used': 1, 'cost': 0.0}
+
+    monkeypatch.setattr(rag_engine, 'get_embeddings_batch', embed)
+    monkeypatch.setattr(engine, 'generate', generate)
+    return engine
+
+
+def test_results_keep_order_and_duplicates_are_generated_once(engine):
+    queries = ["¿tienen domicilio?", "¿a que hora abren?", "¿tienen  domicilio?"]
+    results = list(engine.query_batch(queries, n_results=1, max_concurrency=2))
+    assert [result['query'] for result in results] == queries
+    assert results[0]['answer'] == results[2]['answer'] == "respuesta: info sobre ¿tienen domicilio?"
+    assert results[1]['answer'] == "respuesta: info sobre ¿a que hora abren?"
+    assert sorted(engine.generated) == ["¿a que hora abren?", "¿tienen domicilio?"]
+    #Un solo request de embeddings y una sola busqueda para todo el lote
+    assert engine.embedding_calls == [["¿tienen domicilio?", "¿a que hora abren?"]]
+    assert engine.vector_store.batch_searches == [["¿tienen domicilio?", "¿a que hora abren?"]]
+    assert results[2]['trace']['trace_id'] != results[0]['trace']['trace_id']
+
+
+def test_second_batch_is_served_from_the_answer_cache(engine):
+    list(engine.query_batch(["¿tienen domicilio?"], n_results=1))
+    engine.generated.clear()
+    [result] = list(engine.query_batch(["¿tienen domicilio?", "¿cuanto vale la bandeja paisa?"], n_results=1))[:1]
+    assert result['cache_hit'] is True
+    assert engine.generated == ["¿cuanto vale la bandeja paisa?"]
+
+
+def test_failed_embeddings_fall_back_to_single_retrieval(engine, monkeypatch):
+    def failing(texts):
+        raise RuntimeError("OpenAI no disponible")
+
+    monkeypatch.setattr(rag_engine, 'get_embeddings_batch', failing)
+    results = list(engine.query_batch(["¿tienen domicilio?", "¿a que hora abren?"], n_results=1))
+    assert [result['answer'] for result in results] == [
+        "respuesta: info sobre ¿tienen domicilio?",
+        "respuesta: info sobre ¿a que hora abren?"
+    ]
+    assert sorted(engine.vector_store.single_searches) == ["¿a que hora abren?", "¿tienen domicilio?"]
+
+
+def test_invalid_concurrency_is_rejected(engine):
+    with pytest.raises(ValueError):
+        list(engine.query_batch(["¿tienen domicilio?"], max_concurrency=0))
@@ -0,0 +1,77 @@
+"""Pruebas del cache semantico de respuestas: similitud, version del indice, TTL y LRU.
+
+    python -m pytest tests/backend
+"""
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+import pytest
+
+from backend.semantic_cache import SemanticAnswerCache
+
+DOMICILIO = [1.0, 0.0, 0.0]
+DOMICILIO_PARECIDA = [0.99, 0.1, 0.0]
+HORARIO = [0.0, 1.0, 0.0]
+
+
+def answer(question):
+    return {'query': question, 'answer': f"respuesta a {question}"}
+
+
+def test_similar_question_hits_and_different_one_misses():
+    cache = SemanticAnswerCache(threshold=0.95, ttl_seconds=0)
+    cache.store(DOMICILIO, answer("¿tienen domicilio?"), "v1", 3)
+    result, similarity = cache.lookup(DOMICILIO_PARECIDA, "v1", 3)
+    assert result['answer'] == "respuesta a ¿tienen domicilio?"
+    assert similarity > 0.95
+    assert cache.lookup(HORARIO, "v1", 3) is None
+    #Otro n_results es otra respuesta
+    assert cache.lookup(DOMICILIO, "v1", 5) is None
+    assert cache.get_stats()['hits'] == 1
+
+
+def test_exact_text_hits_without_embedding():
+    cache = SemanticAnswerCache(ttl_seconds=0)
+    cache.store(None, answer("¿Tienen   domicilio?"), "v1", 3)
+    assert cache.lookup_exact("¿tienen domicilio?", "v1", 3)[1] == 1.0
+    #Las entradas sin embedding no participan de la busqueda por similitud
+    assert cache.lookup(DOMICILIO, "v1", 3) is None
+
+
+def test_new_index_version_invalidates_entries():
+    cache = SemanticAnswerCache(ttl_seconds=0)
+    cache.store(DOMICILIO, answer("¿tienen domicilio?"), "v1", 3)
+    assert cache.lookup(DOMICILIO, "v2", 3) is None
+    assert len(cache) == 0
+    assert cache.get_stats()['index_version'] == "v2"
+
+
+def test_expired_entries_are_not_served(monkeypatch):
+    import backend.semantic_cache as semantic_cache
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, 'time', lambda: now[0])
+    cache = SemanticAnswerCache(ttl_seconds=60)
+    cache.store(DOMICILIO, answer("¿tienen domicilio?"), "v1", 3)
+    now[0] += 61
+    assert cache.lookup(DOMICILIO, "v1", 3) is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(ttl_seconds=0, max_entries=2)
+    cache.store(DOMICILIO, answer("domicilio"), "v1", 3)
+    cache.store(HORARIO, answer("horario"), "v1", 3)
+    assert cache.lookup(DOMICILIO, "v1", 3) is not None
+    cache.store([0.0, 0.0, 1.0], answer("menu"), "v1", 3)
+    assert cache.lookup(HORARIO, "v1", 3) is None
+    assert cache.lookup_exact("domicilio", "v1", 3) is not None
+    assert len(cache) == 2
+
+
+def test_invalid_settings_are_rejected():
+    with pytest.raises(ValueError):
+        SemanticAnswerCache(threshold=0)
+    with pytest.raises(ValueError):
+        SemanticAnswerCache(max_entries=0)
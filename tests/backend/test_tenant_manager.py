@@ -0,0 +1,92 @@
+"""Pruebas del pool de tenants: LRU, limite de memoria e inactividad (sin abrir Chroma ni OpenAI).
+
+    python -m pytest tests/backend
+"""
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+import time
+
+import pytest
+
+from backend.tenant_manager import TenantManager
+
+MB = 1024 * 1024
+
+
+class FakeStore:
+    def __init__(self, size):
+        self.size = size
+
+    def memory_bytes(self):
+        return self.size
+
+
+class FakeEngine:
+    def __init__(self, size):
+        self.vector_store = FakeStore(size)
+
+
+def make_manager(monkeypatch, sizes=None, **options):
+    #sizes: memoria de los indices locales de cada tenant en MB
+    sizes = sizes or {}
+    tenants = {tenant_id: {} for tenant_id in ("a", "b", "c", "d")}
+    manager = TenantManager(tenants=tenants, persist_directory="/nonexistent", **options)
+    monkeypatch.setattr(
+        manager,
+        '_open',
+        lambda tenant_id: {'engine': FakeEngine(sizes.get(tenant_id, 0) * MB), 'last_used': time.monotonic()}
+    )
+    return manager
+
+
+def test_engines_are_reused(monkeypatch):
+    manager = make_manager(monkeypatch)
+    assert manager.get_engine("a") is manager.get_engine("a")
+    stats = manager.get_stats()
+    assert stats['opens'] == 1
+    assert stats['hits'] == 1
+
+
+def test_least_recently_used_tenant_is_evicted(monkeypatch):
+    manager = make_manager(monkeypatch, max_tenants=2)
+    manager.get_engine("a")
+    manager.get_engine("b")
+    manager.get_engine("a")
+    manager.get_engine("c")
+    assert manager.get_stats()['loaded'] == ["a", "c"]
+    assert manager.evictions == 1
+
+
+def test_memory_limit_counts_only_the_local_share(monkeypatch):
+    #100 MB en total, la mitad para Chroma: los indices locales tienen 50 MB
+    manager = make_manager(monkeypatch, sizes={"a": 20, "b": 20, "c": 20}, max_memory_mb=100, chroma_memory_share=0.5)
+    assert manager.chroma_memory_bytes == 50 * MB
+    assert manager.local_memory_bytes == 50 * MB
+    manager.get_engine("a")
+    manager.get_engine("b")
+    manager.get_engine("c")
+    assert manager.get_stats()['loaded'] == ["b", "c"]
+
+
+def test_tenant_just_opened_is_kept_even_if_over_budget(monkeypatch):
+    manager = make_manager(monkeypatch, sizes={"a": 10, "b": 80}, max_memory_mb=100)
+    manager.get_engine("a")
+    manager.get_engine("b")
+    assert manager.get_stats()['loaded'] == ["b"]
+
+
+def test_idle_tenants_are_released(monkeypatch):
+    manager = make_manager(monkeypatch, idle_seconds=60)
+    manager.get_engine("a")
+    manager.get_engine("b")
+    manager._pool["a"]['last_used'] -= 120
+    assert manager.evict_idle() == 1
+    assert manager.get_stats()['loaded'] == ["b"]
+
+
+def test_invalid_memory_share_is_rejected():
+    with pytest.raises(ValueError):
+        TenantManager(tenants={}, chroma_memory_share=1.0)
@@ -0,0 +1,70 @@
+"""Pruebas del log de trazas: escritura en segundo plano, rotacion y texto de la pregunta.
+
+    python -m pytest tests/backend
+"""
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+import json
+
+import pytest
+
+import backend.tracing as tracing
+from backend.tracing import Trace, write_trace, redact_query, close_trace_logs
+
+QUESTION = "soy Ana, mi numero es 3001234567, ¿tienen domicilio?"
+
+
+@pytest.fixture(autouse=True)
+def close_logs():
+    yield
+    close_trace_logs()
+
+
+def read_lines(path):
+    close_trace_logs()
+    with open(path, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+def test_trace_is_written_with_hashed_query(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, 'TRACING_ENABLED', True)
+    path = str(tmp_path / "logs" / "traces.jsonl")
+    trace = Trace('rag_query', query=QUESTION, n_results=3)
+    with trace.span('llm_call', tokens=10):
+        pass
+    trace.duration_ms = 1.0
+    write_trace(trace, path)
+    [record] = read_lines(path)
+    assert record['trace_id'] == trace.trace_id
+    assert record['spans'][0]['name'] == 'llm_call'
+    assert record['attributes']['query'] == redact_query(QUESTION, "hash")
+    assert "3001234567" not in json.dumps(record)
+    #La traza que recibe quien llamo no se modifica
+    assert trace.attributes['query'] == QUESTION
+
+
+def test_query_text_modes():
+    assert redact_query(QUESTION, "full") == QUESTION
+    assert redact_query(QUESTION, "truncate", max_chars=10) == QUESTION[:10] + "..."
+    assert redact_query("hola", "truncate", max_chars=10) == "hola"
+    assert redact_query(QUESTION, "hash") == redact_query(QUESTION, "hash")
+    assert redact_query(QUESTION, "hash").startswith("sha256:")
+    assert redact_query(QUESTION, "none") is None
+
+
+def test_log_rotates_at_max_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, 'TRACING_ENABLED', True)
+    monkeypatch.setattr(tracing, 'TRACE_LOG_MAX_MB', 2 / 1024)
+    monkeypatch.setattr(tracing, 'TRACE_LOG_BACKUPS', 2)
+    path = str(tmp_path / "traces.jsonl")
+    for _ in range(60):
+        trace = Trace('rag_query', query=QUESTION)
+        trace.duration_ms = 1.0
+        write_trace(trace, path)
+    close_trace_logs()
+    files = sorted(os.listdir(tmp_path))
+    assert files == ["traces.jsonl", "traces.jsonl.1", "traces.jsonl.2"]
+    assert all(os.path.getsize(tmp_path / name) <= 2048 for name in files)
@@ -0,0 +1,197 @@
+import re
+import time
+import asyncio
+import hashlib
+import threading
+import unicodedata
+from types import SimpleNamespace
+from typing import List, Dict, Optional, Iterator, AsyncIterator
+
+import numpy as np
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class FakeEmbeddingModel:
+    """Embeddings deterministicos sin red.
+
+    Cada palabra tiene un vector pseudoaleatorio fijo (semilla = hash de la palabra) y el
+    embedding de un texto es la suma normalizada: textos con palabras en comun quedan cerca,
+    asi la busqueda se comporta de forma parecida a la real.
+    """
+
+    def __init__(self, dim: int = 1536):
+        self.dim = dim
+        self._word_vectors: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        vector = self._word_vectors.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            with self._lock:
+                self._word_vectors[word] = vector
+        return vector
+
+    def embed(self, text: str) -> List[float]:
+        normalized = unicodedata.normalize("NFD", text.lower())
+        normalized = "".join(c for c in normalized if unicodedata.category(c) != "Mn")
+        words = _WORD_PATTERN.findall(normalized) or [normalized]
+        vector = np.sum([self._word_vector(word) for word in words], axis=0)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm > 0 else vector).tolist()
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class _Stats:
+    def __init__(self):
+        self.embedding_requests = 0
+        self.embedded_texts = 0
+        self.chat_requests = 0
+        self._lock = threading.Lock()
+
+    def add(self, field: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def as_dict(self) -> Dict:
+        return {
+            'embedding_requests': self.embedding_requests,
+            'embedded_texts': self.embedded_texts,
+            'chat_requests': self.chat_requests
+        }
+
+
+class _FakeBackend:
+    #Logica compartida por el cliente sincrono y el async
+    def __init__(
+        self,
+        dim: int,
+        embedding_latency: float,
+        embedding_latency_per_item: float,
+        chat_latency: float,
+        token_latency: float,
+        answer: str
+    ):
+        self.model = FakeEmbeddingModel(dim)
+        self.embedding_latency = embedding_latency
+        self.embedding_latency_per_item = embedding_latency_per_item
+        self.chat_latency = chat_latency
+        self.token_latency = token_latency
+        self.answer = answer
+        self.stats = _Stats()
+
+    def embedding_delay(self, count: int) -> float:
+        return self.embedding_latency + self.embedding_latency_per_item * count
+
+    def embeddings_response(self, texts: List[str]):
+        self.stats.add('embedding_requests')
+        self.stats.add('embedded_texts', len(texts))
+        return SimpleNamespace(
+            data=[SimpleNamespace(embedding=self.model.embed(text), index=i) for i, text in enumerate(texts)],
+            usage=SimpleNamespace(total_tokens=sum(_estimate_tokens(t) for t in texts))
+        )
+
+    def usage(self, messages: List[Dict]) -> SimpleNamespace:
+        prompt_tokens = sum(_estimate_tokens(m['content']) for m in messages)
+        completion_tokens = _estimate_tokens(self.answer)
+        return SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens
+        )
+
+    def completion(self, messages: List[Dict]):
+        self.stats.add('chat_requests')
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.answer))],
+            usage=self.usage(messages)
+        )
+
+    def stream_pieces(self) -> List[str]:
+        return [piece + " " for piece in self.answer.split(" ")]
+
+    def stream_chunk(self, content: Optional[str] = None, usage=None):
+        choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+        return SimpleNamespace(choices=choices, usage=usage)
+
+
+class FakeOpenAI:
+    """Sustituto del cliente OpenAI: embeddings, chat (con y sin stream) y models.retrieve."""
+
+    def __init__(
+        self,
+        dim: int = 1536,
+        embedding_latency: float = 0.0,
+        embedding_latency_per_item: float = 0.0,
+        chat_latency: float = 0.0,
+        token_latency: float = 0.0,
+        answer: str = "Respuesta de prueba generada sin llamar a la API.",
+        backend: Optional[_FakeBackend] = None
+    ):
+        self._backend = backend or _FakeBackend(
+            dim, embedding_latency, embedding_latency_per_item, chat_latency, token_latency, answer
+        )
+        self.stats = self._backend.stats
+        self.embeddings = SimpleNamespace(create=self._create_embeddings)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+        self.models = SimpleNamespace(retrieve=lambda model: SimpleNamespace(id=model))
+
+    def _create_embeddings(self, input, model: str, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        time.sleep(self._backend.embedding_delay(len(texts)))
+        return self._backend.embeddings_response(texts)
+
+    def _create_completion(self, model: str, messages: List[Dict], stream: bool = False, **kwargs):
+        if stream:
+            return self._stream(messages)
+        time.sleep(self._backend.chat_latency)
+        return self._backend.completion(messages)
+
+    def _stream(self, messages: List[Dict]) -> Iterator:
+        self._backend.stats.add('chat_requests')
+        #chat_latency es el tiempo al primer token; token_latency el tiempo entre fragmentos
+        time.sleep(self._backend.chat_latency)
+        for piece in self._backend.stream_pieces():
+            yield self._backend.stream_chunk(piece)
+            time.sleep(self._backend.token_latency)
+        yield self._backend.stream_chunk(usage=self._backend.usage(messages))
+
+
+class FakeAsyncOpenAI:
+    def __init__(self, sync_client: FakeOpenAI):
+        self._backend = sync_client._backend
+        self.stats = self._backend.stats
+        self.embeddings = SimpleNamespace(create=self._create_embeddings)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+
+    async def _create_embeddings(self, input, model: str, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        await asyncio.sleep(self._backend.embedding_delay(len(texts)))
+        return self._backend.embeddings_response(texts)
+
+    async def _create_completion(self, model: str, messages: List[Dict], stream: bool = False, **kwargs):
+        if stream:
+            return self._stream(messages)
+        await asyncio.sleep(self._backend.chat_latency)
+        return self._backend.completion(messages)
+
+    async def _stream(self, messages: List[Dict]) -> AsyncIterator:
+        self._backend.stats.add('chat_requests')
+        await asyncio.sleep(self._backend.chat_latency)
+        for piece in self._backend.stream_pieces():
+            yield self._backend.stream_chunk(piece)
+            await asyncio.sleep(self._backend.token_latency)
+        yield self._backend.stream_chunk(usage=self._backend.usage(messages))
+
+
+def install_fake_openai(**kwargs) -> FakeOpenAI:
+    #Reemplaza los clientes del backend por los falsos; retorna el cliente para leer sus contadores
+    from backend.openai_clients import set_clients
+    client = FakeOpenAI(**kwargs)
+    set_clients(client=client, async_client=FakeAsyncOpenAI(client))
+    return client
@@ -0,0 +1,386 @@
+"""Benchmarks offline del pipeline RAG (sin gastar en la API).
+
+Usa un cliente OpenAI falso con latencia simulada y bases de conocimiento sinteticas.
+Ejemplo:
+    python tests/benchmarks/run_benchmarks.py --sizes kb 1000 10000 100000
+    python tests/benchmarks/run_benchmarks.py --compare tests/benchmarks/results/anterior.json
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import shutil
+import statistics
+import subprocess
+import contextlib
+from typing import List, Dict, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(os.path.dirname(BENCH_DIR))
+sys.path.insert(0, project_root)
+sys.path.insert(0, BENCH_DIR)
+
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+#Preguntas sobre la base real (knowledge_base/) con la fuente que deberia aparecer
+KB_QUERIES = [
+    {'question': "cuanto cuesta el ajiaco", 'source': "menu.txt"},
+    {'question': "que opciones vegetarianas tienen", 'source': "menu.txt"},
+    {'question': "a que hora abren los sabados", 'source': "horarios.txt"},
+    {'question': "hacen domicilios los domingos", 'source': "horarios.txt"},
+    {'question': "necesito reserva para 8 personas", 'source': "politicas.txt"},
+    {'question': "aceptan tarjeta de credito", 'source': "politicas.txt"},
+    {'question': "tienen parqueadero", 'source': "faqs.txt"},
+    {'question': "puedo llevar a mi perro", 'source': "faqs.txt"},
+]
+#Preguntas de precio y horario que responde la tabla de datos (fact_index) sin el LLM
+KB_FACT_QUERIES = [
+    {'question': "cuanto cuesta el ajiaco", 'source': "menu.txt"},
+    {'question': "cuanto cuesta la bandeja paisa", 'source': "menu.txt"},
+    {'question': "que postres tienen", 'source': "menu.txt"},
+    {'question': "a que hora abren los sabados", 'source': "horarios.txt"},
+    {'question': "horario de atencion", 'source': "horarios.txt"},
+]
+
+#Metricas donde un valor mayor es mejor (el resto: menor es mejor)
+HIGHER_IS_BETTER = {'chunks_per_second', 'mb_per_second', 'queries_per_second', 'hit_rate', 'fact_hit_rate'}
+
+
+def configure_environment(work_dir: str) -> None:
+    #Debe correr antes de importar backend: la configuracion se lee al importar
+    os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(work_dir, "embeddings.sqlite3"))
+    os.environ.setdefault("EMBEDDING_CHECKPOINT_DIR", os.path.join(work_dir, "checkpoints"))
+    os.environ.setdefault("TRACE_LOG_PATH", os.path.join(work_dir, "rag_traces.jsonl"))
+    os.environ.setdefault("CHROMA_PERSIST_DIRECTORY", os.path.join(work_dir, "chroma_db"))
+    #Los limites de la API no aplican al cliente falso; se mide el costo propio del pipeline
+    os.environ.setdefault("EMBEDDING_TOKENS_PER_MINUTE", "1000000000")
+    os.environ.setdefault("EMBEDDING_REQUESTS_PER_MINUTE", "10000000")
+
+
+@contextlib.contextmanager
+def quiet():
+    #Los prints del backend distorsionan los tiempos y ensucian la salida
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def latency_summary(samples: List[float]) -> Dict:
+    ordered = sorted(samples)
+
+    def percentile(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.mean(ordered) * 1000,
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99)
+    }
+
+
+def bench_loading(kb_dir: str, repeats: int = 3) -> Dict:
+    from backend.document_loader import load_and_split_documents
+    best = None
+    chunks = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        with quiet():
+            chunks = load_and_split_documents(kb_dir)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    total_bytes = sum(
+        os.path.getsize(os.path.join(kb_dir, name))
+        for name in os.listdir(kb_dir) if name.endswith(".txt")
+    )
+    return {
+        'chunks': len(chunks),
+        'seconds': best,
+        'chunks_per_second': len(chunks) / best if best else 0.0,
+        'mb_per_second': (total_bytes / 1e6) / best if best else 0.0
+    }, chunks
+
+
+def bench_indexing(store, chunks: List[Dict]) -> Dict:
+    start = time.perf_counter()
+    with quiet():
+        added = store.add_documents(chunks)
+        store.rebuild_lexical_index(chunks)
+    elapsed = time.perf_counter() - start
+    return {
+        'chunks': added,
+        'seconds': elapsed,
+        'chunks_per_second': added / elapsed if elapsed else 0.0
+    }
+
+
+def _hit(results: List[Dict], query: Dict) -> bool:
+    return any(doc['source'] == query['source'] for doc in results)
+
+
+def bench_search(store, queries: List[Dict], n_results: int) -> Dict:
+    with quiet():
+        for query in queries[:3]:
+            store.search_similar(query['question'], n_results=n_results)
+    latencies = []
+    hits = 0
+    fast_path_hits = store.fast_path_hits
+    for query in queries:
+        start = time.perf_counter()
+        with quiet():
+            results = store.search_similar(query['question'], n_results=n_results)
+        latencies.append(time.perf_counter() - start)
+        hits += _hit(results, query)
+    summary = latency_summary(latencies)
+    summary['hit_rate'] = hits / len(queries)
+    #Preguntas resueltas solo con BM25 (sin embedding ni busqueda vectorial)
+    summary['fast_path_hit_rate'] = (store.fast_path_hits - fast_path_hits) / len(queries)
+    return summary
+
+
+def bench_query(engine, queries: List[Dict], n_results: int) -> Dict:
+    latencies = []
+    fast_path_hits = engine.vector_store.fast_path_hits
+    for query in queries:
+        start = time.perf_counter()
+        with quiet():
+            engine.query(query['question'], n_results=n_results, verbose=False)
+        latencies.append(time.perf_counter() - start)
+    summary = latency_summary(latencies)
+    summary['fast_path_hit_rate'] = (engine.vector_store.fast_path_hits - fast_path_hits) / len(queries)
+    return summary
+
+
+def bench_fact_queries(engine, queries: List[Dict], n_results: int) -> Dict:
+    #Consultas completas con la tabla de datos activa: las que acierta no llaman a OpenAI
+    latencies = []
+    fact_hits = 0
+    for query in queries:
+        start = time.perf_counter()
+        with quiet():
+            result = engine.query(query['question'], n_results=n_results, verbose=False)
+        latencies.append(time.perf_counter() - start)
+        fact_hits += result.get('fact_hit', False)
+    summary = latency_summary(latencies)
+    summary['fact_hit_rate'] = fact_hits / len(queries)
+    return summary
+
+
+def bench_concurrent_queries(engine, queries: List[Dict], n_results: int, concurrency: int) -> Dict:
+    async def run() -> List[float]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(question: str) -> float:
+            async with semaphore:
+                start = time.perf_counter()
+                await engine.aquery(question, n_results=n_results, verbose=False)
+                return time.perf_counter() - start
+
+        return await asyncio.gather(*(one(query['question']) for query in queries))
+
+    fast_path_hits = engine.vector_store.fast_path_hits
+    start = time.perf_counter()
+    with quiet():
+        latencies = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    summary = latency_summary(latencies)
+    summary['fast_path_hit_rate'] = (engine.vector_store.fast_path_hits - fast_path_hits) / len(queries)
+    summary['concurrency'] = concurrency
+    summary['queries_per_second'] = len(queries) / elapsed if elapsed else 0.0
+    return summary
+
+
+def run_size(size: str, work_dir: str, args) -> Dict:
+    from synthetic_kb import generate_knowledge_base
+    from backend.vector_store_manager import VectorStoreManager
+    from backend.rag_engine import RAGEngine
+
+    size_dir = os.path.join(work_dir, f"size_{size}")
+    if size == "kb":
+        kb_dir = os.path.join(project_root, "knowledge_base")
+        queries = KB_QUERIES
+        fact_queries = KB_FACT_QUERIES
+    else:
+        kb_dir = os.path.join(size_dir, "knowledge_base")
+        queries = generate_knowledge_base(kb_dir, int(size), seed=args.seed, n_queries=args.queries)['queries']
+        fact_queries = [dict(query, question=query['fact_question']) for query in queries]
+
+    print(f"\n[{size}] Cargando y dividiendo documentos...")
+    loading, chunks = bench_loading(kb_dir)
+    print(f"[{size}] {loading['chunks']} chunks, {loading['chunks_per_second']:,.0f} chunks/s")
+
+    store = VectorStoreManager(
+        persist_directory=os.path.join(size_dir, "chroma_db"),
+        collection_name="benchmark",
+        search_backend=args.backend,
+        manifest_path=os.path.join(size_dir, "index_manifest.json"),
+        retrieval_mode=args.retrieval_mode,
+        bm25_path=os.path.join(size_dir, "bm25_index.json"),
+        fast_path=args.fast_path
+    )
+    print(f"[{size}] Indexando...")
+    indexing = bench_indexing(store, chunks)
+    print(f"[{size}] {indexing['chunks_per_second']:,.0f} chunks/s")
+
+    print(f"[{size}] Midiendo busquedas...")
+    search = bench_search(store, queries, args.top_k)
+    print(
+        f"[{size}] search_similar p50 {search['p50_ms']:.1f} ms, p95 {search['p95_ms']:.1f} ms "
+        f"(atajo BM25 {search['fast_path_hit_rate']:.0%})"
+    )
+    #El atajo se mide aparte: mezclado con la busqueda completa esconde su latencia
+    store.fast_path = True
+    fast_path_search = bench_search(store, queries, args.top_k)
+    store.fast_path = args.fast_path
+    print(
+        f"[{size}] search_similar con atajo BM25 p50 {fast_path_search['p50_ms']:.1f} ms "
+        f"(atajo {fast_path_search['fast_path_hit_rate']:.0%})"
+    )
+
+    #Sin la tabla de datos: las preguntas de precio no deben saltarse la recuperacion y el LLM
+    engine = RAGEngine(use_answer_cache=False, vector_store=store, use_facts=False)
+    print(f"[{size}] Midiendo consultas completas...")
+    query = bench_query(engine, queries, args.top_k)
+    concurrent = bench_concurrent_queries(engine, queries, args.top_k, args.concurrency)
+    print(
+        f"[{size}] query p50 {query['p50_ms']:.1f} ms (atajo BM25 {query['fast_path_hit_rate']:.0%}); "
+        f"{concurrent['queries_per_second']:.1f} consultas/s con {args.concurrency} en paralelo"
+    )
+    facts = bench_fact_queries(
+        RAGEngine(use_answer_cache=False, vector_store=store, use_facts=True),
+        fact_queries,
+        args.top_k
+    )
+    print(f"[{size}] tabla de datos p50 {facts['p50_ms']:.1f} ms ({facts['fact_hit_rate']:.0%} sin LLM)")
+
+    return {
+        'load_and_split': loading,
+        'add_documents': indexing,
+        'search_similar': search,
+        'search_similar_fast_path': fast_path_search,
+        'rag_query': query,
+        'rag_query_concurrent': concurrent,
+        'rag_query_fact_index': facts
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=project_root, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare_results(current: Dict, previous: Dict, tolerance: float, min_delta_ms: float = 1.0) -> List[str]:
+    #Retorna las metricas que empeoraron mas que la tolerancia
+    regressions = []
+    print("\nComparacion con la corrida anterior")
+    print("=" * 70)
+    for size, benchmarks in current['results'].items():
+        old_benchmarks = previous.get('results', {}).get(size)
+        if not old_benchmarks:
+            continue
+        for name, metrics in benchmarks.items():
+            for metric, value in metrics.items():
+                old_value = old_benchmarks.get(name, {}).get(metric)
+                if not isinstance(value, (int, float)) or not isinstance(old_value, (int, float)) or not old_value:
+                    continue
+                if metric in ('count', 'chunks', 'concurrency', 'fast_path_hit_rate'):
+                    continue
+                change = (value - old_value) / old_value
+                worse = -change if metric in HIGHER_IS_BETTER else change
+                #En latencias de menos de un milisegundo el ruido supera facilmente la tolerancia
+                noise = metric.endswith("_ms") and abs(value - old_value) < min_delta_ms
+                marker = " <-- regresion" if worse > tolerance and not noise else ""
+                print(f"   [{size}] {name}.{metric}: {old_value:,.2f} -> {value:,.2f} ({change:+.1%}){marker}")
+                if marker:
+                    regressions.append(f"{size}.{name}.{metric}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks offline del chatbot RAG")
+    parser.add_argument("--sizes", nargs="+", default=["kb", "1000", "10000"],
+                        help="'kb' usa knowledge_base/; un numero genera esa cantidad de chunks sinteticos")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma")
+    parser.add_argument("--retrieval-mode", choices=["vector", "hybrid"], default="hybrid")
+    parser.add_argument("--fast-path", action="store_true",
+                        help="Dejar activo el atajo BM25 en search_similar y las consultas completas")
+    parser.add_argument("--dim", type=int, default=1536, help="Dimension de los embeddings falsos")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Segundos por request de embeddings")
+    parser.add_argument("--embedding-latency-per-item", type=float, default=0.0002)
+    parser.add_argument("--chat-latency", type=float, default=0.4, help="Segundos por respuesta del LLM")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Archivo JSON de resultados (por defecto en tests/benchmarks/results/)")
+    parser.add_argument("--compare", help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Empeoramiento tolerado (0.2 = 20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="Diferencia minima en ms para considerar regresion una latencia")
+    parser.add_argument("--keep", action="store_true", help="No borrar el directorio temporal")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="rag_bench_")
+    configure_environment(work_dir)
+    from fake_openai import install_fake_openai
+    fake = install_fake_openai(
+        dim=args.dim,
+        embedding_latency=args.embedding_latency,
+        embedding_latency_per_item=args.embedding_latency_per_item,
+        chat_latency=args.chat_latency
+    )
+
+    results = {}
+    try:
+        for size in args.sizes:
+            results[size] = run_size(size, work_dir, args)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {
+            'backend': args.backend,
+            'retrieval_mode': args.retrieval_mode,
+            'fast_path': args.fast_path,
+            'dim': args.dim,
+            'embedding_latency': args.embedding_latency,
+            'embedding_latency_per_item': args.embedding_latency_per_item,
+            'chat_latency': args.chat_latency,
+            'top_k': args.top_k,
+            'concurrency': args.concurrency
+        },
+        'fake_openai': fake.stats.as_dict(),
+        'results': results
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f"\nResultados guardados en {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            previous = json.load(file)
+        regressions = compare_results(report, previous, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} metricas empeoraron mas de {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import random
+from typing import List, Dict
+
+#Vocabulario con el estilo de la base de conocimiento real (secciones, platos con precio, preguntas)
+_SYLLABLES = [
+    "ba", "ca", "de", "fi", "go", "lu", "ma", "ne", "po", "ra", "si", "to", "ve", "za",
+    "bri", "cha", "dro", "gua", "lle", "mon", "pan", "que", "tri", "yu"
+]
+_INGREDIENTS = [
+    "arroz", "frijoles", "aguacate", "platano", "yuca", "papa", "mazorca", "cilantro", "queso",
+    "pollo", "res", "cerdo", "camarones", "coco", "mango", "lulo", "maracuya", "hogao", "arepa"
+]
+_TOPICS = [
+    "reservas", "domicilios", "pagos", "parqueadero", "mascotas", "eventos", "horarios",
+    "alergias", "propinas", "facturas", "wifi", "terraza", "cumpleanos", "descuentos"
+]
+_SECTIONS_PER_FILE = 50
+#Preguntas parafraseadas: no repiten la linea del precio, asi BM25 no las resuelve solo (atajo lexico)
+_QUERY_TEMPLATES = [
+    "que valor tiene pedir un {dish_lower}",
+    "quiero algo con {ingredient_a} y {ingredient_b}, me sirve el {dish_last}",
+    "me explicas lo de {topic} si voy a comer {dish_lower}",
+    "el {dish_last} trae {ingredient_a} o viene con otra cosa"
+]
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 3)))
+
+
+def _section(rng: random.Random, number: int) -> Dict:
+    dish = f"{_word(rng).capitalize()} {_word(rng)}"
+    topic = rng.choice(_TOPICS)
+    chosen = rng.sample(_INGREDIENTS, 5)
+    ingredients = ", ".join(chosen)
+    price = rng.randint(3, 60) * 1000
+    text = (
+        f"=== SECCION {number} - {topic.upper()} ===\n\n"
+        f"{dish} - ${price:,}".replace(",", ".") + "\n"
+        f"Plato de la casa preparado con {ingredients}. Porcion abundante, servida con "
+        f"acompanamientos del dia y salsa {_word(rng)}.\n\n"
+        f"¿Como funcionan los {topic} para el plato {dish}?\n"
+        f"Para {topic} escribenos por WhatsApp con dos horas de anticipacion; el codigo "
+        f"{_word(rng)}{number} aplica solo de lunes a sabado.\n"
+    )
+    question = rng.choice(_QUERY_TEMPLATES).format(
+        dish_lower=dish.lower(),
+        dish_last=dish.split()[-1],
+        ingredient_a=chosen[0],
+        ingredient_b=chosen[1],
+        topic=topic
+    )
+    return {'text': text, 'dish': dish, 'topic': topic, 'price': price, 'question': question}
+
+
+def generate_knowledge_base(
+    directory: str,
+    target_chunks: int,
+    seed: int = 42,
+    sections_per_file: int = _SECTIONS_PER_FILE,
+    n_queries: int = 50
+) -> Dict:
+    """Escribe archivos .txt con ~target_chunks secciones (cada seccion cabe en un chunk de 500).
+
+    Retorna los archivos generados y preguntas con la fuente esperada para medir busquedas.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    queries: List[Dict] = []
+    total_chars = 0
+    files = 0
+    for start in range(0, target_chunks, sections_per_file):
+        source = f"sintetico_{files:05d}.txt"
+        sections = [
+            _section(rng, number)
+            for number in range(start, min(start + sections_per_file, target_chunks))
+        ]
+        content = f"BASE SINTETICA {files}\n\n" + "\n".join(section['text'] for section in sections)
+        with open(os.path.join(directory, source), 'w', encoding='utf-8') as file:
+            file.write(content)
+        total_chars += len(content)
+        files += 1
+        for section in sections:
+            queries.append({
+                'question': section['question'],
+                #Misma seccion preguntada como la responde la tabla de datos
+                'fact_question': f"cuanto cuesta el {section['dish']}",
+                'source': source,
+                'contains': section['dish']
+            })
+    #Muestra fija de preguntas repartida por toda la base
+    queries = random.Random(seed + 1).sample(queries, min(n_queries, len(queries)))
+    return {
+        'directory': directory,
+        'files': files,
+        'sections': target_chunks,
+        'chars': total_chars,
+        'queries': queries
+    }
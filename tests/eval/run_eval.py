@@ -0,0 +1,336 @@
+"""Evaluacion de recuperacion: recall@k, MRR, tokens de contexto y latencia por configuracion.
+
+Recorre estrategias de chunking, tamanos de chunk, overlap, backends y k sobre knowledge_base/
+con las preguntas de golden_set.json. Funciona offline:
+    --embeddings cached  embeddings reales leidos del cache del proyecto (cache/embeddings.sqlite3);
+                         sin OPENAI_API_KEY un texto que no este en cache es un error
+    --embeddings fake    embeddings sinteticos deterministas (tests/benchmarks/fake_openai.py)
+Ejemplo:
+    python tests/eval/run_eval.py --chunk-sizes 300 500 800 --overlaps 0 50 --k 1 3 5
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import tempfile
+import shutil
+import unicodedata
+from typing import List, Dict, Optional
+
+EVAL_DIR = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(os.path.dirname(EVAL_DIR))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, "tests", "benchmarks"))
+
+from run_benchmarks import quiet, latency_summary
+
+GOLDEN_SET_PATH = os.path.join(EVAL_DIR, "golden_set.json")
+RESULTS_DIR = os.path.join(EVAL_DIR, "results")
+BACKENDS = [
+    "chroma", "numpy", "bm25", "hybrid", "snapshot-float16", "snapshot-int8",
+    "routed", "hybrid-routed", "centroid-routed"
+]
+
+
+class OfflineEmbeddingsClient:
+    #Sin API key: cualquier embedding que no este en cache corta la evaluacion con un mensaje claro
+    def __init__(self):
+        self.embeddings = self
+
+    def create(self, input, model: str, **kwargs):
+        missing = 1 if isinstance(input, str) else len(input)
+        raise RuntimeError(
+            f"{missing} textos sin embedding en cache para {model}; "
+            f"corre una vez con OPENAI_API_KEY o usa --embeddings fake"
+        )
+
+
+def configure_environment(work_dir: str, embeddings: str) -> None:
+    #Debe correr antes de importar backend: la configuracion se lee al importar
+    if embeddings == "fake":
+        #Los vectores falsos no deben mezclarse con el cache de embeddings reales
+        os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(work_dir, "embeddings.sqlite3")
+    else:
+        os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(project_root, "cache", "embeddings.sqlite3"))
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "true"
+    os.environ.setdefault("EMBEDDING_CHECKPOINT_DIR", os.path.join(work_dir, "checkpoints"))
+    os.environ.setdefault("TRACE_LOG_PATH", os.path.join(work_dir, "rag_traces.jsonl"))
+    os.environ.setdefault("CHROMA_PERSIST_DIRECTORY", os.path.join(work_dir, "chroma_db"))
+
+
+def install_embeddings(embeddings: str, dim: int) -> None:
+    from backend.openai_clients import set_clients
+    if embeddings == "fake":
+        from fake_openai import install_fake_openai
+        install_fake_openai(dim=dim)
+    elif not os.getenv("OPENAI_API_KEY"):
+        set_clients(client=OfflineEmbeddingsClient())
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFD", text.lower())
+    return " ".join("".join(c for c in text if unicodedata.category(c) != "Mn").split())
+
+
+def is_relevant(doc: Dict, item: Dict) -> bool:
+    #Un chunk es relevante si viene de la fuente esperada y contiene el fragmento con la respuesta
+    for target in item['relevant']:
+        if doc.get('source') != target['source']:
+            continue
+        if target.get('contains'):
+            if _normalize(target['contains']) in _normalize(doc.get('content', "")):
+                return True
+        elif doc.get('section') == target.get('section'):
+            return True
+    return False
+
+
+def first_relevant_rank(results: List[Dict], item: Dict) -> Optional[int]:
+    for rank, doc in enumerate(results, 1):
+        if is_relevant(doc, item):
+            return rank
+    return None
+
+
+def build_retrievers(persist_directory: str, collection_name: str, bm25_path: str, chunks: List[Dict]) -> Dict:
+    #Cada backend es una funcion (pregunta, n) -> resultados sobre la misma coleccion indexada
+    from backend.vector_store_manager import VectorStoreManager
+    from backend.bm25_index import BM25Index
+
+    def store(
+        search_backend: str,
+        retrieval_mode: str,
+        snapshot_path: str = "",
+        routing_method: Optional[str] = None
+    ) -> VectorStoreManager:
+        #Los backends base buscan en toda la coleccion; los *-routed filtran por fuente
+        return VectorStoreManager(
+            persist_directory=persist_directory,
+            collection_name=collection_name,
+            search_backend=search_backend,
+            manifest_path=os.path.join(persist_directory, "index_manifest.json"),
+            retrieval_mode=retrieval_mode,
+            bm25_path=bm25_path,
+            snapshot_path=snapshot_path,
+            query_routing=routing_method is not None,
+            routing_method=routing_method or "keywords"
+        )
+
+    retrievers = {}
+    with quiet():
+        chroma = store("chroma", "vector")
+        numpy_store = store("numpy", "vector")
+        hybrid = store("chroma", "hybrid")
+        bm25 = BM25Index.from_chunks(chunks, chroma.get_document_id)
+        #Snapshots cuantizados de la misma coleccion: miden cuanto recall se pierde frente a float32
+        for dtype in ("float16", "int8"):
+            snapshot_path = os.path.join(persist_directory, f"snapshot_{dtype}")
+            chroma.export_snapshot(dtype=dtype, directory=snapshot_path)
+            retrievers[f"snapshot-{dtype}"] = store("snapshot", "vector", snapshot_path).search_similar
+    retrievers.update({
+        'chroma': chroma.search_similar,
+        'numpy': numpy_store.search_similar,
+        'bm25': lambda question, n_results: bm25.search(question, n_results=n_results),
+        'hybrid': hybrid.search_similar,
+        'routed': store("chroma", "vector", routing_method="keywords").search_similar,
+        'hybrid-routed': store("chroma", "hybrid", routing_method="keywords").search_similar,
+        'centroid-routed': store("chroma", "vector", routing_method="centroid").search_similar
+    })
+    return retrievers
+
+
+def evaluate_retriever(search, golden_set: List[Dict], ks: List[int]) -> Dict:
+    from backend.context_builder import build_context
+
+    max_k = max(ks)
+    with quiet():
+        search(golden_set[0]['question'], n_results=max_k)
+    latencies = []
+    ranks = []
+    context_tokens = {k: [] for k in ks}
+    for item in golden_set:
+        start = time.perf_counter()
+        with quiet():
+            results = search(item['question'], n_results=max_k)
+        latencies.append(time.perf_counter() - start)
+        ranks.append(first_relevant_rank(results, item))
+        for k in ks:
+            context_tokens[k].append(build_context(results[:k])['tokens'] if results else 0)
+
+    latency = latency_summary(latencies)
+    rows = []
+    total = len(golden_set)
+    for k in ks:
+        hits = [rank for rank in ranks if rank is not None and rank <= k]
+        rows.append({
+            'k': k,
+            'recall': len(hits) / total,
+            'mrr': sum(1 / rank for rank in hits) / total,
+            'context_tokens': sum(context_tokens[k]) / total,
+            'p50_ms': latency['p50_ms'],
+            'p95_ms': latency['p95_ms']
+        })
+    misses = [item['question'] for item, rank in zip(golden_set, ranks) if rank is None]
+    return {'rows': rows, 'misses': misses}
+
+
+def evaluate_chunking(
+    strategy: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    golden_set: List[Dict],
+    ks: List[int],
+    backends: List[str],
+    work_dir: str
+) -> List[Dict]:
+    from backend.document_loader import load_and_split_documents
+    from backend.vector_store_manager import VectorStoreManager
+
+    name = f"{strategy}_{chunk_size}_{chunk_overlap}"
+    config_dir = os.path.join(work_dir, name)
+    bm25_path = os.path.join(config_dir, "bm25_index.json")
+    with quiet():
+        chunks = load_and_split_documents(
+            os.path.join(project_root, "knowledge_base"),
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            strategy=strategy
+        )
+        indexer = VectorStoreManager(
+            persist_directory=config_dir,
+            collection_name="eval",
+            manifest_path=os.path.join(config_dir, "index_manifest.json"),
+            bm25_path=bm25_path
+        )
+        #add_documents atrapa los errores; el lote previo hace que un embedding faltante falle aqui
+        from backend.embeddings_manual import get_embeddings_batch
+        get_embeddings_batch([chunk['content'] for chunk in chunks] + [item['question'] for item in golden_set])
+        indexer.add_documents(chunks)
+        indexer.rebuild_lexical_index(chunks)
+    print(f"\n[{name}] {len(chunks)} chunks")
+
+    retrievers = build_retrievers(config_dir, "eval", bm25_path, chunks)
+    results = []
+    for backend in backends:
+        evaluation = evaluate_retriever(retrievers[backend], golden_set, ks)
+        for row in evaluation['rows']:
+            row.update({
+                'strategy': strategy,
+                'chunk_size': chunk_size,
+                'chunk_overlap': chunk_overlap,
+                'chunks': len(chunks),
+                'backend': backend
+            })
+            results.append(row)
+        if evaluation['misses']:
+            print(f"   {backend}: sin chunk relevante en top {max(ks)} para {len(evaluation['misses'])} preguntas")
+    return results
+
+
+def print_table(rows: List[Dict]) -> None:
+    header = f"{'estrategia':<11}{'size':>6}{'ovl':>5}{'chunks':>7}  {'backend':<17}{'k':>3}{'recall':>8}{'MRR':>7}{'tokens':>8}{'p50 ms':>9}"
+    print("\n" + header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['strategy']:<11}{row['chunk_size']:>6}{row['chunk_overlap']:>5}{row['chunks']:>7}  "
+            f"{row['backend']:<17}{row['k']:>3}{row['recall']:>8.2f}{row['mrr']:>7.2f}"
+            f"{row['context_tokens']:>8.0f}{row['p50_ms']:>9.2f}"
+        )
+
+
+def print_quantization_loss(rows: List[Dict]) -> None:
+    #Diferencia de recall de los snapshots contra la busqueda exacta float32 (numpy) con la misma configuracion
+    exact = {
+        (row['strategy'], row['chunk_size'], row['chunk_overlap'], row['k']): row
+        for row in rows if row['backend'] == "numpy"
+    }
+    for backend in ("snapshot-float16", "snapshot-int8"):
+        losses = [
+            exact[key]['recall'] - row['recall']
+            for row in rows if row['backend'] == backend
+            for key in [(row['strategy'], row['chunk_size'], row['chunk_overlap'], row['k'])]
+            if key in exact
+        ]
+        if losses:
+            print(f"{backend}: perdida de recall frente a float32 promedio {sum(losses) / len(losses):.3f}, maxima {max(losses):.3f}")
+
+
+def recommend(rows: List[Dict], min_recall: float) -> Optional[Dict]:
+    #La configuracion mas barata (menos tokens de contexto, luego menor latencia) que alcanza el recall pedido
+    candidates = [row for row in rows if row['recall'] >= min_recall]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda row: (row['context_tokens'], row['p50_ms']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evalua la recuperacion del chatbot RAG")
+    parser.add_argument("--golden-set", default=GOLDEN_SET_PATH)
+    parser.add_argument("--strategies", nargs="+", choices=["structured", "chars"], default=["structured", "chars"])
+    parser.add_argument("--chunk-sizes", nargs="+", type=int, default=[300, 500, 800])
+    parser.add_argument("--overlaps", nargs="+", type=int, default=[50])
+    parser.add_argument("--k", nargs="+", type=int, default=[1, 3, 5])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--embeddings", choices=["cached", "fake"], default="cached")
+    parser.add_argument("--dim", type=int, default=1536, help="Dimension de los embeddings falsos")
+    parser.add_argument("--min-recall", type=float, default=0.9,
+                        help="Recall minimo para recomendar una configuracion")
+    parser.add_argument("--output", help="Archivo JSON de resultados (por defecto en tests/eval/results/)")
+    args = parser.parse_args()
+
+    with open(args.golden_set, 'r', encoding='utf-8') as file:
+        golden_set = json.load(file)
+    ks = sorted(set(args.k))
+
+    work_dir = tempfile.mkdtemp(prefix="rag_eval_")
+    configure_environment(work_dir, args.embeddings)
+    install_embeddings(args.embeddings, args.dim)
+    print(f"Evaluando {len(golden_set)} preguntas con embeddings '{args.embeddings}'")
+
+    rows = []
+    try:
+        for strategy in args.strategies:
+            for chunk_size in args.chunk_sizes:
+                for chunk_overlap in args.overlaps:
+                    if chunk_overlap >= chunk_size:
+                        continue
+                    rows.extend(evaluate_chunking(
+                        strategy, chunk_size, chunk_overlap, golden_set, ks, args.backends, work_dir
+                    ))
+    except RuntimeError as e:
+        print(f"\nError: {str(e)}")
+        sys.exit(2)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_table(rows)
+    print()
+    print_quantization_loss(rows)
+    best = recommend(rows, args.min_recall)
+    if best:
+        print(
+            f"\nRecomendado (recall >= {args.min_recall:.0%} con menos tokens): {best['strategy']}, "
+            f"chunk_size={best['chunk_size']}, overlap={best['chunk_overlap']}, {best['backend']}, k={best['k']} "
+            f"-> recall {best['recall']:.2f}, {best['context_tokens']:.0f} tokens, p50 {best['p50_ms']:.2f} ms"
+        )
+    else:
+        print(f"\nNinguna configuracion alcanza recall {args.min_recall:.0%}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"eval_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump({
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'embeddings': args.embeddings,
+            'questions': len(golden_set),
+            'min_recall': args.min_recall,
+            'recommended': best,
+            'results': rows
+        }, file, indent=2)
+    print(f"Resultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Pruebas del pipeline de WhatsApp con colas reales y sender/engine falsos (sin OpenAI ni Twilio).
+
+    python -m pytest tests/integrations
+"""
+import sys
+import os
+import time
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+import pytest
+
+from integrations.message_queue import InMemoryMessageQueue, SQLiteMessageQueue
+from integrations.senders import FakeSender
+from integrations.whatsapp import WhatsAppPipeline
+
+
+class FakeEngine:
+    """Cuenta las llamadas al LLM y responde con la pregunta."""
+
+    def __init__(self):
+        self.calls = []
+
+    def query(self, query, verbose=True, user_id=None):
+        self.calls.append((user_id, query))
+        return {'answer': f"Respuesta a: {query}"}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_queue(request, tmp_path):
+    def factory(**options):
+        options.setdefault('retry_delay', 0)
+        if request.param == "memory":
+            return InMemoryMessageQueue(**options)
+        return SQLiteMessageQueue(path=str(tmp_path / "queue.sqlite3"), **options)
+    return factory
+
+
+AUTH_TOKEN = "token-de-prueba"
+WEBHOOK_URL = "https://chatbot.example.com/whatsapp/webhook"
+
+
+def make_pipeline(queue, sender=None, validate_signature=False):
+    engine = FakeEngine()
+    pipeline = WhatsAppPipeline(
+        queue=queue,
+        sender=sender or FakeSender(),
+        engine_factory=lambda: engine,
+        workers=1,
+        validate_signature=validate_signature,
+        auth_token=AUTH_TOKEN
+    )
+    return pipeline, engine
+
+
+def sign(form, url=WEBHOOK_URL, token=AUTH_TOKEN):
+    from twilio.request_validator import RequestValidator
+    return RequestValidator(token).compute_signature(url, form)
+
+
+def webhook(message_sid, user_id="whatsapp:+573001112233", body="¿Tienen bandeja paisa?"):
+    return {'MessageSid': message_sid, 'From': user_id, 'Body': body}
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_duplicate_message_sid_is_processed_once(make_queue):
+    queue = make_queue()
+    pipeline, engine = make_pipeline(queue)
+    assert pipeline.handle_webhook(webhook("SM1")) is True
+    assert pipeline.handle_webhook(webhook("SM1")) is False
+
+    pipeline.process(queue.claim(timeout=0))
+    assert queue.claim(timeout=0) is None
+    assert len(engine.calls) == 1
+    assert queue.get_stats()['duplicates'] == 1
+    #Un reintento tardio de Twilio tampoco se vuelve a encolar
+    assert pipeline.handle_webhook(webhook("SM1")) is False
+
+
+def test_send_failure_retries_without_calling_llm_again(make_queue):
+    queue = make_queue()
+    sender = FakeSender(fail_times=1)
+    pipeline, engine = make_pipeline(queue, sender)
+    pipeline.handle_webhook(webhook("SM1"))
+
+    pipeline.process(queue.claim(timeout=0))
+    assert queue.get("SM1")['status'] == "pending"
+    assert sender.sent == []
+
+    message = queue.claim(timeout=0)
+    assert message['answer'] == "Respuesta a: ¿Tienen bandeja paisa?"
+    pipeline.process(message)
+    assert len(engine.calls) == 1
+    assert [sent['body'] for sent in sender.sent] == ["Respuesta a: ¿Tienen bandeja paisa?"]
+    assert queue.get("SM1")['status'] == "done"
+    assert pipeline.send_errors == 1
+
+
+def test_recover_after_crash_only_takes_expired_leases(make_queue):
+    queue = make_queue(visibility_timeout=0.2)
+    pipeline, engine = make_pipeline(queue)
+    pipeline.handle_webhook(webhook("SM1"))
+    #El worker que lo tomo muere sin terminarlo
+    assert queue.claim(timeout=0)['message_sid'] == "SM1"
+
+    #Mientras el lease esta vigente (otro worker vivo) no se recupera
+    assert queue.recover() == 0
+    assert queue.get("SM1")['status'] == "processing"
+
+    time.sleep(0.3)
+    pipeline.start()
+    try:
+        assert wait_for(lambda: queue.get("SM1")['status'] == "done")
+    finally:
+        pipeline.stop()
+    assert len(engine.calls) == 1
+    assert queue.get("SM1")['attempts'] == 2
+
+
+def test_messages_of_a_user_are_claimed_in_order(make_queue):
+    queue = make_queue()
+    pipeline, _ = make_pipeline(queue)
+    pipeline.handle_webhook(webhook("A1", user_id="a"))
+    pipeline.handle_webhook(webhook("A2", user_id="a"))
+    pipeline.handle_webhook(webhook("B1", user_id="b"))
+
+    assert queue.claim(timeout=0)['message_sid'] == "A1"
+    #A2 espera a que termine A1, aunque haya workers libres
+    assert queue.claim(timeout=0)['message_sid'] == "B1"
+    assert queue.claim(timeout=0) is None
+
+    queue.complete("A1")
+    assert queue.claim(timeout=0)['message_sid'] == "A2"
+
+
+def test_failed_generation_keeps_later_messages_of_the_user_waiting(make_queue):
+    queue = make_queue(retry_delay=60)
+    pipeline, _ = make_pipeline(queue)
+    pipeline.handle_webhook(webhook("A1", user_id="a"))
+    pipeline.handle_webhook(webhook("A2", user_id="a"))
+
+    assert queue.claim(timeout=0)['message_sid'] == "A1"
+    assert queue.fail("A1", "timeout de OpenAI") is True
+    #A1 espera su reintento: A2 no se adelanta
+    assert queue.claim(timeout=0) is None
+
+
+def test_sqlite_queue_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "queue.sqlite3")
+    first = SQLiteMessageQueue(path=path, retry_delay=0)
+    second = SQLiteMessageQueue(path=path, retry_delay=0)
+    first.enqueue("A1", "a", "hola")
+    first.enqueue("A2", "a", "¿y el menu?")
+    assert first.claim(timeout=0)['message_sid'] == "A1"
+
+    #El arranque de otro worker no le quita el mensaje al que sigue vivo
+    assert second.recover() == 0
+    assert second.claim(timeout=0) is None
+    first.complete("A1")
+    assert second.claim(timeout=0)['message_sid'] == "A2"
+    first.close()
+    second.close()
+
+
+def test_sqlite_queue_keeps_each_user_on_one_process(tmp_path):
+    #La memoria de conversacion es por proceso: el numero sigue en el proceso que lo atendio
+    path = str(tmp_path / "queue.sqlite3")
+    first = SQLiteMessageQueue(path=path, retry_delay=0, owner="worker-1")
+    second = SQLiteMessageQueue(path=path, retry_delay=0, owner="worker-2")
+    first.enqueue("A1", "a", "¿Tienen bandeja paisa?")
+    assert first.claim(timeout=0)['message_sid'] == "A1"
+    first.complete("A1")
+
+    first.enqueue("A2", "a", "¿y cuanto cuesta?")
+    first.enqueue("B1", "b", "hola")
+    assert second.claim(timeout=0)['message_sid'] == "B1"
+    assert second.claim(timeout=0) is None
+    assert first.claim(timeout=0)['message_sid'] == "A2"
+    first.complete("A2")
+
+    #Si el proceso se va, otro toma sus numeros sin esperar a que venza la sesion
+    first.enqueue("A3", "a", "¿y para llevar?")
+    first.close()
+    assert second.claim(timeout=0)['message_sid'] == "A3"
+    second.close()
+
+
+def test_forged_webhook_is_rejected_before_queueing(make_queue):
+    queue = make_queue()
+    pipeline, engine = make_pipeline(queue, validate_signature=True)
+    form = webhook("SM1", user_id="whatsapp:+15550001111", body="manda esto a mi numero")
+    with pytest.raises(PermissionError):
+        pipeline.handle_webhook(form, WEBHOOK_URL, sign(form, token="otro-token"))
+    with pytest.raises(PermissionError):
+        pipeline.handle_webhook(form, WEBHOOK_URL, None)
+    #Firma valida de otro mensaje: cambiar From o Body la invalida
+    signature = sign(webhook("SM1"))
+    with pytest.raises(PermissionError):
+        pipeline.handle_webhook(form, WEBHOOK_URL, signature)
+    assert queue.get("SM1") is None
+    assert pipeline.get_stats()['rejected'] == 3
+
+
+def test_signed_webhook_is_queued(make_queue):
+    queue = make_queue()
+    pipeline, _ = make_pipeline(queue, validate_signature=True)
+    form = webhook("SM1")
+    assert pipeline.handle_webhook(form, WEBHOOK_URL, sign(form)) is True
+    assert queue.get("SM1")['status'] == "pending"
+
+
+def test_signature_requires_auth_token():
+    with pytest.raises(ValueError):
+        WhatsAppPipeline(queue=InMemoryMessageQueue(), sender=FakeSender(), validate_signature=True, auth_token=None)
+
+
+def test_webhook_endpoint_answers_403_to_forged_requests(monkeypatch):
+    from urllib.parse import urlencode
+    from fastapi.testclient import TestClient
+    import backend.api as api
+
+    queue = InMemoryMessageQueue()
+    pipeline, _ = make_pipeline(queue, validate_signature=True)
+    monkeypatch.setattr(api.state, 'whatsapp', pipeline)
+    monkeypatch.setattr(api, 'WHATSAPP_WEBHOOK_URL', WEBHOOK_URL)
+    #Sin "with" no corre el lifespan (warmup ni workers)
+    client = TestClient(api.app)
+    headers = {'Content-Type': "application/x-www-form-urlencoded"}
+
+    form = webhook("SM1")
+    forged = client.post(
+        "/whatsapp/webhook",
+        content=urlencode(form),
+        headers=dict(headers, **{'X-Twilio-Signature': sign(form, token="otro-token")})
+    )
+    assert forged.status_code == 403
+    assert queue.get("SM1") is None
+
+    signed = client.post(
+        "/whatsapp/webhook",
+        content=urlencode(form),
+        headers=dict(headers, **{'X-Twilio-Signature': sign(form)})
+    )
+    assert signed.status_code == 200
+    assert queue.get("SM1")['status'] == "pending"